@@ -1,15 +1,31 @@
+import logging
+import multiprocessing
+
 from flask import Flask
 
+from backend.app.utils.env_helper import EnvVars
+from backend.app.utils.metrics import register_metrics
+
 def create_app(config_class=None):
+    # Model, worker and codec events are logged at INFO; a server that configured logging keeps its own setup
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = Flask(__name__)
     if config_class:
         app.config.from_object(config_class)
 
     from backend.app.vision.routes import vision_bp 
     from backend.app.api.routes import api_bp
+    from backend.app.vision.stream import sock
+    from backend.app.vision.loader import start_loading
 
     app.register_blueprint(vision_bp, url_prefix="/vision")
     app.register_blueprint(api_bp, url_prefix="/api")
+    sock.init_app(app)
+    envs = EnvVars()
+    register_metrics(app, timing_header=envs.METRICS_TIMING_HEADER)
+    # Spawned inference workers re-import the entry script; only the server process loads models
+    if multiprocessing.parent_process() is None:
+        start_loading(envs.MODEL_LOADING)
 
     return app
 
@@ -1,8 +1,87 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+
+from backend.app.utils.metrics import METRICS
+from backend.app.vision.loader import readiness
+from backend.app.vision.pipeline import QUALITY
+from backend.app.vision.pipeline import STREAMS
 
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/', methods=['GET'])
 def health_check():
+    """
+    Liveness probe: answers as soon as the app is up, whether or not the models have loaded.
+    """
     return jsonify({"health": "ok"}), 200
 
+@api_bp.route('/ready', methods=['GET'])
+def ready_check():
+    """
+    Readiness probe: 200 once every detector model is loaded and warmed up, 503 until then (or if one failed).
+
+    Output payload:
+    {'ready': <bool>, 'models': [{'model', 'state', 'load_ms', 'warmup_ms', 'error'}, ...]}
+    """
+    ready, models = readiness()
+    return jsonify({"ready": ready, "models": models}), 200 if ready else 503
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Exposes the per-stage latency histograms, counters and gauges.
+
+    JSON by default; ?format=prometheus returns the Prometheus text format.
+    """
+    if request.args.get('format') == "prometheus":
+        return Response(METRICS.prometheus(), status=200, mimetype="text/plain; version=0.0.4")
+    return jsonify(METRICS.snapshot()), 200
+
+@api_bp.route('/quality', methods=['GET'])
+def quality():
+    """
+    Reports the adaptive quality controller's current operating point.
+
+    Output payload:
+    {'enabled', 'level', 'levels', 'point': {'scale', 'interval', 'quality', 'max_faces'}, 'budget_ms',
+     'mean_latency_ms', 'changes', 'held_s'}
+    """
+    return jsonify(QUALITY.stats()), 200
+
+@api_bp.route('/streams', methods=['GET'])
+def streams():
+    """
+    Lists the streams (cameras and clients) the server keeps state for.
+
+    Output payload:
+    {'max_streams', 'idle_ttl_s', 'evicted', 'streams': {<stream key>: <see /streams/<stream_id>>, ...}}
+    """
+    return jsonify({
+        "max_streams": STREAMS.max_streams,
+        "idle_ttl_s": STREAMS.idle_ttl,
+        "evicted": STREAMS.evicted,
+        "streams": STREAMS.stats(),
+    }), 200
+
+@api_bp.route('/streams/<stream_id>', methods=['GET'])
+def stream_status(stream_id):
+    """
+    Reports one stream: frames processed and their latency, last detections, and the state of its motion
+    gate, tracker and Mediapipe session.
+
+    Output payload:
+    {'attached', 'age_s', 'idle_s', 'frames', 'mean_latency_ms', 'p95_latency_ms',
+     'last': {'detector', 'faces', 'width', 'height', 'age_s'}, 'motion', 'tracker', 'media'}
+    """
+    stream = STREAMS.peek(stream_id)
+    if stream is None:
+        return jsonify({"error": f"unknown stream '{stream_id}'"}), 404
+    return jsonify(stream.stats()), 200
+
+@api_bp.route('/streams/<stream_id>', methods=['DELETE'])
+def stream_remove(stream_id):
+    """
+    Drops a stream's state (motion gate, tracker, Mediapipe session). Its next frame starts over.
+    """
+    if not STREAMS.remove(stream_id):
+        return jsonify({"error": f"unknown stream '{stream_id}'"}), 404
+    return jsonify({"removed": stream_id}), 200
@@ -0,0 +1,329 @@
+"""
+file: codec.py
+
+Contains the image codec layer of the frame path. Every format is handled by the fastest backend that is
+installed, in the order of CODEC_PREFERENCE:
+    turbo     PyTurboJPEG (libjpeg-turbo's own API): JPEG only. Decodes and encodes RGB directly, without the
+              BGR copy OpenCV needs. Optional: `pip install PyTurboJPEG`
+    opencv    cv2.imdecode / cv2.imencode: JPEG, PNG and WEBP. Decodes straight into RGB; encodes through a
+              pooled BGR buffer. PNG is written at zlib level 1, an order of magnitude faster than Pillow's
+              default, for slightly larger files
+    pillow    the reference implementation, and the fallback for formats the others cannot read
+
+JPEGs can be decoded at 1/2, 1/4 or 1/8 of their size by scaling the DCT, which skips most of the decoding
+work instead of resizing afterwards. decode() does this when it is given the size the frame is going to be
+shrunk to anyway (a detector's letterbox), picking the largest reduction that still keeps the frame at
+least that large.
+
+Decoded frames follow utils/frame_handler.py: (H, W, 3) uint8 RGB arrays, writable, C-contiguous.
+"""
+
+import base64
+import io
+import logging
+
+import cv2
+import numpy as np
+from PIL import Image
+from PIL import UnidentifiedImageError
+
+from backend.app.utils.env_helper import EnvVars
+from backend.app.utils.frame_handler import FRAME_POOL
+
+envs = EnvVars()
+logger = logging.getLogger(__name__)
+
+FORMAT_MIMETYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+LOSSY_FORMATS = ("JPEG", "WEBP")
+DCT_REDUCTIONS = (8, 4, 2)  # JPEG decode scale denominators, largest first
+
+# Fastest first, per format. Backends that are not installed are skipped.
+CODEC_PREFERENCE = {
+    "JPEG": ("turbo", "opencv", "pillow"),
+    "PNG": ("opencv", "pillow"),
+    "WEBP": ("opencv", "pillow"),
+}
+
+
+def normalize_format(format):
+    # Returns: canonical format name ("JPEG", "PNG" or "WEBP"), or None when it is not supported
+    format = str(format or "").strip().upper()
+    if format.startswith("IMAGE/"):
+        format = format[len("IMAGE/"):]
+    format = {"JPG": "JPEG"}.get(format, format)
+    return format if format in FORMAT_MIMETYPES else None
+
+
+def sniff_format(data):
+    """
+    Returns: format of encoded image bytes from their magic number, or None when it is not recognized
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def dct_reduction(size, fit):
+    """
+    Picks the largest JPEG decode reduction that keeps a frame at least as large as its letterboxed content.
+
+    Arguments:
+        size (tuple): (width, height) of the encoded frame
+        fit (tuple): (width, height) the frame is going to be shrunk into, keeping its aspect ratio
+
+    Returns: 1, 2, 4 or 8
+    """
+    scale = min(fit[0] / size[0], fit[1] / size[1])
+    for reduction in DCT_REDUCTIONS:
+        if scale * reduction <= 1:
+            return reduction
+    return 1
+
+
+class Codec:
+    """
+    Base class of the codec backends.
+    """
+
+    name = "codec"
+    formats = ()  # formats the backend decodes and encodes
+
+    def size(self, data):
+        """
+        Returns: (width, height) from the image header, without decoding the pixels
+        """
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+
+    def decode(self, data, reduction: int = 1):
+        """
+        Decodes an image to an RGB frame.
+
+        Arguments:
+            data (bytes): encoded image
+            reduction (int): 1, 2, 4 or 8; JPEGs are decoded that many times smaller in each dimension
+
+        Raises: PIL.UnidentifiedImageError / OSError for undecodable bytes
+        """
+        raise NotImplementedError
+
+    def encode(self, frame, format: str = "JPEG", quality: int = 85):
+        """
+        Encodes an RGB frame.
+
+        Arguments:
+            frame (np.ndarray): (H, W, 3) uint8 RGB frame
+            format (str): one of self.formats
+            quality (int): encoder quality (1-95), only used by lossy formats
+
+        Returns: encoded bytes
+        """
+        raise NotImplementedError
+
+
+class TurboJpegCodec(Codec):
+    name = "turbo"
+    formats = ("JPEG",)
+
+    def __init__(self):
+        from turbojpeg import TJPF_RGB # Optional dependency, only this backend needs it
+        from turbojpeg import TurboJPEG
+        self._jpeg = TurboJPEG()
+        self._pixel_format = TJPF_RGB
+
+    def size(self, data):
+        width, height, _, _ = self._jpeg.decode_header(data)
+        return width, height
+
+    def decode(self, data, reduction: int = 1):
+        scaling_factor = None if reduction == 1 else (1, reduction)
+        return self._jpeg.decode(data, pixel_format=self._pixel_format, scaling_factor=scaling_factor)
+
+    def encode(self, frame, format: str = "JPEG", quality: int = 85):
+        return self._jpeg.encode(np.ascontiguousarray(frame), quality=int(quality), pixel_format=self._pixel_format)
+
+
+class OpenCVCodec(Codec):
+    name = "opencv"
+    formats = ("JPEG", "PNG", "WEBP")
+
+    # The IMREAD_REDUCED_* bits select the DCT scale, IMREAD_COLOR_RGB the channel order
+    _REDUCED = {
+        1: 0,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+    _EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+    def __init__(self, pool=FRAME_POOL, png_compression: int = 1):
+        """
+        Arguments:
+            pool (FramePool): where the encoder's BGR buffers come from
+            png_compression (int): zlib level of the PNG encoder (0-9)
+        """
+        self.pool = pool
+        self.png_compression = png_compression
+
+    def decode(self, data, reduction: int = 1):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR_RGB | self._REDUCED[reduction])
+        if frame is None:
+            raise UnidentifiedImageError("cannot identify image data")
+        return frame
+
+    def encode(self, frame, format: str = "JPEG", quality: int = 85):
+        params = []
+        if format == "JPEG":
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        elif format == "WEBP":
+            params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+        elif format == "PNG":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+
+        with self.pool.checkout(frame.shape) as bgr:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=bgr)
+            ok, encoded = cv2.imencode(self._EXTENSIONS[format], bgr, params)
+        if not ok:
+            raise OSError(f"could not encode frame as {format}")
+        return encoded.tobytes()
+
+
+class PillowCodec(Codec):
+    name = "pillow"
+    formats = ("JPEG", "PNG", "WEBP")
+
+    def decode(self, data, reduction: int = 1):
+        with Image.open(io.BytesIO(data)) as img:
+            if reduction > 1:
+                # Only JPEG has a draft mode; other formats decode at full size
+                img.draft("RGB", (max(1, img.width // reduction), max(1, img.height // reduction)))
+            return np.array(img.convert("RGB") if img.mode != "RGB" else img)
+
+    def encode(self, frame, format: str = "JPEG", quality: int = 85):
+        buffered = io.BytesIO()
+        options = {"quality": int(quality)} if format in LOSSY_FORMATS else {}
+        Image.fromarray(frame).save(buffered, format=format, **options)
+        return buffered.getvalue()
+
+
+CODEC_BACKENDS = {
+    "turbo": TurboJpegCodec,
+    "opencv": OpenCVCodec,
+    "pillow": PillowCodec,
+}
+
+
+class Codecs:
+    def __init__(self, backend: str = "auto"):
+        """
+        Arguments:
+            backend (str): "auto" uses the fastest installed backend per format; "turbo", "opencv" or
+                           "pillow" pins one, and formats it cannot handle still use the fastest other one
+        """
+        if backend != "auto" and backend not in CODEC_BACKENDS:
+            raise ValueError(f"CODEC_BACKEND must be 'auto' or one of {tuple(CODEC_BACKENDS)}, got '{backend}'")
+        self.backends = {}
+        for name, factory in CODEC_BACKENDS.items():
+            try:
+                self.backends[name] = factory()
+            except ImportError:
+                if name == backend:
+                    logger.warning("Codec backend '%s' is not installed, falling back to the fastest available one", name)
+        self.codecs = {}  # format -> Codec
+        for format, preference in CODEC_PREFERENCE.items():
+            if backend in preference:
+                preference = (backend,) + preference
+            self.codecs[format] = next(self.backends[name] for name in preference if name in self.backends)
+
+    def codec(self, format):
+        return self.codecs[format]
+
+    def decode(self, data, fit=None):
+        """
+        Decodes encoded image bytes to an RGB frame, with DCT scaling when only a smaller frame is needed.
+
+        Arguments:
+            data (bytes): encoded image (JPEG, PNG, WEBP, or anything else Pillow can read)
+            fit (tuple): (width, height) the frame is going to be shrunk into; None decodes at full size
+
+        Returns: (RGB frame, (width, height) of the encoded image); the frame is smaller when it was reduced
+
+        Raises: PIL.UnidentifiedImageError / OSError for undecodable bytes
+        """
+        format = sniff_format(data)
+        codec = self.codecs.get(format, self.backends["pillow"])
+        if fit is None or format != "JPEG":
+            frame = codec.decode(data)
+            return frame, (frame.shape[1], frame.shape[0])
+
+        size = codec.size(data)
+        return codec.decode(data, dct_reduction(size, fit)), size
+
+    def encode(self, frame, format: str = "JPEG", quality: int = 85):
+        """
+        Encodes an RGB frame with the format's backend.
+
+        Arguments:
+            frame (np.ndarray): (H, W, 3) uint8 RGB frame; PIL images are converted first
+            format (str): "JPEG", "PNG" or "WEBP" (or their MIME types)
+            quality (int): encoder quality (1-95), only used by lossy formats
+        """
+        name = normalize_format(format)
+        if name is None:
+            raise ValueError(f"unsupported image format '{format}'")
+        if not isinstance(frame, np.ndarray):
+            frame = np.asarray(frame if frame.mode == "RGB" else frame.convert("RGB"))
+        return self.codecs[name].encode(frame, name, quality)
+
+    def stats(self):
+        return {format: codec.name for format, codec in self.codecs.items()}
+
+
+CODECS = Codecs(envs.CODEC_BACKEND) # Backend per format, chosen once at startup
+
+
+def decode_bytes_to_frame(img_bytes: bytes) -> np.ndarray:
+    """
+    Decodes encoded image bytes (JPEG, PNG, etc.) to a full-size RGB frame.
+
+    Arguments:
+        img_bytes (bytes): inbound encoded image from an HTTP body or a WebSocket message
+    """
+    return CODECS.decode(img_bytes)[0]
+
+
+def decode_bytes_to_scaled_frame(img_bytes: bytes, fit):
+    """
+    Decodes encoded image bytes for detection only, as small as `fit` allows (see Codecs.decode).
+
+    Returns: (RGB frame, (width, height) of the encoded image)
+    """
+    return CODECS.decode(img_bytes, fit)
+
+
+def encode_frame_to_bytes(frame, format: str = "JPEG", quality: int = 85) -> bytes:
+    """
+    Encodes an RGB frame with the fastest backend of the format.
+
+    Arguments:
+        frame (np.ndarray): (H, W, 3) uint8 RGB frame
+        format (str): image format (JPEG, PNG or WEBP)
+        quality (int): encoder quality (1-95), only used by lossy formats
+    """
+    return CODECS.encode(frame, format, quality)
+
+
+def encode_frame_to_base64(frame, format: str = "PNG", quality: int = 85) -> str:
+    """
+    Encodes an RGB frame to a base64 string.
+
+    Arguments:
+        frame (np.ndarray): (H, W, 3) uint8 RGB frame
+        format (str): image format (JPEG, PNG or WEBP)
+        quality (int): encoder quality (1-95), only used by lossy formats
+    """
+    return base64.b64encode(encode_frame_to_bytes(frame, format, quality)).decode("utf-8")
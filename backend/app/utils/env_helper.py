@@ -22,3 +22,61 @@ class EnvVars:
         self.MODEL_DIR = os.getenv("MODEL_DIR")
         self.MEDIA_DIR = os.getenv("MEDIA_DIR")
         self.PROJECT_VER = os.getenv("PROJECT_VER")
+        self.DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "ultralytics")
+        self.ONNX_MODEL = os.getenv("ONNX_MODEL", "./models/yolo/yolov8n-face.onnx")
+        self.ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+        self.ONNX_PROVIDERS = [p.strip() for p in os.getenv("ONNX_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+        self.INFER_PROFILE = os.getenv("INFER_PROFILE", "balanced")
+        self.INFER_SIZE_YOLO = os.getenv("INFER_SIZE_YOLO", "")
+        self.INFER_SIZE_MEDIA = os.getenv("INFER_SIZE_MEDIA", "")
+        self.BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1"))
+        self.BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+        self.STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+        self.STUB_FACES = int(os.getenv("STUB_FACES", "1"))
+        self.MODEL_LOADING = os.getenv("MODEL_LOADING", "background")
+        self.WARMUP_FRAMES = int(os.getenv("WARMUP_FRAMES", "2"))
+        self.MODEL_WAIT_S = float(os.getenv("MODEL_WAIT_S", "1"))
+        self.SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+        self.SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+        self.SERVER_THREADS = int(os.getenv("SERVER_THREADS", "16"))
+        self.SERVER_TIMEOUT = int(os.getenv("SERVER_TIMEOUT", "60"))
+        self.INFER_CONCURRENCY = int(os.getenv("INFER_CONCURRENCY", "2"))
+        self.INFER_QUEUE_MAX = int(os.getenv("INFER_QUEUE_MAX", "16"))
+        self.INFER_TIMEOUT_S = float(os.getenv("INFER_TIMEOUT_S", "30"))
+        self.INFER_STREAM_QUEUE_MAX = int(os.getenv("INFER_STREAM_QUEUE_MAX", "4"))
+        self.WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+        self.WORKER_SLOTS = int(os.getenv("WORKER_SLOTS", "2"))
+        self.WORKER_MAX_FRAME = os.getenv("WORKER_MAX_FRAME", "1920x1080")
+        self.WORKER_THREADS = int(os.getenv("WORKER_THREADS", "0"))
+        self.MEDIA_POOL_SIZE = int(os.getenv("MEDIA_POOL_SIZE", "2"))
+        self.MEDIA_STREAM_MODE = os.getenv("MEDIA_STREAM_MODE", "video")
+        self.MEDIA_SESSION_MAX = int(os.getenv("MEDIA_SESSION_MAX", "8"))
+        self.STREAM_MAX = int(os.getenv("STREAM_MAX", "64"))
+        self.STREAM_IDLE_TTL_S = float(os.getenv("STREAM_IDLE_TTL_S", "30"))
+        self.FRAME_CACHE_SIZE = int(os.getenv("FRAME_CACHE_SIZE", "64"))
+        self.FRAME_CACHE_TTL_S = float(os.getenv("FRAME_CACHE_TTL_S", "1"))
+        self.FRAME_CACHE_THRESHOLD = int(os.getenv("FRAME_CACHE_THRESHOLD", "12"))
+        self.FRAME_CACHE_OUTPUT = os.getenv("FRAME_CACHE_OUTPUT", "1") in ("1", "true", "True")
+        self.CASCADE_PAD = float(os.getenv("CASCADE_PAD", "0.25"))
+        self.CASCADE_TILE = int(os.getenv("CASCADE_TILE", "192"))
+        self.CASCADE_GRID = int(os.getenv("CASCADE_GRID", "3"))
+        self.MOTION_GATE = os.getenv("MOTION_GATE", "1") in ("1", "true", "True")
+        self.MOTION_WIDTH = int(os.getenv("MOTION_WIDTH", "160"))
+        self.MOTION_THRESHOLD = int(os.getenv("MOTION_THRESHOLD", "25"))
+        self.MOTION_MIN_PIXELS = int(os.getenv("MOTION_MIN_PIXELS", "4"))
+        self.MOTION_FULL_INTERVAL_S = float(os.getenv("MOTION_FULL_INTERVAL_S", "2"))
+        self.MOTION_ROI_PAD = float(os.getenv("MOTION_ROI_PAD", "0.25"))
+        self.MOTION_ROI_MAX = float(os.getenv("MOTION_ROI_MAX", "0.5"))
+        self.JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "80"))
+        self.CODEC_BACKEND = os.getenv("CODEC_BACKEND", "auto")
+        self.DECODE_REDUCE = os.getenv("DECODE_REDUCE", "1") in ("1", "true", "True")
+        self.FILTER_SPRITE = os.getenv("FILTER_SPRITE", "")
+        self.TARGET_FPS = float(os.getenv("TARGET_FPS", "24"))
+        self.TRACK_MAX_INTERVAL = int(os.getenv("TRACK_MAX_INTERVAL", "10"))
+        self.QUALITY_ADAPT = os.getenv("QUALITY_ADAPT", "1") in ("1", "true", "True")
+        self.QUALITY_WINDOW = int(os.getenv("QUALITY_WINDOW", "24"))
+        self.QUALITY_HOLD_S = float(os.getenv("QUALITY_HOLD_S", "2"))
+        self.METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "0") in ("1", "true", "True")
+        self.CAPTURE_SOURCE = os.getenv("CAPTURE_SOURCE", "")
+        self.CAPTURE_SLOTS = int(os.getenv("CAPTURE_SLOTS", "4"))
+        self.MJPEG_FPS = float(os.getenv("MJPEG_FPS", "15"))
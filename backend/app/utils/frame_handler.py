@@ -0,0 +1,120 @@
+"""
+file: frame_handler.py
+
+Contains the canonical frame of the pipeline and its buffer pool. A frame is an (H, W, 3) C-contiguous
+uint8 numpy array in RGB order (FRAME_ORDER), the order of the detectors and of the filter sprite. It is
+decoded once from the request body (see utils/codec.py) and then used, without any intermediate PIL image,
+for detection, for drawing (the sprite is blended into it in place) and for encoding.
+
+Decoding allocates the frame itself and nothing else. Every other full-frame buffer comes from the
+FramePool: the BGR copy the OpenCV encoder needs, the RGB conversion of a captured BGR frame, the
+downscaled detection input. Buffers go back to the pool when the request is done and are reused by the
+next frame of the same shape. The pool counts frame_pool_allocations_total and frame_pool_reuses_total,
+so a steady stream shows up as reuses only.
+
+The pillow_handler helpers stay for callers that still work with PIL images.
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from backend.app.utils.metrics import METRICS
+
+FRAME_ORDER = "RGB"
+
+
+class FramePool:
+    def __init__(self, per_shape: int = 4, max_shapes: int = 8):
+        """
+        Arguments:
+            per_shape (int): idle buffers kept for each shape; more are left to the garbage collector
+            max_shapes (int): shapes kept at once, the least recently used shape is dropped first
+        """
+        self.per_shape = max(1, int(per_shape))
+        self.max_shapes = max(1, int(max_shapes))
+        self.allocations = 0
+        self.reuses = 0
+        self._idle = OrderedDict()  # shape -> list of idle buffers, least recently used shape first
+        self._lock = threading.Lock()
+        METRICS.gauge("frame_pool_buffers", lambda: sum(len(buffers) for buffers in list(self._idle.values())))
+
+    def acquire(self, shape):
+        """
+        Returns: a writable C-contiguous uint8 buffer of the given shape. Its content is undefined.
+        """
+        shape = tuple(int(v) for v in shape)
+        with self._lock:
+            buffers = self._idle.get(shape)
+            if buffers:
+                self._idle.move_to_end(shape)
+                self.reuses += 1
+                buffer = buffers.pop()
+            else:
+                self.allocations += 1
+                buffer = None
+        if buffer is None:
+            METRICS.inc("frame_pool_allocations_total")
+            return np.empty(shape, dtype=np.uint8)
+        METRICS.inc("frame_pool_reuses_total")
+        return buffer
+
+    def release(self, buffer):
+        """
+        Hands a buffer back for reuse. Decoded frames can be released too; arrays that are views of another
+        buffer or are not writable are ignored. The caller must not touch the buffer afterwards.
+        """
+        if (buffer is None or buffer.dtype != np.uint8 or not buffer.flags.c_contiguous
+                or not buffer.flags.writeable or buffer.base is not None):
+            return
+        with self._lock:
+            buffers = self._idle.setdefault(buffer.shape, [])
+            self._idle.move_to_end(buffer.shape)
+            if len(buffers) < self.per_shape and not any(b is buffer for b in buffers):
+                buffers.append(buffer)
+            while len(self._idle) > self.max_shapes:
+                self._idle.popitem(last=False)
+
+    @contextmanager
+    def checkout(self, shape):
+        """
+        Acquires a buffer for the duration of a with block.
+        """
+        buffer = self.acquire(shape)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "idle": {"x".join(map(str, shape)): len(buffers) for shape, buffers in self._idle.items()},
+            }
+
+
+FRAME_POOL = FramePool() # Shared by every request; buffers are keyed by shape
+
+
+def frame_size(frame):
+    """
+    Returns (width, height) of a frame or of a PIL image.
+    """
+    if isinstance(frame, np.ndarray):
+        return frame.shape[1], frame.shape[0]
+    return frame.size
+
+
+def bgr_to_frame(bgr, pool=FRAME_POOL) -> np.ndarray:
+    """
+    Converts a BGR image (OpenCV capture) into a pooled RGB frame. Release it to the pool when done.
+    """
+    frame = pool.acquire(bgr.shape)
+    cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=frame)
+    return frame
+
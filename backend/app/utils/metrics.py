@@ -0,0 +1,267 @@
+"""
+file: metrics.py
+
+Contains a small in-process metrics registry: fixed-bucket latency histograms, counters and gauges. It is
+cheap enough to stay on in production (one lock and one bisect per observation) and is exposed through
+/api/metrics as JSON or in the Prometheus text format.
+
+Pipeline stages are timed with the stage() context manager. Inside a Flask request, the stage timings are
+also collected so they can be returned in a Server-Timing header.
+"""
+
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+import psutil
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 15, 20, 30, 42, 50, 75, 100, 150, 250, 500, 1000, 2500, math.inf)
+# Upper bounds of the histogram buckets used for counts of items (batch sizes, queue depths)
+SIZE_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, math.inf)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[min(idx, len(self._counts) - 1)] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q, counts=None, total=None):
+        """
+        Estimates a quantile by linear interpolation inside the bucket that contains it.
+        """
+        if counts is None:
+            with self._lock:
+                counts, total = list(self._counts), self._count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for idx, count in enumerate(counts):
+            if seen + count >= rank and count:
+                upper = self.buckets[idx]
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-2]
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, value_sum = list(self._counts), self._count, self._sum
+        return {
+            "count": total,
+            "sum": round(value_sum, 3),
+            "mean": round(value_sum / total, 3) if total else None,
+            "p50": self._round(self.quantile(0.50, counts, total)),
+            "p95": self._round(self.quantile(0.95, counts, total)),
+            "p99": self._round(self.quantile(0.99, counts, total)),
+            "buckets": [["+Inf" if math.isinf(b) else b, c] for b, c in zip(self.buckets, counts)],
+        }
+
+    @staticmethod
+    def _round(value):
+        return None if value is None else round(value, 3)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self, fn=None):
+        """
+        Arguments:
+            fn: optional callable evaluated when the gauge is read, for values owned elsewhere
+        """
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def read(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception:
+            return None
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def _get(self, table, name, labels, factory):
+        key = (name, _label_key(labels))
+        metric = table.get(key)
+        if metric is None:
+            with self._lock:
+                metric = table.setdefault(key, factory())
+        return metric
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS_MS, **labels):
+        """
+        Returns the histogram for name/labels, creating it with `buckets` on first use.
+        """
+        return self._get(self._histograms, name, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, **labels):
+        return self._get(self._counters, name, labels, Counter)
+
+    def gauge(self, name, fn=None, **labels):
+        gauge = self._get(self._gauges, name, labels, lambda: Gauge(fn))
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS_MS, **labels):
+        self.histogram(name, buckets, **labels).observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    def _sorted_items(self):
+        def by_key(item):
+            name, labels = item[0]
+            return name, [(k, str(v)) for k, v in labels]
+
+        with self._lock:
+            return (
+                sorted(self._histograms.items(), key=by_key),
+                sorted(self._counters.items(), key=by_key),
+                sorted(self._gauges.items(), key=by_key),
+            )
+
+    @staticmethod
+    def _format_name(name, labels):
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+    def snapshot(self):
+        """
+        Returns: dict of every metric, keyed by name with its labels in Prometheus notation
+        """
+        histograms, counters, gauges = self._sorted_items()
+        return {
+            "histograms": {self._format_name(n, l): h.snapshot() for (n, l), h in histograms},
+            "counters": {self._format_name(n, l): c.value for (n, l), c in counters},
+            "gauges": {self._format_name(n, l): g.read() for (n, l), g in gauges},
+        }
+
+    def prometheus(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        histograms, counters, gauges = self._sorted_items()
+        lines = []
+        for (name, labels), hist in histograms:
+            snap = hist.snapshot()
+            cumulative = 0
+            for bound, count in snap["buckets"]:
+                cumulative += count
+                lines.append(f"{self._format_name(name + '_bucket', labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self._format_name(name + '_sum', labels)} {snap['sum']}")
+            lines.append(f"{self._format_name(name + '_count', labels)} {snap['count']}")
+        for (name, labels), counter in counters:
+            lines.append(f"{self._format_name(name, labels)} {counter.value}")
+        for (name, labels), gauge in gauges:
+            value = gauge.read()
+            if value is not None:
+                lines.append(f"{self._format_name(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry() # Process-wide registry
+
+_process = psutil.Process(os.getpid())
+METRICS.gauge("process_resident_memory_bytes", lambda: _process.memory_info().rss)
+METRICS.gauge("process_threads", lambda: threading.active_count())
+
+
+@contextmanager
+def stage(name, **labels):
+    """
+    Times a pipeline stage into the stage_duration_ms histogram.
+
+    Usage:
+        with stage("inference", detector="yolo"):
+            results = yolo_extract_faces(frame)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        METRICS.observe("stage_duration_ms", elapsed_ms, stage=name, **labels)
+        if has_request_context():
+            timings = g.setdefault("stage_timings", [])
+            timings.append((name, elapsed_ms))
+
+
+def register_metrics(app, timing_header=False):
+    """
+    Installs the request hooks that feed the registry: request latency and status counters per endpoint,
+    error counters, and the optional Server-Timing header.
+
+    Arguments:
+        app: Flask application
+        timing_header (bool): always send Server-Timing; otherwise only when the request sends X-Request-Timing: 1
+    """
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        endpoint = request.endpoint or "unknown"
+        METRICS.observe("request_duration_ms", elapsed_ms, endpoint=endpoint)
+        METRICS.inc("requests_total", endpoint=endpoint, status=response.status_code)
+        if response.status_code >= 400:
+            METRICS.inc("errors_total", endpoint=endpoint, kind="http")
+
+        if timing_header or request.headers.get("X-Request-Timing") == "1":
+            timings = g.get("stage_timings", [])
+            entries = [f"{name};dur={duration:.2f}" for name, duration in timings]
+            entries.append(f"total;dur={elapsed_ms:.2f}")
+            response.headers["Server-Timing"] = ", ".join(entries)
+        return response
+
+    @app.teardown_request
+    def _record_exception(exc):
+        if exc is not None:
+            METRICS.inc("errors_total", endpoint=request.endpoint or "unknown", kind="exception")
@@ -2,6 +2,25 @@ from PIL import Image
 import base64
 import io
 
+def encode_pillow_to_bytes(pil_img, format: str = "JPEG", quality: int = 85) -> bytes:
+    """
+    Transforms a Pillow image to encoded image bytes via IO buffering.
+
+    Arguments:
+        pil_img: Pillow image object
+        format (str): image format (JPEG, PNG, etc.)
+        quality (int): encoder quality (1-95), only used by lossy formats
+    """
+    buffered = io.BytesIO()
+    if format.upper() in ("JPEG", "JPG"):
+        if pil_img.mode != "RGB":
+            pil_img = pil_img.convert("RGB")
+        pil_img.save(buffered, format="JPEG", quality=quality)
+    else:
+        pil_img.save(buffered, format=format)
+
+    return buffered.getvalue()
+
 def encode_pillow_to_base64(pil_img, format: str = "PNG") -> str:
     """
     Transforms a Pillow image to a base64 string via IO buffering.
@@ -10,16 +29,26 @@ def encode_pillow_to_base64(pil_img, format: str = "PNG") -> str:
         pil_img: Pillow image object
         format (str): image format (JPG, PNG, etc.)
     """
-    buffered = io.BytesIO()
-    pil_img.save(buffered, format=format)
-    img_bytes = buffered.getvalue()
+    img_bytes = encode_pillow_to_bytes(pil_img, format=format)
     base64_string = base64.b64encode(img_bytes).decode("utf-8")
     
     return base64_string
 
-def decode_base64_to_pillow(base64_string: str) -> Image.Image:
+def decode_bytes_to_pillow(img_bytes: bytes) -> Image.Image:
     """
-    Transforms a base-64 string to a Pillow image object.
+    Transforms encoded image bytes (JPEG, PNG, etc.) to a Pillow image object.
+
+    Arguments:
+        img_bytes (bytes): inbound encoded image from an HTTP body
+    """
+    img_buffer = io.BytesIO(img_bytes)
+    pil_img = Image.open(img_buffer)
+
+    return pil_img
+
+def decode_base64_to_bytes(base64_string: str) -> bytes:
+    """
+    Transforms a base-64 string (optionally a data URL) to the encoded image bytes.
 
     Arguments:
         base64_string (str): inbound base-64 string from HTTP payload
@@ -28,11 +57,16 @@ def decode_base64_to_pillow(base64_string: str) -> Image.Image:
     if "," in base64_string:
         base64_string = base64_string.split(",")[1]
 
-    img_bytes = base64.b64decode(base64_string)
-    img_buffer = io.BytesIO(img_bytes)
-    pil_img = Image.open(img_buffer)
+    return base64.b64decode(base64_string)
 
-    return pil_img
+def decode_base64_to_pillow(base64_string: str) -> Image.Image:
+    """
+    Transforms a base-64 string to a Pillow image object.
+
+    Arguments:
+        base64_string (str): inbound base-64 string from HTTP payload
+    """
+    return decode_bytes_to_pillow(decode_base64_to_bytes(base64_string))
 
 
 
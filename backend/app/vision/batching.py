@@ -0,0 +1,128 @@
+"""
+file: batching.py
+
+Contains the micro-batching scheduler for detector inference. Request threads submit single frames and
+block on their own result. A scheduler thread collects the frames from concurrent requests into a batch,
+closing it when it holds `max_batch` frames or the oldest frame has waited `max_wait_ms`, and runs one
+batched call for all of them. With one client the added latency is at most `max_wait_ms`, and with several
+clients (displays, cameras) the model runs once per batch instead of once per frame.
+
+Batch sizes, queue waits and batch durations are recorded in the metrics registry.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from backend.app.utils.metrics import METRICS
+from backend.app.utils.metrics import SIZE_BUCKETS
+
+
+class SchedulerClosed(RuntimeError):
+    """Raised when a frame is submitted to a scheduler that has been shut down."""
+
+
+class BatchScheduler:
+    def __init__(self, run_batch, max_batch: int = 4, max_wait_ms: float = 5.0, name: str = "yolo"):
+        """
+        Arguments:
+            run_batch: callable taking a list of inputs and returning a list of results in the same order
+            max_batch (int): largest batch handed to run_batch
+            max_wait_ms (float): longest time the first frame of a batch waits for more frames
+            name (str): detector label for the metrics
+        """
+        self.run_batch = run_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue = deque()  # (input, future, enqueue time)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        METRICS.gauge("batch_queue_depth", lambda: len(self._queue), detector=name)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"batch-{self.name}", daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """
+        Queues one input for the next batch.
+
+        Returns: Future resolved with this input's result
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise SchedulerClosed(f"{self.name} batch scheduler has been closed")
+            self._ensure_started()
+            self._queue.append((item, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item, timeout=None):
+        """
+        Submits one input and waits for its result; exceptions raised by run_batch propagate.
+        """
+        return self.submit(item).result(timeout)
+
+    def _next_batch(self):
+        """
+        Blocks until a batch is ready: max_batch inputs queued, or the oldest input has waited max_wait.
+        """
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return []
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.max_batch, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            for _, _, enqueued in batch:
+                METRICS.observe("batch_queue_wait_ms", (start - enqueued) * 1000, detector=self.name)
+            METRICS.observe("batch_size", len(batch), SIZE_BUCKETS, detector=self.name)
+
+            try:
+                results = self.run_batch([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} inputs")
+            except BaseException as e:
+                METRICS.inc("errors_total", endpoint=f"batch.{self.name}", kind="exception")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                METRICS.observe("batch_duration_ms", (time.perf_counter() - start) * 1000, detector=self.name)
+                METRICS.inc("batches_total", detector=self.name)
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def close(self):
+        """
+        Stops the scheduler and fails every queued input. Idempotent.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            pending = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        for _, future, _ in pending:
+            future.set_exception(SchedulerClosed(f"{self.name} batch scheduler has been closed"))
@@ -0,0 +1,316 @@
+"""
+file: capture.py
+
+Contains the backend capture subsystem. A dedicated thread owns the frame source (a cv2.VideoCapture on
+a camera or video file, or a synthetic generator for testing without hardware) and writes every frame
+into a fixed-size, preallocated numpy ring buffer. Consumers read the newest frame as a read-only view
+into the ring, so camera I/O never blocks inference and no copy is made on the read path.
+
+Frames are stored in OpenCV's BGR order (see FrameRing.color_order).
+
+Source specs (CAPTURE_SOURCE):
+    "0", "1", ...                  camera index (/dev/video0, ...)
+    "path/to/video.mp4"            video file, looped at its native frame rate
+    "synthetic[:WxH[@fps]]"        moving test pattern, e.g. "synthetic:1280x720@24"
+
+A source that fails to open is not retried on every request: get_capture() keeps returning the failed
+thread, whose wait_ready() raises the open error at once, until a retry backoff has passed. The backoff
+doubles from RETRY_MIN_S up to RETRY_MAX_S while the source keeps failing.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+RETRY_MIN_S = 1.0   # wait before reopening a source that failed to open
+RETRY_MAX_S = 30.0  # cap of the doubling backoff
+
+
+class FrameRing:
+    def __init__(self, shape, slots: int = 4, dtype=np.uint8):
+        """
+        Arguments:
+            shape (tuple): frame shape (height, width, channels)
+            slots (int): number of preallocated frames, at least 2
+            dtype: numpy dtype of a frame
+        """
+        self.slots = max(2, int(slots))
+        self.shape = tuple(shape)
+        self.color_order = "BGR"
+        self._buf = np.zeros((self.slots,) + self.shape, dtype=dtype)
+        self._stamps = np.zeros(self.slots, dtype=np.float64)
+        self._cond = threading.Condition()
+        self._seq = -1  # sequence number of the newest committed frame
+
+    def write_slot(self):
+        """
+        Returns the (sequence number, writable view) of the slot the next frame must be written into.
+        The slot never aliases the newest committed frame.
+        """
+        seq = self._seq + 1
+        return seq, self._buf[seq % self.slots]
+
+    def commit(self, seq, timestamp=None):
+        """
+        Publishes the frame written into write_slot() as the newest frame.
+        """
+        with self._cond:
+            self._stamps[seq % self.slots] = time.monotonic() if timestamp is None else timestamp
+            self._seq = seq
+            self._cond.notify_all()
+
+    def latest(self):
+        """
+        Returns: (seq, read-only frame view, monotonic timestamp) of the newest frame, or None if empty.
+
+        The view stays valid until the writer wraps around to its slot, i.e. for the next `slots - 1` frames.
+        Consumers that hold a frame longer than that should copy it or check still_valid(seq) afterwards.
+        """
+        with self._cond:
+            seq = self._seq
+            if seq < 0:
+                return None
+            idx = seq % self.slots
+            stamp = float(self._stamps[idx])
+        view = self._buf[idx].view()
+        view.flags.writeable = False
+        return seq, view, stamp
+
+    def wait_newer(self, after_seq, timeout=None):
+        """
+        Blocks until a frame newer than after_seq is committed.
+
+        Returns: same as latest(), or None on timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                return None
+        return self.latest()
+
+    def still_valid(self, seq):
+        """
+        Returns True while the slot of frame `seq` has not been overwritten by the writer.
+        """
+        with self._cond:
+            return self._seq - self.slots + 1 < seq <= self._seq
+
+
+class SyntheticSource:
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 24.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._frame_idx = 0
+        self._xs = np.arange(width, dtype=np.int32)[None, :]
+        self._ys = np.arange(height, dtype=np.int32)[:, None]
+
+    def open(self):
+        return (self.height, self.width, 3)
+
+    def read_into(self, out):
+        """
+        Renders a gradient background with a bright square moving across it, in place.
+        """
+        t = self._frame_idx
+        out[..., 0] = ((self._xs + t * 4) & 0xFF).astype(np.uint8)
+        out[..., 1] = ((self._ys + t * 2) & 0xFF).astype(np.uint8)
+        out[..., 2] = 64
+        size = max(8, min(self.width, self.height) // 6)
+        x = (t * 8) % max(1, self.width - size)
+        y = (self.height - size) // 2
+        out[y:y + size, x:x + size] = 255
+        self._frame_idx += 1
+        return True
+
+    def release(self):
+        pass
+
+
+class VideoCaptureSource:
+    def __init__(self, source, loop: bool = True):
+        """
+        Arguments:
+            source: camera index (int) or video file path (str)
+            loop (bool): rewind video files at the end instead of stopping
+        """
+        self.source = source
+        self.loop = loop
+        self.is_file = not isinstance(source, int)
+        self.fps = None
+        self._vid = None
+
+    def open(self):
+        self._vid = cv2.VideoCapture(self.source)
+        if not self._vid.isOpened():
+            raise RuntimeError(f"Unable to open video source {self.source!r}")
+        if self.is_file:
+            fps = self._vid.get(cv2.CAP_PROP_FPS)
+            self.fps = fps if fps and fps > 0 else None
+
+        ret, frame = self._vid.read()
+        if not ret:
+            raise RuntimeError(f"Video source {self.source!r} returned no frames")
+        if self.is_file:
+            self._vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return frame.shape
+
+    def read_into(self, out):
+        ret, frame = self._vid.read(out)
+        if not ret and self.is_file and self.loop:
+            self._vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._vid.read(out)
+        if not ret:
+            return False
+        if frame is not out and not np.shares_memory(frame, out):
+            # OpenCV allocates a new array when the decoded shape differs from the slot
+            if frame.shape != out.shape:
+                return False
+            np.copyto(out, frame)
+        return True
+
+    def release(self):
+        if self._vid is not None and self._vid.isOpened():
+            self._vid.release()
+
+
+def parse_source(spec):
+    """
+    Builds a frame source from a CAPTURE_SOURCE spec (see module docstring).
+    """
+    spec = str(spec).strip()
+    if spec.isdigit():
+        return VideoCaptureSource(int(spec))
+    if spec.startswith("synthetic"):
+        width, height, fps = 640, 480, 24.0
+        _, _, params = spec.partition(":")
+        if params:
+            size, _, rate = params.partition("@")
+            width, height = (int(v) for v in size.lower().split("x"))
+            if rate:
+                fps = float(rate)
+        return SyntheticSource(width, height, fps)
+    return VideoCaptureSource(spec)
+
+
+class CaptureThread(threading.Thread):
+    def __init__(self, source, slots: int = 4):
+        """
+        Arguments:
+            source: frame source object or CAPTURE_SOURCE spec string
+            slots (int): number of frames in the ring buffer
+        """
+        super().__init__(name="capture", daemon=True)
+        self.source = parse_source(source) if isinstance(source, (str, int)) else source
+        self.slots = slots
+        self.ring = None
+        self.error = None
+        self.failed_at = None  # monotonic time the source failed to open
+        self.frames = 0
+        self.failures = 0
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+
+    def wait_ready(self, timeout=None):
+        """
+        Blocks until the source is opened and the ring is allocated. Raises the open error, if any.
+        """
+        self._ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.ring
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        try:
+            shape = self.source.open()
+            self.ring = FrameRing(shape, self.slots)
+        except Exception as e:
+            self.error = e
+            self.failed_at = time.monotonic()
+            self._ready.set()
+            return
+        self._ready.set()
+
+        # Files and synthetic sources have no hardware clock, so they are paced to their frame rate
+        fps = getattr(self.source, "fps", None)
+        interval = 1.0 / fps if fps else 0.0
+        next_due = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                seq, slot = self.ring.write_slot()
+                if self.source.read_into(slot):
+                    self.ring.commit(seq)
+                    self.frames += 1
+                else:
+                    self.failures += 1
+                    if self._stop_event.wait(0.05):
+                        break
+                    continue
+
+                if interval:
+                    next_due += interval
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+                    else:
+                        next_due = time.monotonic()
+        finally:
+            self.source.release()
+
+    def stats(self):
+        latest = self.ring.latest() if self.ring is not None else None
+        return {
+            "running": self.is_alive(),
+            "frames": self.frames,
+            "failures": self.failures,
+            "slots": self.slots,
+            "shape": list(self.ring.shape) if self.ring is not None else None,
+            "latest_seq": latest[0] if latest else None,
+            "latest_age_ms": round((time.monotonic() - latest[2]) * 1000, 2) if latest else None,
+            "error": str(self.error) if self.error else None,
+        }
+
+
+_capture = None
+_capture_lock = threading.Lock()
+_retry_delay = RETRY_MIN_S
+
+def get_capture(source=None, slots: int = 4):
+    """
+    Returns the shared capture thread, starting it on first use.
+
+    Arguments:
+        source: CAPTURE_SOURCE spec; only used when the thread is started
+        slots (int): ring buffer size; only used when the thread is started
+
+    Returns: the running CaptureThread, the failed one while its retry backoff lasts, or None when no
+             source is configured
+    """
+    global _capture, _retry_delay
+    with _capture_lock:
+        if _capture is None or not _capture.is_alive():
+            if source is None or str(source).strip() == "":
+                return None
+            if _capture is not None and _capture.failed_at is not None:
+                if time.monotonic() - _capture.failed_at < _retry_delay:
+                    return _capture
+                _retry_delay = min(RETRY_MAX_S, _retry_delay * 2)
+            else:
+                _retry_delay = RETRY_MIN_S
+            _capture = CaptureThread(source, slots)
+            _capture.start()
+    return _capture
+
+def stop_capture():
+    global _capture, _retry_delay
+    with _capture_lock:
+        if _capture is not None:
+            _capture.stop(timeout=2.0)
+            _capture = None
+        _retry_delay = RETRY_MIN_S
@@ -0,0 +1,154 @@
+"""
+file: cascade.py
+
+Contains the second stage of the YOLO -> Mediapipe cascade. The media detector runs Mediapipe's face
+detection and landmark regression on the whole frame and stops at max_faces. In the cascade, YOLO has
+already found the faces. Each YOLO box is grown into a square crop, padded by `pad` of its side so the
+whole face and some context are visible. The crops are scaled into `tile` pixel tiles and packed into a
+mosaic of at most `grid` x `grid` tiles, and a single landmarker call handles the whole mosaic. The cost
+therefore grows with the number of faces, not with the frame's resolution, and there is no face limit:
+more faces just make more mosaics.
+
+Mediapipe still runs its own face detector on the mosaic, so the tiles must stay large enough for it.
+At grid 3 every face of a test mosaic is found; at grid 4 a third of them are missed. Each face the
+landmarker returns is assigned to the tile holding its centroid and mapped back through that tile's
+scale and offset. YOLO boxes the landmarker finds no face in are counted in cascade_faces_missed_total;
+the pipeline keeps them with their box center and an upright stamp, so the cascade never draws fewer
+faces than YOLO alone.
+"""
+
+import math
+
+import cv2
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks.python import vision
+
+from backend.app.utils.metrics import METRICS
+from backend.app.vision.detectors import to_rgb_array
+from backend.app.vision.landmarks import LandmarkFeatures
+from backend.app.vision.landmarks import feature_points
+from backend.app.vision.landmarks import landmarks_to_planes
+from backend.app.vision.letterbox import LETTERBOX_FILL
+
+
+def square_crops(boxes, frame_size, pad=0.25):
+    """
+    Grows face boxes into padded squares, clipped to the frame.
+
+    Arguments:
+        boxes: face boxes as [x1, y1, x2, y2, ...] in frame pixels
+        frame_size (tuple): (width, height) of the frame
+        pad (float): margin on every side, relative to the box's longest side
+
+    Returns: (N, 4) int array of [x1, y1, x2, y2] crops, each at least one pixel wide and high
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 5)[:, :4]
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    half = (boxes[:, 2:] - boxes[:, :2]).max(axis=1, keepdims=True) * (0.5 + pad)
+    crops = np.concatenate([centers - half, centers + half], axis=1)
+    img_w, img_h = frame_size
+    crops[:, [0, 2]] = np.clip(crops[:, [0, 2]], 0, img_w)
+    crops[:, [1, 3]] = np.clip(crops[:, [1, 3]], 0, img_h)
+    crops = crops.round().astype(np.int32)
+    crops[:, 2:] = np.maximum(crops[:, 2:], crops[:, :2] + 1)
+    return crops
+
+
+class CascadeLandmarker:
+    def __init__(self, pool, model_path, pad: float = 0.25, tile: int = 192, grid: int = 3):
+        """
+        Arguments:
+            pool (LandmarkerPool): shared landmarker pool
+            model_path (str): FaceLandmarker .task file
+            pad (float): margin added around each YOLO box, relative to its longest side
+            tile (int): side in pixels of the tile each face is scaled into
+            grid (int): tiles per mosaic row and column
+        """
+        self.pool = pool
+        self.model_path = model_path
+        self.pad = pad
+        self.tile = max(32, int(tile))
+        self.grid = max(1, int(grid))
+
+    def warmup(self):
+        """
+        Builds the pooled landmarkers of the mosaics ahead of the first request.
+        """
+        self.pool.warm(self.model_path, self.grid * self.grid, count=self.pool.size)
+
+    def _mosaic(self, rgb, crops):
+        """
+        Packs crops into one mosaic.
+
+        Returns: (mosaic, (N, 3) float32 rows of [tile origin x, tile origin y, scale] per crop)
+        """
+        tile = self.tile
+        cols = min(math.ceil(math.sqrt(len(crops))), self.grid)  # as square as possible
+        rows = math.ceil(len(crops) / cols)
+        mosaic = np.full((rows * tile, cols * tile, 3), LETTERBOX_FILL, dtype=np.uint8)
+        placement = np.empty((len(crops), 3), dtype=np.float32)
+        for i, (x1, y1, x2, y2) in enumerate(crops):
+            crop_w, crop_h = x2 - x1, y2 - y1
+            scale = tile / max(crop_w, crop_h)
+            new_w, new_h = max(1, round(crop_w * scale)), max(1, round(crop_h * scale))
+            tile_x = (i % cols) * tile + (tile - new_w) // 2
+            tile_y = (i // cols) * tile + (tile - new_h) // 2
+            roi = mosaic[tile_y:tile_y + new_h, tile_x:tile_x + new_w]
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            cv2.resize(rgb[y1:y2, x1:x2], (new_w, new_h), dst=roi, interpolation=interpolation)
+            placement[i] = (tile_x, tile_y, scale)
+        return mosaic, placement
+
+    def _landmark(self, rgb, crops):
+        """
+        Runs the landmarker on one mosaic of crops.
+
+        Returns: ((faces, points, 2) feature points in frame pixels, (faces,) index of each face's crop),
+                 at most one face per crop
+        """
+        mosaic, placement = self._mosaic(rgb, crops)
+        mp_frame = mp.Image(image_format=mp.ImageFormat.SRGB, data=mosaic)
+        # Every mosaic uses the same max faces, so all of them share one set of pooled landmarkers
+        with self.pool.checkout(self.model_path, self.grid * self.grid, vision.RunningMode.IMAGE) as landmarker:
+            result = landmarker.detect(mp_frame)
+
+        height, width = mosaic.shape[:2]
+        points = feature_points(landmarks_to_planes(result.face_landmarks))
+        points *= np.array((width, height), dtype=np.float32)
+        cell = (points[:, 0] // self.tile).astype(np.int32)  # (column, row) of each face's centroid
+        tiles = cell[:, 1] * (width // self.tile) + cell[:, 0]
+        # Keep the first face found in each occupied tile
+        tiles, first = np.unique(tiles, return_index=True)
+        keep = tiles < len(crops)
+        tiles, points = tiles[keep], points[first[keep]]
+
+        origin, scale = placement[tiles, None, :2], placement[tiles, None, 2:]
+        return (points - origin) / scale + crops[tiles, None, :2], tiles
+
+    def detect(self, frame, boxes):
+        """
+        Finds the landmarks of the faces YOLO detected.
+
+        Arguments:
+            frame: current frame, PIL image or RGB numpy array
+            boxes: YOLO face boxes as [x1, y1, x2, y2, confidence] in frame pixels
+
+        Returns: (LandmarkFeatures of the faces the landmarker found, in frame pixels, int array of the
+                 index in `boxes` of each of those faces)
+        """
+        rgb = to_rgb_array(frame)
+        frame_size = (rgb.shape[1], rgb.shape[0])
+        crops = square_crops(boxes, frame_size, self.pad)
+        per_mosaic = self.grid * self.grid
+        points = [feature_points(landmarks_to_planes([]))]
+        found = [np.empty(0, dtype=np.int64)]
+        for start in range(0, len(crops), per_mosaic):
+            mosaic_points, tiles = self._landmark(rgb, crops[start:start + per_mosaic])
+            points.append(mosaic_points)
+            found.append(tiles.astype(np.int64) + start)
+        points, found = np.concatenate(points), np.concatenate(found)
+        missed = len(crops) - len(found)
+        if missed:
+            METRICS.inc("cascade_faces_missed_total", missed)
+        return LandmarkFeatures.from_points(points.astype(np.float32), frame_size), found
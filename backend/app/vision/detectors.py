@@ -0,0 +1,337 @@
+"""
+file: detectors.py
+
+Contains the detector interface shared by every face detection backend, and its implementations:
+
+    UltralyticsDetector  YOLO through ultralytics/PyTorch (the reference implementation)
+    OnnxDetector         an exported YOLO model on ONNX Runtime, without torch in the process
+    MediapipeDetector    Mediapipe FaceLandmarker instances from the shared LandmarkerPool
+
+A detector splits a detection into detect(frame), which runs the model and returns its raw output, and
+boxes()/centroids(), which turn that output into plain lists. The split keeps the "inference" and "coords"
+pipeline stages separately measurable.
+
+Detectors with an input size letterbox every frame to it first (see letterbox.py). Their raw output
+carries the LetterboxTransform, and boxes()/centroids() always answer in the original frame's pixels.
+"""
+
+import threading
+
+import cv2
+import mediapipe as mp
+from mediapipe.tasks.python import vision
+import numpy as np
+
+from backend.app.vision.landmarks import LandmarkFeatures
+from backend.app.vision.letterbox import Letterbox
+from backend.app.vision.letterbox import LetterboxTransform
+
+
+def to_rgb_array(frame):
+    """
+    Returns an (H, W, 3) uint8 RGB view of a PIL image or a numpy frame.
+    """
+    if isinstance(frame, np.ndarray):
+        return frame
+    return np.asarray(frame.convert("RGB") if frame.mode != "RGB" else frame)
+
+
+def box_centroids(boxes):
+    # Arguments: boxes (list of [x1, y1, x2, y2, confidence])
+    # Returns: Array of face centroids
+    return [[(x1+x2)/2, (y1+y2)/2] for x1, y1, x2, y2, _ in boxes]
+
+
+class Detector:
+    """
+    Base class of the face detectors.
+    """
+
+    name = "detector"
+    letterbox = None # Letterbox to the inference size, or None to run at the frame's resolution
+
+    @property
+    def input_size(self):
+        return self.letterbox.size if self.letterbox else None
+
+    def _prepare(self, frame):
+        """
+        Returns: (RGB array the model runs on, LetterboxTransform back to frame pixels)
+        """
+        rgb = to_rgb_array(frame)
+        if self.letterbox is None:
+            return rgb, LetterboxTransform.identity((rgb.shape[1], rgb.shape[0]))
+        return self.letterbox.fit(rgb)
+
+    def detect(self, frame):
+        """
+        Runs the model on a frame (PIL image or RGB numpy array).
+
+        Returns: backend-specific raw output, consumed by boxes() and centroids()
+        """
+        raise NotImplementedError
+
+    def detect_batch(self, frames):
+        """
+        Runs the model on several frames; backends that support batched inference override this.
+
+        Returns: list with one detect() output per frame
+        """
+        return [self.detect(frame) for frame in frames]
+
+    def boxes(self, output):
+        """
+        Returns: list of face boxes as [x1, y1, x2, y2, confidence] in frame pixels
+        """
+        raise NotImplementedError
+
+    def centroids(self, output):
+        """
+        Returns: list of face centroids as [x, y] in frame pixels
+        """
+        return box_centroids(self.boxes(output))
+
+    def landmarks(self, output):
+        """
+        Returns: LandmarkFeatures of the faces, or None for detectors without facial landmarks
+        """
+        return None
+
+    def warmup(self, frames: int = 1, size=(640, 480)):
+        """
+        Runs the model on blank frames so one-off graph and buffer setup happens before the first request.
+        """
+        size = self.input_size or size
+        blank = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        for _ in range(frames):
+            self.detect(blank)
+
+    def close(self):
+        pass
+
+
+class UltralyticsDetector(Detector):
+    name = "ultralytics"
+
+    def __init__(self, model_path, input_size=None):
+        """
+        Arguments:
+            model_path (str): YOLO .pt weights
+            input_size (tuple): (width, height) to letterbox to, multiples of 32; None lets ultralytics resize
+        """
+        from ultralytics import YOLO # Pulls in torch, so only the backends that need it import it
+        self.model = YOLO(model_path)
+        if input_size:
+            # Small frames are enlarged like ultralytics does itself, so detection quality is unchanged
+            self.letterbox = Letterbox(input_size, scaleup=True)
+
+    def detect(self, frame):
+        """
+        Returns: (ultralytics Results, LetterboxTransform)
+        """
+        if self.letterbox is None:
+            # ultralytics reads numpy frames as BGR (OpenCV order)
+            source = frame[..., ::-1] if isinstance(frame, np.ndarray) else frame
+            return self.model.predict(source=source, save=False, verbose=False), None
+        img, transform = self._prepare(frame)
+        in_w, in_h = self.letterbox.size
+        # ultralytics reads numpy frames as BGR (OpenCV order)
+        results = self.model.predict(source=img[..., ::-1], imgsz=(in_h, in_w), save=False, verbose=False)
+        return results, transform
+
+    def detect_batch(self, frames):
+        if self.letterbox is None:
+            sources = [frame[..., ::-1] if isinstance(frame, np.ndarray) else frame for frame in frames]
+            results = self.model.predict(source=sources, save=False, verbose=False)
+            return [([result], None) for result in results]
+        images, transforms = [], []
+        for frame in frames:
+            img, transform = self._prepare(frame)
+            # The canvas is reused by the next fit(), so each frame of the batch keeps its own BGR copy
+            images.append(img[..., ::-1].copy())
+            transforms.append(transform)
+        in_w, in_h = self.letterbox.size
+        results = self.model.predict(source=images, imgsz=(in_h, in_w), save=False, verbose=False)
+        return [([result], transform) for result, transform in zip(results, transforms)]
+
+    def boxes(self, output):
+        results, transform = output
+        ret = []
+        for result in results:
+            for box in result.boxes:
+                x1,y1,x2,y2 = box.xyxy[0].tolist()
+                ret.append([x1,y1,x2,y2,float(box.conf[0])])
+        if transform is None or not ret:
+            return ret
+        return transform.boxes_to_frame(ret).tolist()
+
+
+class OnnxDetector(Detector):
+    name = "onnx"
+
+    def __init__(self, model_path, conf_threshold: float = 0.25, iou_threshold: float = 0.7,
+                 threads: int = 0, providers=None):
+        """
+        Arguments:
+            model_path (str): YOLOv8 model exported to ONNX with a fixed input shape (see vision/export.py)
+            conf_threshold (float): minimum face score, the ultralytics predict() default
+            iou_threshold (float): NMS overlap threshold, the ultralytics predict() default
+            threads (int): intra-op threads; 0 lets ONNX Runtime use every core
+            providers (list): execution providers, e.g. ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=providers or ["CPUExecutionProvider"],
+        )
+
+        model_input = self.session.get_inputs()[0]
+        batch, _, height, width = model_input.shape
+        if not isinstance(height, int) or not isinstance(width, int):
+            raise ValueError(f"{model_path} has a dynamic input shape; export it with a fixed imgsz")
+        self.input_name = model_input.name
+        # Frames per session.run: the exported batch size, or None when the batch axis is dynamic
+        self.batch_size = batch if isinstance(batch, int) else None
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        # The exported input shape is the inference size; the profile does not apply to it
+        self.letterbox = Letterbox((width, height), scaleup=True)
+        self._dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+        self._local = threading.local()
+
+    def _tensor(self, batch):
+        """
+        Returns this thread's preallocated (batch, 3, H, W) input tensor.
+        """
+        tensors = self._local.__dict__.setdefault("tensors", {})
+        tensor = tensors.get(batch)
+        if tensor is None:
+            width, height = self.letterbox.size
+            tensor = tensors[batch] = np.zeros((batch, 3, height, width), dtype=self._dtype)
+        return tensor
+
+    def preprocess(self, rgb, out=None):
+        """
+        Letterboxes and normalizes a frame into a (3, H, W) slice of a preallocated input tensor.
+
+        Arguments:
+            rgb (np.ndarray): (H, W, 3) RGB frame
+            out (np.ndarray): (3, H, W) destination; defaults to this thread's single-frame tensor
+
+        Returns: (input tensor, LetterboxTransform). The tensor is overwritten by the next call on the same thread.
+        """
+        if out is None:
+            tensor = self._tensor(1)
+            out = tensor[0]
+        else:
+            tensor = out
+        canvas, transform = self.letterbox.fit(rgb)
+        np.multiply(canvas.transpose(2, 0, 1), 1 / 255, out=out, casting="unsafe")
+        return tensor, transform
+
+    def _postprocess(self, prediction, transform):
+        # YOLOv8 output: (4 + classes [+ keypoints], anchors) with boxes as centre x, centre y, w, h.
+        # Face models are single class, so row 4 is the face score.
+        scores = prediction[4].astype(np.float32)
+        keep = scores >= self.conf_threshold
+        if not keep.any():
+            return np.empty((0, 5), dtype=np.float32)
+        cx, cy, w, h = prediction[:4, keep].astype(np.float32)
+        scores = scores[keep]
+
+        x1, y1 = cx - w / 2, cy - h / 2
+        idx = cv2.dnn.NMSBoxes(
+            np.stack([x1, y1, w, h], axis=1).tolist(), scores.tolist(), self.conf_threshold, self.iou_threshold,
+        )
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+
+        canvas_boxes = np.stack([x1[idx], y1[idx], x1[idx] + w[idx], y1[idx] + h[idx], scores[idx]], axis=1)
+        out = transform.boxes_to_frame(canvas_boxes)
+        # Highest score first, like ultralytics
+        return out[np.argsort(-out[:, 4], kind="stable")]
+
+    def detect(self, frame):
+        """
+        Returns: (N, 5) float32 array of [x1, y1, x2, y2, confidence] after NMS, in frame pixels
+        """
+        if self.batch_size not in (None, 1):
+            return self.detect_batch([frame])[0]
+        tensor, transform = self.preprocess(to_rgb_array(frame))
+        prediction = self.session.run(None, {self.input_name: tensor})[0][0]
+        return self._postprocess(prediction, transform)
+
+    def detect_batch(self, frames):
+        if self.batch_size == 1:
+            return super().detect_batch(frames)
+        outputs = []
+        chunk = self.batch_size or len(frames)
+        for start in range(0, len(frames), chunk):
+            group = frames[start:start + chunk]
+            # A fixed-batch model always gets a full tensor; rows past the group are ignored
+            tensor = self._tensor(chunk)
+            transforms = [self.preprocess(to_rgb_array(frame), out=tensor[i])[1] for i, frame in enumerate(group)]
+            predictions = self.session.run(None, {self.input_name: tensor})[0]
+            outputs += [self._postprocess(predictions[i], t) for i, t in enumerate(transforms)]
+        return outputs
+
+    def boxes(self, output):
+        return output.tolist()
+
+
+class MediapipeDetector(Detector):
+    name = "media"
+
+    def __init__(self, pool, model_path, max_faces: int = 5, input_size=None):
+        """
+        Arguments:
+            pool (LandmarkerPool): shared landmarker pool
+            model_path (str): FaceLandmarker .task file
+            max_faces (int): default number of faces to look for
+            input_size (tuple): (width, height) to letterbox to; None runs at the frame's resolution
+        """
+        self.pool = pool
+        self.model_path = model_path
+        self.max_faces = max_faces
+        if input_size:
+            self.letterbox = Letterbox(input_size)
+
+    def detect(self, frame, model_path=None, max_faces=None):
+        """
+        Returns: (FaceLandmarkerResult, LandmarkFeatures); the features are built once here, in frame pixels
+        """
+        img, transform = self._prepare(frame)
+        mp_frame = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(img))
+        with self.pool.checkout(
+            model_path or self.model_path, max_faces or self.max_faces, vision.RunningMode.IMAGE,
+        ) as landmarker:
+            result = landmarker.detect(mp_frame)
+        return result, LandmarkFeatures.from_result(result.face_landmarks, transform)
+
+    def landmarks(self, output):
+        return output[1]
+
+    def boxes(self, output):
+        # The landmarker reports no face score, so every face gets confidence 1.0
+        return output[1].boxes.tolist()
+
+    def centroids(self, output):
+        return output[1].centroids.astype(int).tolist()
+
+    def warmup(self, frames: int = 1, size=(640, 480)):
+        size = self.input_size or size
+        blank = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        mp_frame = mp.Image(image_format=mp.ImageFormat.SRGB, data=blank)
+        # Hold every pooled instance at once so each of them gets its warmup pass
+        landmarkers = [self.pool.acquire(self.model_path, self.max_faces) for _ in range(self.pool.size)]
+        try:
+            for landmarker in landmarkers:
+                for _ in range(frames):
+                    landmarker.detect(mp_frame)
+        finally:
+            for landmarker in landmarkers:
+                self.pool.release(landmarker)
@@ -0,0 +1,138 @@
+"""
+file: executor.py
+
+Contains the bounded executor that runs detector inference. The server has many request threads
+(SERVER_THREADS), but only INFER_CONCURRENCY of them may run a detector at once. The remaining
+threads stay free for health checks, metrics and clients that are waiting on I/O. Requests waiting
+for a detector are queued. Once INFER_QUEUE_MAX are waiting, new ones are turned away with
+InferenceBusy (a 503) instead of piling up behind slow frames.
+
+The queue is fair between streams. Waiting calls are queued per stream key and the workers take them
+round robin, one call per stream in turn, so a camera sending frames as fast as it can does not delay
+a camera at 5 fps by more than one frame. A stream with INFER_STREAM_QUEUE_MAX calls already waiting
+gets InferenceBusy for its next one, so it cannot fill the shared queue on its own either.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from collections import deque
+from concurrent.futures import Future
+
+from backend.app.utils.metrics import METRICS
+
+
+class InferenceBusy(RuntimeError):
+    """Raised when the inference queue is full; the client should retry later."""
+
+
+class InferenceExecutor:
+    def __init__(self, workers: int = 2, max_queue: int = 16, timeout: float = 30.0, max_stream_queue: int = 0,
+                 key=None):
+        """
+        Arguments:
+            workers (int): inference calls running at once
+            max_queue (int): calls allowed to wait for a worker before new ones are rejected
+            timeout (float): seconds a caller waits for its result (queueing included)
+            max_stream_queue (int): calls one stream may have waiting; 0 only applies max_queue
+            key: callable returning the caller's stream key; None queues every call in one FIFO
+        """
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.max_stream_queue = max(0, int(max_stream_queue))
+        self.key = key
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # stream key -> deque of waiting calls, next stream to serve first
+        self._pending = 0  # submitted calls that have not finished yet
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"inference-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        METRICS.gauge("inference_queue_depth", lambda: max(0, self._pending - self.workers))
+        METRICS.gauge("inference_queue_streams", lambda: len(self._queues))
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on an inference worker and waits for its result.
+        Exceptions raised by fn propagate to the caller.
+        """
+        key = self.key() if self.key is not None else None
+        queued = time.perf_counter()
+        def timed():
+            METRICS.observe("inference_queue_wait_ms", (time.perf_counter() - queued) * 1000)
+            return fn(*args, **kwargs)
+
+        # Run in a copy of the caller's context so the Flask request (e.g. X-Stream-Id) stays visible
+        context = contextvars.copy_context()
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("inference executor is closed")
+            if self._pending >= self.workers + self.max_queue:
+                METRICS.inc("inference_rejected_total")
+                raise InferenceBusy(f"inference queue is full ({self.max_queue} waiting)")
+            queue = self._queues.get(key)
+            if self.max_stream_queue and queue is not None and len(queue) >= self.max_stream_queue:
+                METRICS.inc("inference_rejected_total")
+                raise InferenceBusy(f"stream has {len(queue)} frames waiting for inference")
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append((future, context, timed))
+            self._pending += 1
+            self._cond.notify()
+
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # A call still waiting is dropped instead of running for nobody
+            future.cancel()
+            raise
+
+    def _next(self):
+        """
+        Returns: the oldest waiting call of the stream whose turn it is, or None once closed
+        """
+        with self._cond:
+            while not self._queues and not self._closed:
+                self._cond.wait()
+            if not self._queues:
+                return None
+            key, queue = next(iter(self._queues.items()))
+            call = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            return call
+
+    def _work(self):
+        while True:
+            call = self._next()
+            if call is None:
+                return
+            future, context, fn = call
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = context.run(fn)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._cond:
+                    self._pending -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            waiting = [call[0] for queue in self._queues.values() for call in queue]
+            self._queues.clear()
+            self._pending -= len(waiting)
+            self._cond.notify_all()
+        for future in waiting:
+            future.cancel()
@@ -0,0 +1,264 @@
+"""
+file: export.py
+
+Exports the YOLO face model to ONNX for the onnx detector backend and validates the exported model against
+the PyTorch one. Exporting needs ultralytics/torch, so it runs on a development machine or once during
+setup. The Pi then serves with DETECTOR_BACKEND=onnx and never imports torch.
+
+The export has a fixed input shape (--imgsz, --batch) so ONNX Runtime can plan its memory once. It can optionally be
+quantized:
+    int8    static QDQ quantization, calibrated on the --calibration frames (smallest and fastest on ARM CPUs)
+    fp16    half-precision weights and activations (for execution providers with fp16 kernels, e.g. OpenVINO)
+
+Validation runs both models on the same frames, matches their boxes by IoU and fails (exit status 1) when
+the exported model misses or invents faces, or its boxes drift, beyond the thresholds.
+
+Usage (from the repository root):
+    python -m backend.app.vision.export export --weights ./models/yolo/yolov8n-face.pt --quantize int8
+    python -m backend.app.vision.export validate --onnx ./models/yolo/yolov8n-face.onnx --images ./frames
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from backend.app.utils.env_helper import EnvVars
+from backend.app.vision.detectors import OnnxDetector
+from backend.app.vision.detectors import UltralyticsDetector
+from backend.app.vision.tracker import iou_matrix
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+QUANTIZE_MODES = ("none", "int8", "fp16")
+
+
+def load_images(paths, max_frames: int = 200):
+    """
+    Loads RGB frames from image files, directories of images and video files.
+
+    Returns: list of (H, W, 3) uint8 RGB arrays
+    """
+    frames = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+            files = [os.path.join(path, n) for n in names]
+        else:
+            files = [path]
+
+        for file in files:
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                with Image.open(file) as img:
+                    frames.append(np.asarray(img.convert("RGB")))
+            else:
+                vid = cv2.VideoCapture(file)
+                while len(frames) < max_frames:
+                    ret, frame = vid.read()
+                    if not ret:
+                        break
+                    frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                vid.release()
+            if len(frames) >= max_frames:
+                return frames[:max_frames]
+    return frames
+
+
+class _CalibrationReader:
+    """
+    Feeds letterboxed calibration frames to onnxruntime's static quantizer.
+    """
+
+    def __init__(self, detector, frames):
+        self._detector = detector
+        self._frames = iter(frames)
+
+    def get_next(self):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        tensor, _ = self._detector.preprocess(frame)
+        return {self._detector.input_name: tensor.copy()}
+
+    def rewind(self):
+        pass
+
+
+def quantize_int8(fp32_path, output_path, calibration_frames):
+    from onnxruntime.quantization import CalibrationMethod
+    from onnxruntime.quantization import QuantFormat
+    from onnxruntime.quantization import QuantType
+    from onnxruntime.quantization import quantize_static
+
+    if not calibration_frames:
+        raise SystemExit("int8 quantization needs calibration frames (--calibration)")
+    reader = _CalibrationReader(OnnxDetector(fp32_path), calibration_frames)
+    quantize_static(
+        fp32_path,
+        output_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+
+def quantize_fp16(fp32_path, output_path):
+    import onnx
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    model = convert_float_to_float16(onnx.load(fp32_path), keep_io_types=False)
+    onnx.save(model, output_path)
+
+
+def export(args):
+    from ultralytics import YOLO
+
+    print(f"Exporting {args.weights} at {args.imgsz}x{args.imgsz}...")
+    exported = YOLO(args.weights).export(
+        format="onnx", imgsz=args.imgsz, batch=args.batch, dynamic=False, simplify=True, opset=args.opset,
+    )
+    output = args.output or os.path.splitext(args.weights)[0] + ".onnx"
+
+    if args.quantize == "none":
+        if os.path.abspath(exported) != os.path.abspath(output):
+            shutil.move(exported, output)
+    elif args.quantize == "int8":
+        print(f"Quantizing to int8 with {len(args.calibration)} calibration source(s)...")
+        quantize_int8(exported, output, load_images(args.calibration, args.max_frames))
+    elif args.quantize == "fp16":
+        print("Converting to fp16...")
+        quantize_fp16(exported, output)
+    print(f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+    if args.no_validate:
+        return 0
+    args.onnx = output
+    return validate(args)
+
+
+def _timed(detector, frame):
+    start = time.perf_counter()
+    boxes = detector.boxes(detector.detect(frame))
+    return boxes, (time.perf_counter() - start) * 1000
+
+
+def compare_boxes(reference, candidate, match_iou: float = 0.5):
+    """
+    Greedily matches candidate boxes to reference boxes by IoU.
+
+    Returns: (list of (iou, confidence difference) per match, unmatched reference count, unmatched candidate count)
+    """
+    if not reference or not candidate:
+        return [], len(reference), len(candidate)
+    ious = iou_matrix([b[:4] for b in reference], [b[:4] for b in candidate])
+    matches = []
+    used_ref, used_cand = set(), set()
+    for flat in np.argsort(-ious, axis=None):
+        r, c = np.unravel_index(flat, ious.shape)
+        if ious[r, c] < match_iou:
+            break
+        if r in used_ref or c in used_cand:
+            continue
+        used_ref.add(r)
+        used_cand.add(c)
+        matches.append((float(ious[r, c]), abs(reference[r][4] - candidate[c][4])))
+    return matches, len(reference) - len(matches), len(candidate) - len(matches)
+
+
+def validate(args):
+    frames = load_images(args.images, args.max_frames)
+    if not frames:
+        raise SystemExit(f"no frames found in {args.images}")
+
+    reference = UltralyticsDetector(args.weights)
+    candidate = OnnxDetector(args.onnx, threads=args.threads)
+    reference.warmup(2)
+    candidate.warmup(2)
+
+    matches, missed, extra = [], 0, 0
+    ref_ms, cand_ms = [], []
+    for frame in frames:
+        ref_boxes, ms = _timed(reference, frame)
+        ref_ms.append(ms)
+        cand_boxes, ms = _timed(candidate, frame)
+        cand_ms.append(ms)
+        frame_matches, frame_missed, frame_extra = compare_boxes(ref_boxes, cand_boxes, args.match_iou)
+        matches += frame_matches
+        missed += frame_missed
+        extra += frame_extra
+
+    ref_faces = len(matches) + missed
+    cand_faces = len(matches) + extra
+    recall = len(matches) / ref_faces if ref_faces else 1.0
+    precision = len(matches) / cand_faces if cand_faces else 1.0
+    if matches:
+        mean_iou = float(np.mean([m[0] for m in matches]))
+    else:
+        mean_iou = 1.0 if ref_faces == cand_faces == 0 else 0.0
+    max_conf_diff = max((m[1] for m in matches), default=0.0)
+
+    print(f"Validated {args.onnx} against {args.weights} on {len(frames)} frame(s)")
+    print(f"  faces: {ref_faces} reference, {cand_faces} exported, {missed} missed, {extra} extra")
+    print(f"  recall {recall:.3f} | precision {precision:.3f} | mean IoU {mean_iou:.3f} | "
+          f"max confidence diff {max_conf_diff:.3f}")
+    print(f"  p50 latency: torch {np.median(ref_ms):.1f} ms | onnx {np.median(cand_ms):.1f} ms")
+    if ref_faces == 0:
+        print("  warning: the reference model found no faces; validate on frames that contain faces")
+
+    failures = []
+    if recall < args.min_recall:
+        failures.append(f"recall {recall:.3f} < {args.min_recall}")
+    if precision < args.min_precision:
+        failures.append(f"precision {precision:.3f} < {args.min_precision}")
+    if mean_iou < args.min_mean_iou:
+        failures.append(f"mean IoU {mean_iou:.3f} < {args.min_mean_iou}")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+def main():
+    envs = EnvVars()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_validation_args(sub):
+        sub.add_argument("--images", nargs="+", default=["./assets"], help="frames to validate on (images, dirs, videos)")
+        sub.add_argument("--max-frames", type=int, default=200)
+        sub.add_argument("--threads", type=int, default=envs.ONNX_THREADS)
+        sub.add_argument("--match-iou", type=float, default=0.5, help="IoU for two boxes to count as the same face")
+        sub.add_argument("--min-recall", type=float, default=0.95)
+        sub.add_argument("--min-precision", type=float, default=0.95)
+        sub.add_argument("--min-mean-iou", type=float, default=0.85)
+
+    export_cmd = commands.add_parser("export", help="export (and optionally quantize) the YOLO weights to ONNX")
+    export_cmd.add_argument("--weights", default=envs.MODEL_DIR)
+    export_cmd.add_argument("--output", default=envs.ONNX_MODEL)
+    export_cmd.add_argument("--imgsz", type=int, default=640, help="fixed square input size")
+    export_cmd.add_argument("--batch", type=int, default=1, help="fixed batch size, match BATCH_MAX_SIZE")
+    export_cmd.add_argument("--opset", type=int, default=None)
+    export_cmd.add_argument("--quantize", choices=QUANTIZE_MODES, default="none")
+    export_cmd.add_argument("--calibration", nargs="+", default=["./assets"], help="frames for int8 calibration")
+    export_cmd.add_argument("--no-validate", action="store_true")
+    add_validation_args(export_cmd)
+
+    validate_cmd = commands.add_parser("validate", help="compare an exported model's boxes with the PyTorch model")
+    validate_cmd.add_argument("--weights", default=envs.MODEL_DIR)
+    validate_cmd.add_argument("--onnx", default=envs.ONNX_MODEL)
+    add_validation_args(validate_cmd)
+
+    args = parser.parse_args()
+    sys.exit(export(args) if args.command == "export" else validate(args))
+
+
+if __name__ == "__main__":
+    main()
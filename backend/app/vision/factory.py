@@ -0,0 +1,45 @@
+"""
+file: factory.py
+
+Contains build_detector(), which builds a detector in the calling process from the configuration.
+Importing it starts nothing (no loaders, executors, batchers or pools), so the inference worker processes
+import it instead of inference.py, whose module state only makes sense in the server process.
+"""
+
+from backend.app.utils.env_helper import EnvVars
+from backend.app.vision.detectors import MediapipeDetector
+from backend.app.vision.detectors import OnnxDetector
+from backend.app.vision.detectors import UltralyticsDetector
+from backend.app.vision.letterbox import inference_size
+from backend.app.vision.stub import StubDetector
+
+envs = EnvVars()
+DETECTOR_BACKENDS = ("ultralytics", "onnx", "stub")
+USE_STUB = envs.DETECTOR_BACKEND == "stub" # Weightless stand-in detectors for load testing
+
+def build_detector(name, landmarker_pool, threads=None):
+    """
+    Builds a detector running in this process.
+
+    Arguments:
+        name (str): "yolo" or "media"
+        landmarker_pool (LandmarkerPool): pool the media detector takes its landmarkers from
+        threads (int): inference threads for the onnx backend; None uses ONNX_THREADS
+
+    Returns: Detector
+    """
+    if USE_STUB:
+        return StubDetector(envs.STUB_LATENCY_MS, envs.STUB_FACES)
+    if name == "media":
+        landmarker_pool.warm(envs.MEDIA_DIR, count=landmarker_pool.size)
+        return MediapipeDetector(
+            landmarker_pool, envs.MEDIA_DIR,
+            input_size=inference_size("media", envs.INFER_PROFILE, envs.INFER_SIZE_MEDIA),
+        )
+    if envs.DETECTOR_BACKEND == "onnx":
+        threads = envs.ONNX_THREADS if threads is None else threads
+        return OnnxDetector(envs.ONNX_MODEL, threads=threads, providers=envs.ONNX_PROVIDERS)
+    if envs.DETECTOR_BACKEND == "ultralytics":
+        input_size = inference_size("yolo", envs.INFER_PROFILE, envs.INFER_SIZE_YOLO)
+        return UltralyticsDetector(envs.MODEL_DIR, input_size=input_size)
+    raise ValueError(f"DETECTOR_BACKEND must be one of {DETECTOR_BACKENDS}, got '{envs.DETECTOR_BACKEND}'")
@@ -0,0 +1,125 @@
+"""
+file: frame_cache.py
+
+Contains the frame deduplication cache of the HTTP routes. When nobody moves in front of the camera,
+consecutive frames differ only by sensor noise, yet every request would pay for a full decode,
+inference and encode. Each incoming frame is first fingerprinted: a 64x48 grey thumbnail, decoded
+from JPEGs at 1/8 scale so it costs a fraction of the full decode. Every thumbnail pixel averages a
+block of the frame, which smooths out the noise. The thumbnail is compared with the thumbnail of the
+last frame that really ran through the detector for the same stream and detector. While no thumbnail
+pixel changed by more than a threshold:
+    - the stored detections are reused, skipping inference;
+    - the stored encoded output is returned as is, skipping decode, drawing and encode.
+The largest pixel change is used rather than the mean, so a face moving a few pixels in a large,
+still frame is a miss. The comparison is always against the frame the detections came from, not the
+previous request, so slow drift (lighting, someone edging into view) still adds up to a miss.
+Entries also expire after a TTL, so detections are refreshed periodically even for a perfectly still
+scene.
+
+Memory is bounded: at most `max_entries` streams, evicted least recently used. Each entry keeps its
+thumbnail, its detections and the encoded outputs of at most MAX_OUTPUTS quality settings.
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from backend.app.utils.metrics import METRICS
+
+FINGERPRINT_SIZE = (64, 48)  # (width, height) of the grey thumbnail
+MAX_OUTPUTS = 2              # encoded outputs kept per entry (one per JPEG quality)
+
+
+def fingerprint(body):
+    """
+    Builds the fingerprint of an encoded frame. JPEGs are decoded at 1/8 scale (DCT scaling).
+
+    Arguments:
+        body (bytes): encoded frame (JPEG, PNG, ...)
+
+    Returns: ((width, height) of the full frame, (48, 64) uint8 grey thumbnail)
+
+    Raises: PIL.UnidentifiedImageError / OSError for undecodable bodies
+    """
+    with Image.open(io.BytesIO(body)) as img:
+        size = img.size
+        img.draft("L", (max(1, size[0] // 8), max(1, size[1] // 8)))
+        grey = np.asarray(img.convert("L"))
+    return size, cv2.resize(grey, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class CacheEntry:
+    __slots__ = ("size", "thumb", "coords", "pose", "outputs", "created")
+
+    def __init__(self, size, thumb, coords, pose=None):
+        self.size = size
+        self.thumb = thumb
+        self.coords = coords
+        self.pose = pose  # per-face filter alignment of detectors with landmarks, or None
+        self.outputs = OrderedDict()  # output key (e.g. JPEG quality) -> encoded bytes
+        self.created = time.monotonic()
+
+    def output(self, key):
+        return self.outputs.get(key)
+
+    def add_output(self, key, data):
+        self.outputs[key] = data
+        while len(self.outputs) > MAX_OUTPUTS:
+            self.outputs.popitem(last=False)
+
+
+class FrameCache:
+    def __init__(self, max_entries: int = 64, ttl: float = 1.0, threshold: int = 12):
+        """
+        Arguments:
+            max_entries (int): streams remembered at once
+            ttl (float): seconds after which an entry's detections are refreshed regardless
+            threshold (int): largest change of any thumbnail pixel (grey levels) that counts as unchanged
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # (detector, stream key) -> CacheEntry, least recently used first
+        self._lock = threading.Lock()
+        METRICS.gauge("frame_cache_entries", lambda: len(self._entries))
+
+    def get(self, detector, stream, size, thumb):
+        """
+        Returns: the stream's CacheEntry when the frame matches it, otherwise None
+        """
+        key = (detector, stream)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None and entry.size == size:
+                if cv2.absdiff(thumb, entry.thumb).max() <= self.threshold:
+                    self._entries.move_to_end(key)
+                    METRICS.inc("frame_cache_hits_total", detector=detector)
+                    return entry
+        METRICS.inc("frame_cache_misses_total", detector=detector)
+        return None
+
+    def put(self, detector, stream, size, thumb, coords, pose=None):
+        """
+        Stores the detections of a frame that ran through the detector.
+
+        Returns: the new CacheEntry
+        """
+        entry = CacheEntry(size, thumb, coords, pose)
+        with self._lock:
+            self._entries[(detector, stream)] = entry
+            self._entries.move_to_end((detector, stream))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -5,71 +5,154 @@ This file contains the modules for performing frame generation for identifying f
 It also contains the helper functions for extracting the face centroids.
 """
 
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-from PIL import Image, ImageDraw
+import atexit
+import os
+from PIL import ImageDraw
 from backend.app.utils.env_helper import EnvVars
-from ultralytics import YOLO
-import numpy as np
+from backend.app.utils.metrics import stage
+from backend.app.vision.batching import BatchScheduler
+from backend.app.vision.cascade import CascadeLandmarker
+from backend.app.vision.detectors import MediapipeDetector
+from backend.app.vision.executor import InferenceExecutor
+from backend.app.vision.factory import USE_STUB
+from backend.app.vision.factory import build_detector
+from backend.app.vision.landmarker_pool import LandmarkerPool
+from backend.app.vision.letterbox import inference_size
+from backend.app.vision.letterbox import parse_size
+from backend.app.vision.loader import ModelLoader
+from backend.app.vision.media_session import MediapipeSession
+from backend.app.vision.streams import current_stream_key
+from backend.app.vision.workers import RemoteDetector
+from backend.app.vision.workers import get_worker_pool
 
 envs = EnvVars()
-YOLO_MODEL = YOLO(envs.MODEL_DIR) # Singleton declaration of the yolo model
 
-def yolo_extract_faces(frame):
-    # Arguments: model (YOLO model), frame (current frame in PIL format)
-    # Returns: result tensor from YOLO
-    results = YOLO_MODEL.predict(
-        source=frame,
-        save=False,
+def detector_input_size(name):
+    """
+    Returns: (width, height) the detector letterboxes frames to, or None when it runs at the frame's
+             resolution or its size is only known once the model is loaded (onnx)
+    """
+    if USE_STUB or (name == "yolo" and envs.DETECTOR_BACKEND == "onnx"):
+        return None
+    override = envs.INFER_SIZE_YOLO if name == "yolo" else envs.INFER_SIZE_MEDIA
+    return inference_size(name, envs.INFER_PROFILE, override)
+
+def _load(name):
+    if envs.WORKER_PROCESSES > 0:
+        # Inference runs in the worker processes; this process only hands them frames
+        return RemoteDetector(worker_pool(), name)
+    return build_detector(name, LANDMARKER_POOL)
+
+def worker_pool():
+    return get_worker_pool(
+        processes = envs.WORKER_PROCESSES,
+        slots = envs.WORKER_SLOTS,
+        max_frame = parse_size(envs.WORKER_MAX_FRAME),
+        threads = envs.WORKER_THREADS or max(1, (os.cpu_count() or 1) // envs.WORKER_PROCESSES),
     )
-    return results
 
-def yolo_get_coords(model_results):
-    # Arguments: model_results (Result tensor from YOLO), frame (current frame in PIL format)
-    # Returns: Array of face centroids
-    ret = []
-    for result in model_results:
-        boxes = result.boxes
-        for box in boxes:
-            coords = box.xyxy[0]
-            x1,y1,x2,y2 = coords.tolist()
-            ret.append([(x1+x2)/2,(y1+y2)/2])
-    return ret
-
-def media_get_coords(frame, model_path=envs.MEDIA_DIR, max_faces=5):
-    centroids = []
-    base_options = python.BaseOptions(model_asset_path=model_path)
-    options = vision.FaceLandmarkerOptions(
-        base_options = base_options,
-        output_face_blendshapes = False,
-        num_faces = max_faces,
-        running_mode = vision.RunningMode.IMAGE
+def _warm(detector):
+    # The first calls build graphs and allocate buffers; pay for them before the first request
+    detector.warmup(envs.WARMUP_FRAMES)
+    if detector.name == "media" and not USE_STUB:
+        CASCADE_LANDMARKER.warmup()
+
+LANDMARKER_POOL = LandmarkerPool(size=envs.MEDIA_POOL_SIZE) # Shared Mediapipe landmarkers, built once and reused
+atexit.register(LANDMARKER_POOL.close)
+
+# Singleton loaders; the detectors are built on first use or by start_loading() in create_app
+YOLO_LOADER = ModelLoader("yolo", lambda: _load("yolo"), _warm)
+MEDIA_LOADER = ModelLoader("media", lambda: _load("media"), _warm)
+
+# Micro-batches YOLO frames from concurrent requests; disabled when BATCH_MAX_SIZE is 1
+YOLO_BATCHER = None
+if envs.BATCH_MAX_SIZE > 1:
+    YOLO_BATCHER = BatchScheduler(
+        lambda frames: YOLO_LOADER.get(envs.MODEL_WAIT_S).detect_batch(frames),
+        max_batch = envs.BATCH_MAX_SIZE,
+        max_wait_ms = envs.BATCH_MAX_WAIT_MS,
     )
+    atexit.register(YOLO_BATCHER.close)
+
+# Bounds the detector calls running at once so request threads stay free for other clients;
+# waiting calls are served round robin per stream
+INFERENCE_EXECUTOR = InferenceExecutor(
+    workers = envs.INFER_CONCURRENCY,
+    max_queue = envs.INFER_QUEUE_MAX,
+    timeout = envs.INFER_TIMEOUT_S,
+    max_stream_queue = envs.INFER_STREAM_QUEUE_MAX,
+    key = current_stream_key,
+)
+atexit.register(INFERENCE_EXECUTOR.close)
+
+def _yolo_detect(frame):
+    if YOLO_BATCHER is not None:
+        return YOLO_BATCHER(frame)
+    return YOLO_LOADER.get(envs.MODEL_WAIT_S).detect(frame)
 
-    np_frame = np.array(frame)
-    mp_frame = mp.Image(image_format=mp.ImageFormat.SRGB, data=np_frame)
-    img_w, img_h = frame.size
-
-    with vision.FaceLandmarker.create_from_options(options) as landmarker:
-        detection_result = landmarker.detect(mp_frame)
-
-    if detection_result.face_landmarks:
-        for landmarks in detection_result.face_landmarks:
-            sum_x = sum([lm.x for lm in landmarks])
-            sum_y = sum([lm.y for lm in landmarks])
-            count = len(landmarks)
-
-            avg_x = sum_x / count
-            avg_y = sum_y / count
-
-            cx = int(avg_x * img_w)
-            cy = int(avg_y * img_h)    
-            centroids.append([cx,cy])
-    else:
-        print("No faces were detected in the image.")
+def yolo_extract_faces(frame):
+    # Arguments: frame (current RGB frame)
+    # Returns: raw output of the configured YOLO backend
+    return INFERENCE_EXECUTOR.run(_yolo_detect, frame)
 
-    return centroids 
+def yolo_get_coords(model_results):
+    # Arguments: model_results (output of yolo_extract_faces)
+    # Returns: Array of face centroids
+    return YOLO_LOADER.get(envs.MODEL_WAIT_S).centroids(model_results)
+
+def yolo_get_boxes(model_results):
+    # Arguments: model_results (output of yolo_extract_faces)
+    # Returns: Array of face boxes as [x1, y1, x2, y2, confidence]
+    return YOLO_LOADER.get(envs.MODEL_WAIT_S).boxes(model_results)
+
+def open_media_session():
+    """
+    Opens a streaming Mediapipe session (MEDIA_STREAM_MODE) for one camera or client.
+
+    Returns: MediapipeSession, or None when streaming is off or the media backend has no landmarker
+             (stub detector, worker processes)
+    """
+    detector = MEDIA_LOADER.get(envs.MODEL_WAIT_S)
+    if envs.MEDIA_STREAM_MODE == "image" or not isinstance(detector, MediapipeDetector):
+        return None
+    return MediapipeSession(detector, envs.MEDIA_STREAM_MODE, timeout=envs.INFER_TIMEOUT_S)
+
+def _media_detect(frame, model_path, max_faces, session):
+    detector = MEDIA_LOADER.get(envs.MODEL_WAIT_S)
+    with stage("inference", detector="media"):
+        if session is not None:
+            return detector, INFERENCE_EXECUTOR.run(session.detect, frame)
+        return detector, INFERENCE_EXECUTOR.run(detector.detect, frame, model_path, max_faces)
+
+def media_get_coords(frame, model_path=envs.MEDIA_DIR, max_faces=5, session=None):
+    # Arguments: frame (current RGB frame), session (MediapipeSession of the frame's stream, or None)
+    # Returns: Array of face centroids
+    return media_get_faces(frame, model_path, max_faces, session)[0]
+
+def media_get_faces(frame, model_path=envs.MEDIA_DIR, max_faces=5, session=None):
+    # Arguments: frame (current RGB frame), session (MediapipeSession of the frame's stream, or None)
+    # Returns: (Array of face centroids, LandmarkFeatures of the faces (boxes, eye/nose/mouth anchors, roll
+    #          and yaw), or None when the media backend has no landmarks (stub detector, worker processes))
+    detector, detection_result = _media_detect(frame, model_path, max_faces, session)
+    with stage("coords", detector="media"):
+        return detector.centroids(detection_result), detector.landmarks(detection_result)
+
+# Second stage of the cascade detector: Mediapipe landmarks on mosaics of the YOLO face crops
+CASCADE_LANDMARKER = CascadeLandmarker(
+    LANDMARKER_POOL, envs.MEDIA_DIR,
+    pad = envs.CASCADE_PAD,
+    tile = envs.CASCADE_TILE,
+    grid = envs.CASCADE_GRID,
+)
+
+def cascade_get_landmarks(frame, boxes):
+    # Arguments: frame (current RGB frame), boxes (YOLO face boxes of the frame)
+    # Returns: (LandmarkFeatures of the faces found, index of the box of each face), or None with the stub detector
+    if USE_STUB:
+        return None
+    MEDIA_LOADER.get(envs.MODEL_WAIT_S) # Surfaces a missing or still loading Mediapipe model as ModelUnavailable
+    with stage("landmarks", detector="cascade"):
+        return INFERENCE_EXECUTOR.run(CASCADE_LANDMARKER.detect, frame, boxes)
 
 def draw_circle(coords, r,  frame):
     draw = ImageDraw.Draw(frame)
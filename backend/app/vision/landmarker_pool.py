@@ -0,0 +1,206 @@
+"""
+file: landmarker_pool.py
+
+Contains a managed pool of Mediapipe FaceLandmarker instances. Building a landmarker loads the .task
+model and constructs the graph, which costs more than a single detection on Pi-class hardware, so
+instances are built once and then checked out/returned by the request handlers.
+
+Instances are keyed by (model path, max faces, running mode). Each key holds at most `size` instances;
+callers block until one is returned when all of them are busy.
+
+Closing the pool closes the idle instances right away. Instances still checked out by in-flight requests
+are closed when they are released.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+
+from backend.app.utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def close_landmarker(landmarker):
+    """
+    Closes a landmarker. Errors are logged and counted in landmarker_close_errors_total, never raised.
+    """
+    try:
+        landmarker.close()
+    except Exception as e:
+        METRICS.inc("landmarker_close_errors_total")
+        logger.warning("Error closing landmarker: %s", e)
+
+
+def build_landmarker(model_path, max_faces=5, running_mode=vision.RunningMode.IMAGE, result_callback=None):
+    """
+    Builds a FaceLandmarker. result_callback is required by (and only used in) LIVE_STREAM mode.
+    """
+    base_options = python.BaseOptions(model_asset_path=model_path)
+    options = vision.FaceLandmarkerOptions(
+        base_options = base_options,
+        output_face_blendshapes = False,
+        num_faces = max_faces,
+        running_mode = running_mode,
+        result_callback = result_callback
+    )
+    return vision.FaceLandmarker.create_from_options(options)
+
+
+class LandmarkerPoolClosed(RuntimeError):
+    """Raised when a landmarker is requested from a pool that has been shut down."""
+
+
+class LandmarkerPool:
+    def __init__(self, size: int = 2):
+        """
+        Arguments:
+            size (int): maximum number of landmarkers kept per (model path, max faces, running mode) key
+        """
+        self.size = max(1, int(size))
+        self._cond = threading.Condition()
+        self._idle = {}     # key -> list of idle landmarkers
+        self._created = {}  # key -> number of landmarkers built for the key
+        self._owner = {}    # id(landmarker) -> key
+        self._closed = False
+
+    @staticmethod
+    def make_key(model_path, max_faces=5, running_mode=vision.RunningMode.IMAGE):
+        return (str(model_path), int(max_faces), running_mode)
+
+    @staticmethod
+    def _build(key):
+        return build_landmarker(*key)
+
+    def warm(self, model_path, max_faces=5, running_mode=vision.RunningMode.IMAGE, count=1):
+        """
+        Builds landmarkers ahead of time so that the first request does not pay for graph construction.
+
+        Arguments:
+            model_path (str): path to the .task model
+            max_faces (int): maximum faces per frame
+            running_mode: Mediapipe running mode (IMAGE or VIDEO)
+            count (int): number of instances to have ready, capped at the pool size
+        """
+        landmarkers = [
+            self.acquire(model_path, max_faces, running_mode)
+            for _ in range(min(int(count), self.size))
+        ]
+        for landmarker in landmarkers:
+            self.release(landmarker)
+
+    def _check_open(self):
+        if self._closed:
+            raise LandmarkerPoolClosed("landmarker pool has been closed")
+
+    def acquire(self, model_path, max_faces=5, running_mode=vision.RunningMode.IMAGE, timeout=None):
+        """
+        Checks out a landmarker for the given key, building one if the key is below capacity.
+
+        Arguments:
+            model_path (str): path to the .task model
+            max_faces (int): maximum faces per frame
+            running_mode: Mediapipe running mode (IMAGE or VIDEO)
+            timeout (float): seconds to wait for a busy pool, None to wait forever
+
+        Returns: a FaceLandmarker that must be handed back with release()
+        """
+        key = self.make_key(model_path, max_faces, running_mode)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._check_open()
+                idle = self._idle.get(key)
+                if idle:
+                    return idle.pop()
+                if self._created.get(key, 0) < self.size:
+                    self._created[key] = self._created.get(key, 0) + 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"no landmarker available for {key} after {timeout}s")
+                self._cond.wait(remaining)
+
+        # Build outside the lock so other keys are not stalled by graph construction.
+        try:
+            landmarker = self._build(key)
+        except Exception:
+            with self._cond:
+                self._created[key] -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._owner[id(landmarker)] = key
+        if closed:
+            close_landmarker(landmarker)
+            raise LandmarkerPoolClosed("landmarker pool has been closed")
+        return landmarker
+
+    def release(self, landmarker):
+        """
+        Returns a landmarker obtained from acquire() to the pool, or closes it once the pool is closed.
+        """
+        with self._cond:
+            key = self._owner.get(id(landmarker))
+            if key is None:
+                raise ValueError("landmarker does not belong to this pool")
+            closed = self._closed
+            if closed:
+                del self._owner[id(landmarker)]
+            else:
+                self._idle.setdefault(key, []).append(landmarker)
+                self._cond.notify()
+        if closed:
+            close_landmarker(landmarker)
+
+    @contextmanager
+    def checkout(self, model_path, max_faces=5, running_mode=vision.RunningMode.IMAGE, timeout=None):
+        """
+        Context manager wrapper around acquire()/release().
+
+        Usage:
+            with LANDMARKER_POOL.checkout(envs.MEDIA_DIR) as landmarker:
+                result = landmarker.detect(mp_frame)
+        """
+        landmarker = self.acquire(model_path, max_faces, running_mode, timeout)
+        try:
+            yield landmarker
+        finally:
+            self.release(landmarker)
+
+    def stats(self):
+        with self._cond:
+            return [
+                {
+                    "model_path": key[0],
+                    "max_faces": key[1],
+                    "running_mode": key[2].name,
+                    "created": created,
+                    "idle": len(self._idle.get(key, [])),
+                }
+                for key, created in self._created.items()
+            ]
+
+    def close(self):
+        """
+        Shuts the pool down and closes its idle landmarkers; checked-out ones are closed by release().
+        Idempotent.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            idle = [landmarker for landmarkers in self._idle.values() for landmarker in landmarkers]
+            self._idle.clear()
+            for landmarker in idle:
+                del self._owner[id(landmarker)]
+            self._cond.notify_all()
+
+        for landmarker in idle:
+            close_landmarker(landmarker)
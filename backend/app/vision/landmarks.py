@@ -0,0 +1,176 @@
+"""
+file: landmarks.py
+
+Contains the vectorized landmark features used by the Mediapipe detector. The landmarker returns 478
+NormalizedLandmark objects per face. They are copied once per frame into a (faces, 2, 478) array of x
+and y planes. Everything the overlay needs is then computed with array operations, with no
+per-landmark Python loops:
+    - one matrix product gives every face's centroid, the centers of the landmark groups below and
+      the nose tip;
+    - min/max along the landmark axis gives the boxes.
+Only these few points are mapped back to frame pixels. The mapping is a scale and offset, so it
+commutes with the averages and with min/max.
+
+Pose estimates (degrees, image coordinates):
+    roll    tilt of the line through the eye centers; positive when the face leans towards the
+            image's right shoulder (clockwise on screen)
+    yaw     nose tip offset from the eye midpoint along the eye line, relative to half the eye
+            distance; positive when the nose points towards the image's right edge. It is an
+            approximation that is good for aligning a sprite, not a calibrated head pose.
+The overlay step aligns the filter with stamp_pose(): sized from the eye distance, rotated by the roll
+and narrowed as the head turns.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# Face Mesh landmark indices. "right"/"left" are the subject's, so the right eye is on the image's left.
+LANDMARK_GROUPS = {
+    "right_eye": (33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246),
+    "left_eye": (263, 249, 390, 373, 374, 380, 381, 382, 362, 398, 384, 385, 386, 387, 388, 466),
+    "nose": (1, 4, 5, 195, 197),
+    "mouth": (61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 409, 270, 269, 267, 0, 37, 39, 40, 185),
+    "forehead": (10, 109, 67, 338, 297),
+    "chin": (152, 148, 176, 377, 400),
+}
+NOSE_TIP = 1
+MESH_SIZE = 478  # landmarks per face, including the iris points
+MIN_SQUEEZE = 0.3  # narrowest a filter gets on a face turned sideways, as a fraction of its width
+
+
+@lru_cache(maxsize=4)
+def _weights(count):
+    """
+    Returns: (count, 2 + groups) float32 matrix whose columns average all landmarks (the centroid),
+    pick the nose tip, and average each landmark group, in that order
+    """
+    weights = np.zeros((count, 2 + len(LANDMARK_GROUPS)), dtype=np.float32)
+    weights[:, 0] = 1 / count
+    weights[NOSE_TIP, 1] = 1
+    for column, indices in enumerate(LANDMARK_GROUPS.values(), start=2):
+        weights[list(indices), column] = 1 / len(indices)
+    weights.flags.writeable = False
+    return weights
+
+
+def landmarks_to_planes(face_landmarks):
+    """
+    Copies the landmarker's faces into a single array.
+
+    Arguments:
+        face_landmarks: FaceLandmarkerResult.face_landmarks, a list of faces, each a list of landmarks
+
+    Returns: (faces, 2, landmarks) float32 array; [:, 0] holds the normalized x, [:, 1] the normalized y
+    """
+    if not face_landmarks:
+        return np.zeros((0, 2, MESH_SIZE), dtype=np.float32)
+    rows = [[lm.x for lm in face] + [lm.y for lm in face] for face in face_landmarks]
+    return np.array(rows, dtype=np.float32).reshape(len(rows), 2, -1)
+
+
+def feature_points(planes):
+    """
+    Reduces the landmarks of every face to the few points the features need.
+
+    Arguments:
+        planes (np.ndarray): output of landmarks_to_planes()
+
+    Returns: (faces, 4 + groups, 2) float32 array in the planes' coordinates: the centroid, the nose tip,
+             the group centers in LANDMARK_GROUPS order, then the top-left and bottom-right box corners
+    """
+    return np.concatenate([
+        planes @ _weights(planes.shape[2]),
+        planes.min(axis=2, keepdims=True),
+        planes.max(axis=2, keepdims=True),
+    ], axis=2).transpose(0, 2, 1)
+
+
+class LandmarkFeatures:
+    """
+    Per-frame face geometry in frame pixels, one row per face.
+    """
+
+    __slots__ = ("centroids", "boxes", "nose_tip", "anchors", "eye_distance", "roll", "yaw")
+
+    def __init__(self, centroids, boxes, nose_tip, anchors):
+        """
+        Arguments:
+            centroids (np.ndarray): (faces, 2) mean of all landmarks
+            boxes (np.ndarray): (faces, 5) [x1, y1, x2, y2, confidence]
+            nose_tip (np.ndarray): (faces, 2)
+            anchors (dict): group name -> (faces, 2) group centers, with at least both eyes
+        """
+        self.centroids = centroids
+        self.boxes = boxes
+        self.nose_tip = nose_tip
+        self.anchors = anchors
+
+        eye_axis = anchors["left_eye"] - anchors["right_eye"]
+        self.eye_distance = np.hypot(eye_axis[:, 0], eye_axis[:, 1])
+        self.roll = np.degrees(np.arctan2(eye_axis[:, 1], eye_axis[:, 0]))
+
+        # Project the nose tip on the eye line: 0 at the eye midpoint, +-1 at either eye
+        half = np.maximum(self.eye_distance / 2, 1e-6)
+        midpoint = (anchors["left_eye"] + anchors["right_eye"]) / 2
+        offset = ((nose_tip - midpoint) * eye_axis).sum(axis=1) / (2 * half * half)
+        self.yaw = np.degrees(np.arcsin(np.clip(offset, -1.0, 1.0)))
+
+    @classmethod
+    def from_result(cls, face_landmarks, transform):
+        """
+        Builds the features of a FaceLandmarkerResult.
+
+        Arguments:
+            face_landmarks: FaceLandmarkerResult.face_landmarks
+            transform (LetterboxTransform): maps the detector's canvas back to the frame
+
+        Returns: LandmarkFeatures
+        """
+        points = feature_points(landmarks_to_planes(face_landmarks))
+        canvas = points * np.array(transform.canvas_size, dtype=np.float32)
+        points = transform.points_to_frame(canvas.reshape(-1, 2)).reshape(canvas.shape)
+        return cls.from_points(points, transform.frame_size)
+
+    @classmethod
+    def from_points(cls, points, frame_size):
+        """
+        Builds the features from feature_points() already mapped to frame pixels.
+
+        Arguments:
+            points (np.ndarray): (faces, points, 2) in frame pixels
+            frame_size (tuple): (width, height) of the frame, the boxes are clipped to it
+
+        Returns: LandmarkFeatures
+        """
+        img_w, img_h = frame_size
+        boxes = np.empty((len(points), 5), dtype=np.float32)
+        boxes[:, [0, 2]] = np.clip(points[:, -2:, 0], 0, img_w)
+        boxes[:, [1, 3]] = np.clip(points[:, -2:, 1], 0, img_h)
+        boxes[:, 4] = 1.0
+        anchors = {name: points[:, column] for column, name in enumerate(LANDMARK_GROUPS, start=2)}
+        return cls(points[:, 0], boxes, points[:, 1], anchors)
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def take(self, indices):
+        """
+        Returns: LandmarkFeatures of the faces at `indices`, in that order
+        """
+        anchors = {name: points[indices] for name, points in self.anchors.items()}
+        return LandmarkFeatures(self.centroids[indices], self.boxes[indices], self.nose_tip[indices], anchors)
+
+    def stamp_pose(self, scale):
+        """
+        Aligns a filter sprite with every face.
+
+        Arguments:
+            scale (float): sprite width in eye distances, for a face looking at the camera
+
+        Returns: (faces, 3) float32 array of [sprite width, rotation in degrees, horizontal squeeze]. A
+                 turned head shows a shorter eye distance, so the width is divided by cos(yaw) and
+                 cos(yaw) is applied as the squeeze instead: the sprite narrows but keeps its height.
+        """
+        squeeze = np.clip(np.cos(np.radians(self.yaw)), MIN_SQUEEZE, 1.0)
+        return np.stack([self.eye_distance / squeeze * scale, self.roll, squeeze], axis=1).astype(np.float32)
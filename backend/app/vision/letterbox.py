@@ -0,0 +1,160 @@
+"""
+file: letterbox.py
+
+Contains the fixed-resolution letterbox used in front of the detectors. Clients upload whatever their camera
+produces, but the detectors gain nothing from 1080p: YOLO resizes to its input size anyway and Mediapipe
+searches for faces at a fraction of it. Each frame is therefore scaled once, keeping its aspect ratio, into a
+reused canvas of the inference size. The detections are mapped back to frame pixels so the filter is still
+drawn on the full-resolution frame.
+
+Inference sizes come from a profile (INFER_PROFILE) and can be overridden per detector with
+INFER_SIZE_YOLO / INFER_SIZE_MEDIA, as "WxH" or "native" to skip the letterbox.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+# Grey used by ultralytics to pad letterboxed frames
+LETTERBOX_FILL = 114
+
+# Inference size per detector, as (width, height); None runs at the uploaded resolution.
+# YOLO sizes are multiples of its 32 px stride.
+INFERENCE_PROFILES = {
+    "native": {"yolo": None, "media": None},
+    "fast": {"yolo": (416, 256), "media": (480, 270)},
+    "balanced": {"yolo": (640, 384), "media": (640, 360)},
+    "quality": {"yolo": (960, 544), "media": (1280, 720)},
+}
+
+
+def parse_size(spec):
+    """
+    Parses a "WxH" size. Empty, "native" and "0" mean no letterbox.
+
+    Returns: (width, height) or None
+    """
+    spec = str(spec or "").strip().lower()
+    if spec in ("", "0", "native", "none"):
+        return None
+    width, height = (int(v) for v in spec.split("x"))
+    if width <= 0 or height <= 0:
+        raise ValueError(f"invalid inference size '{spec}'")
+    return width, height
+
+
+def inference_size(detector, profile="balanced", override=""):
+    """
+    Resolves the inference size of a detector from the profile and its optional override.
+
+    Arguments:
+        detector (str): "yolo" or "media"
+        profile (str): key of INFERENCE_PROFILES
+        override (str): per-detector "WxH" or "native"; empty uses the profile
+
+    Returns: (width, height) or None
+    """
+    if override:
+        return parse_size(override)
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"INFER_PROFILE must be one of {tuple(INFERENCE_PROFILES)}, got '{profile}'")
+    return INFERENCE_PROFILES[profile][detector]
+
+
+class LetterboxTransform:
+    """
+    Maps detections from letterboxed canvas pixels back to frame pixels.
+    """
+
+    __slots__ = ("scale", "pad_x", "pad_y", "frame_size", "canvas_size")
+
+    def __init__(self, scale, pad_x, pad_y, frame_size, canvas_size):
+        self.scale = scale
+        self.pad_x = pad_x
+        self.pad_y = pad_y
+        self.frame_size = frame_size    # (width, height) of the original frame
+        self.canvas_size = canvas_size  # (width, height) the detector ran at
+
+    @classmethod
+    def identity(cls, frame_size):
+        return cls(1.0, 0, 0, frame_size, frame_size)
+
+    def boxes_to_frame(self, boxes):
+        """
+        Arguments:
+            boxes (np.ndarray): (N, 4+) boxes as [x1, y1, x2, y2, ...] in canvas pixels; extra columns are kept
+
+        Returns: new array with the box columns in frame pixels, clipped to the frame
+        """
+        out = np.array(boxes, dtype=np.float32)
+        if out.size == 0:
+            return out.reshape(0, 5)
+        img_w, img_h = self.frame_size
+        out[:, [0, 2]] = np.clip((out[:, [0, 2]] - self.pad_x) / self.scale, 0, img_w)
+        out[:, [1, 3]] = np.clip((out[:, [1, 3]] - self.pad_y) / self.scale, 0, img_h)
+        return out
+
+    def points_to_frame(self, points):
+        """
+        Arguments:
+            points (np.ndarray): (N, 2) points in canvas pixels
+
+        Returns: (N, 2) float32 array in frame pixels
+        """
+        out = np.array(points, dtype=np.float32).reshape(-1, 2)
+        out[:, 0] = (out[:, 0] - self.pad_x) / self.scale
+        out[:, 1] = (out[:, 1] - self.pad_y) / self.scale
+        return out
+
+
+class Letterbox:
+    def __init__(self, size, fill: int = LETTERBOX_FILL, scaleup: bool = False):
+        """
+        Arguments:
+            size (tuple): (width, height) of the canvas
+            fill (int): grey level of the padding
+            scaleup (bool): also enlarge frames smaller than the canvas (fixed-input models expect it)
+        """
+        self.size = tuple(size)
+        self.fill = fill
+        self.scaleup = scaleup
+        # Each thread reuses its own canvas, so concurrent requests never write into the same buffer
+        self._local = threading.local()
+
+    def _canvas(self):
+        canvas = getattr(self._local, "canvas", None)
+        if canvas is None:
+            width, height = self.size
+            canvas = np.full((height, width, 3), self.fill, dtype=np.uint8)
+            self._local.canvas = canvas
+            self._local.last_roi = None
+        return canvas
+
+    def fit(self, rgb):
+        """
+        Scales an (H, W, 3) frame into this thread's canvas.
+
+        Returns: (canvas, LetterboxTransform). The canvas is overwritten by the next fit() on the same thread.
+        """
+        canvas = self._canvas()
+        in_w, in_h = self.size
+        img_h, img_w = rgb.shape[:2]
+        scale = min(in_w / img_w, in_h / img_h)
+        if not self.scaleup:
+            scale = min(scale, 1.0)
+        new_w, new_h = max(1, round(img_w * scale)), max(1, round(img_h * scale))
+        pad_x, pad_y = (in_w - new_w) // 2, (in_h - new_h) // 2
+
+        # Only repaint the padding when the frame geometry changed since the last call
+        roi_rect = (pad_x, pad_y, new_w, new_h)
+        if self._local.last_roi != roi_rect:
+            canvas.fill(self.fill)
+            self._local.last_roi = roi_rect
+
+        roi = canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+        if (new_w, new_h) == (img_w, img_h):
+            roi[...] = rgb
+        else:
+            cv2.resize(rgb, (new_w, new_h), dst=roi, interpolation=cv2.INTER_LINEAR)
+        return canvas, LetterboxTransform(scale, pad_x, pad_y, (img_w, img_h), self.size)
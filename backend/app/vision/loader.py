@@ -0,0 +1,164 @@
+"""
+file: loader.py
+
+Contains the deferred model loader. Importing torch/ultralytics and reading the weights used to happen at
+import time, which held up create_app() and every route, including the health check. A ModelLoader
+instead builds its model on first use or in a background thread, runs a warmup pass on dummy frames so the
+first real request does not absorb it, and reports its state for the readiness probe.
+
+Loading modes (MODEL_LOADING):
+    background  start loading when the app is created and serve liveness immediately (default)
+    eager       load and warm up before create_app() returns
+    lazy        load on the first request that needs the model
+"""
+
+import logging
+import threading
+import time
+
+from backend.app.utils.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+LOADING_MODES = ("background", "eager", "lazy")
+
+PENDING = "pending"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelUnavailable(RuntimeError):
+    """Raised when a model failed to load or did not become ready within the timeout."""
+
+
+class ModelLoader:
+    def __init__(self, name, load_fn, warmup_fn=None):
+        """
+        Arguments:
+            name (str): model name used in the readiness report and the metrics labels
+            load_fn: callable returning the loaded model
+            warmup_fn: optional callable receiving the model, run once after loading
+        """
+        self.name = name
+        self._load_fn = load_fn
+        self._warmup_fn = warmup_fn
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._model = None
+        self.state = PENDING
+        self.error = None
+        self.load_ms = None
+        self.warmup_ms = None
+        METRICS.gauge("model_ready", lambda: int(self.state == READY), model=name)
+        LOADERS[name] = self
+
+    def _claim(self):
+        """
+        Moves the loader out of PENDING. Only the caller that gets True runs the load.
+        """
+        with self._lock:
+            if self.state != PENDING:
+                return False
+            self.state = LOADING
+            return True
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            model = self._load_fn()
+            self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            if self._warmup_fn is not None:
+                self.state = WARMING
+                start = time.perf_counter()
+                self._warmup_fn(model)
+                self.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            self._model = model
+            self.state = READY
+            logger.info("Model '%s' ready (load %s ms, warmup %s ms)", self.name, self.load_ms, self.warmup_ms)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = FAILED
+            logger.exception("Model '%s' failed to load: %s", self.name, self.error)
+        finally:
+            self._done.set()
+
+    def start(self):
+        """
+        Starts loading in a daemon thread. Idempotent.
+        """
+        if self._claim():
+            self._thread = threading.Thread(target=self._run, name=f"load-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def load(self):
+        """
+        Loads in the calling thread, or waits for a load already in progress.
+        """
+        if self._claim():
+            self._run()
+        self._done.wait()
+        return self
+
+    def get(self, timeout=None):
+        """
+        Returns the model, loading it first if nothing has started the loader yet.
+
+        Arguments:
+            timeout (float): seconds to wait for a load in progress; None waits indefinitely
+
+        Returns: the loaded model
+        """
+        if self.state == READY:
+            return self._model
+        if self._claim():
+            self._run()
+        if not self._done.wait(timeout):
+            raise ModelUnavailable(f"model '{self.name}' is still {self.state}")
+        if self.state != READY:
+            raise ModelUnavailable(f"model '{self.name}' failed to load: {self.error}")
+        return self._model
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def status(self):
+        return {
+            "model": self.name,
+            "state": self.state,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "error": self.error,
+        }
+
+
+LOADERS = {} # name -> ModelLoader, filled as loaders are declared
+
+
+def start_loading(mode="background"):
+    """
+    Applies the MODEL_LOADING mode to every declared loader.
+    """
+    if mode not in LOADING_MODES:
+        raise ValueError(f"MODEL_LOADING must be one of {LOADING_MODES}, got '{mode}'")
+    if mode == "lazy":
+        return
+    for loader in list(LOADERS.values()):
+        loader.start()
+    if mode == "eager":
+        for loader in list(LOADERS.values()):
+            loader.load()
+
+
+def readiness():
+    """
+    Returns: (True if every declared model is ready, list of loader status dicts)
+    """
+    statuses = [loader.status() for loader in LOADERS.values()]
+    return all(s["state"] == READY for s in statuses), statuses
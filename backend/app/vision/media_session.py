@@ -0,0 +1,181 @@
+"""
+file: media_session.py
+
+Contains the streaming sessions of the Mediapipe detector. In IMAGE mode the landmarker runs face
+detection and landmark regression on every frame. In VIDEO and LIVE_STREAM modes it tracks the faces
+of the previous frame, so the detection model only runs when tracking is lost. This only works when
+one landmarker sees one continuous feed with increasing timestamps. A MediapipeSession therefore owns
+a long-lived landmarker for one camera or client:
+    video         detect_for_video(): synchronous, every frame is processed
+    live_stream   detect_async(): results arrive on Mediapipe's callback thread. The session keeps one
+                  frame in flight and at most one waiting. A newer frame replaces the waiting one
+                  (latest-frame-wins), which resolves at once with the session's last completed
+                  result, mapped through its own letterbox. A skipped frame therefore never waits for
+                  another frame's result, and the filter does not flicker off when requests race.
+
+Timestamps come from the monotonic clock and are forced to be strictly increasing.
+
+The number of faces a session looks for is fixed when its landmarker is built. A lower max_faces of the
+quality controller is applied to its results by the pipeline, as for every media detection.
+
+Sessions belong to the streams of the StreamRegistry (vision/streams.py). HTTP clients opt in by naming
+their stream (X-Stream-Id header or a /vision/streams/<stream_id>/ route); WebSocket connections always
+have one. The registry closes a stream's session when the stream is evicted, and the least recently used
+session when MEDIA_SESSION_MAX are open.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks.python import vision
+
+from backend.app.utils.metrics import METRICS
+from backend.app.vision.landmarker_pool import build_landmarker
+from backend.app.vision.landmarker_pool import close_landmarker
+from backend.app.vision.landmarks import LandmarkFeatures
+
+STREAM_MODES = ("image", "video", "live_stream")
+RUNNING_MODES = {"video": vision.RunningMode.VIDEO, "live_stream": vision.RunningMode.LIVE_STREAM}
+
+
+class SessionClosed(RuntimeError):
+    """Raised when a frame is sent to a session that has been closed."""
+
+
+class MediapipeSession:
+    def __init__(self, detector, mode: str = "video", timeout: float = 5.0):
+        """
+        Arguments:
+            detector (MediapipeDetector): provides the model, max faces and the letterbox
+            mode (str): "video" or "live_stream"
+            timeout (float): seconds a live_stream frame waits for its result
+        """
+        if mode not in RUNNING_MODES:
+            raise ValueError(f"session mode must be one of {tuple(RUNNING_MODES)}, got '{mode}'")
+        self.detector = detector
+        self.mode = mode
+        self.timeout = timeout
+        self.frames = 0
+        self.skipped = 0  # live_stream frames replaced by a newer one before they ran; they get the last result
+        self.last_used = time.monotonic()
+        self._lock = threading.Condition()
+        self._last_ts = -1
+        self._inflight = None  # live_stream: (timestamp, future, transform, frame buffer, submit time)
+        self._waiting = None   # live_stream: (future, transform, frame buffer) of the next frame to submit
+        self._last_result = None  # live_stream: FaceLandmarkerResult of the last frame that ran
+        self._closed = False
+        callback = self._on_result if mode == "live_stream" else None
+        self._landmarker = build_landmarker(detector.model_path, detector.max_faces, RUNNING_MODES[mode], callback)
+
+    def _timestamp(self):
+        ts = max(self._last_ts + 1, int(time.monotonic() * 1000))
+        self._last_ts = ts
+        return ts
+
+    def detect(self, frame):
+        """
+        Runs the session's landmarker on the next frame of its feed.
+
+        Returns: same output as MediapipeDetector.detect, (FaceLandmarkerResult, LandmarkFeatures)
+        """
+        img, transform = self.detector._prepare(frame)
+        with self._lock:
+            if self._closed:
+                raise SessionClosed("Mediapipe session has been closed")
+            self.last_used = time.monotonic()
+            if self.mode == "video":
+                ts = self._timestamp()
+                mp_frame = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(img))
+                result = self._landmarker.detect_for_video(mp_frame, ts)
+                self.frames += 1
+                return result, LandmarkFeatures.from_result(result.face_landmarks, transform)
+
+            # The letterbox canvas is reused by the next frame, so the async call gets its own copy
+            future = Future()
+            entry = (future, transform, np.array(img))
+            if self._waiting is not None:
+                self._skip(self._waiting)
+                self._lock.notify_all()
+            self._waiting = entry
+            deadline = time.monotonic() + self.timeout
+            while self._inflight is not None and self._waiting is entry and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting = None
+                    raise TimeoutError("Mediapipe session is busy")
+                if time.monotonic() - self._inflight[4] > self.timeout:
+                    # Its result never came; do not let it hold up the feed
+                    self._inflight = None
+                    break
+                self._lock.wait(remaining)
+            if self._waiting is entry and not self._closed:
+                self._waiting = None
+                ts = self._timestamp()
+                self._inflight = (ts, future, transform, entry[2], time.monotonic())
+                self._landmarker.detect_async(mp.Image(image_format=mp.ImageFormat.SRGB, data=entry[2]), ts)
+            elif self._closed and not future.done():
+                raise SessionClosed("Mediapipe session has been closed")
+
+        # Replaced frames are already resolved
+        return future.result(max(0.0, deadline - time.monotonic()))
+
+    def _skip(self, entry):
+        """
+        Resolves a frame replaced by a newer one before it ran with the last completed result. Its landmarks
+        are normalized to the letterbox canvas, so they are mapped to the skipped frame's pixels through
+        the skipped frame's own transform. Call with the lock held.
+        """
+        future, transform, _ = entry
+        self.skipped += 1
+        METRICS.inc("media_session_frames_skipped_total")
+        result = self._last_result
+        faces = [] if result is None else result.face_landmarks
+        future.set_result((result, LandmarkFeatures.from_result(faces, transform)))
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        """
+        LIVE_STREAM callback: resolves the frame in flight and lets the waiting frame go.
+        """
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None or inflight[0] != timestamp_ms:
+                return
+            self._inflight = None
+            self._last_result = result
+            self.frames += 1
+            self._lock.notify_all()
+        _, future, transform, _, _ = inflight
+        if not future.done():
+            future.set_result((result, LandmarkFeatures.from_result(result.face_landmarks, transform)))
+
+    def close(self):
+        """
+        Closes the landmarker and fails the frames still waiting for a result. Idempotent.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = []
+            if self._waiting is not None:
+                pending.append(self._waiting[0])
+            if self._inflight is not None:
+                pending.append(self._inflight[1])
+            self._waiting = self._inflight = None
+            self._lock.notify_all()
+        close_landmarker(self._landmarker)
+        for future in pending:
+            if not future.done():
+                future.set_exception(SessionClosed("Mediapipe session has been closed"))
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "idle_s": round(time.monotonic() - self.last_used, 1),
+        }
+
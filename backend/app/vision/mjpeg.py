@@ -0,0 +1,224 @@
+"""
+file: mjpeg.py
+
+Contains the server-pushed live output of /vision/live. A browser shows a multipart/x-mixed-replace
+response in a plain <img> tag, replacing the image with every part it receives. The kiosk therefore
+displays the processed camera without polling, base-64 strings or any JavaScript in the frame path.
+
+One producer thread per detector reads the newest frame of the server-side capture, runs it through the
+pipeline and encodes it once. The JPEG goes into a FrameBroadcast that holds only the newest encoded
+frame. Every viewer streams from that shared buffer, so adding a viewer costs a socket write, not an
+encode. Both sides are capped at `fps`. A viewer that cannot keep up skips straight to the newest frame
+when it is ready again, and the frames it missed are counted in mjpeg_frames_dropped_total. A producer
+stops once it has had no viewer for IDLE_TIMEOUT_S seconds and is restarted by the next viewer.
+"""
+
+import threading
+import time
+
+from backend.app.utils.metrics import METRICS
+
+BOUNDARY = "frame"
+IDLE_TIMEOUT_S = 5.0  # seconds a producer keeps running without viewers
+
+
+class FrameBroadcast:
+    """
+    Newest encoded frame of one live output, shared by all of its viewers.
+    """
+
+    def __init__(self):
+        self.viewers = 0
+        self.last_viewer = time.monotonic()
+        self._cond = threading.Condition()
+        self._seq = -1
+        self._jpeg = None
+        self._closed = False
+
+    def publish(self, jpeg):
+        with self._cond:
+            self._seq += 1
+            self._jpeg = jpeg
+            self._cond.notify_all()
+        METRICS.inc("mjpeg_frames_published_total")
+
+    def wait_newer(self, after_seq, timeout=None):
+        """
+        Blocks until a frame newer than after_seq is published.
+
+        Returns: (seq, JPEG bytes) of the newest frame, or None on timeout or once closed
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > after_seq, timeout)
+            if self._closed or self._seq <= after_seq:
+                return None
+            return self._seq, self._jpeg
+
+    def attach(self):
+        with self._cond:
+            self.viewers += 1
+            self.last_viewer = time.monotonic()
+
+    def touch(self):
+        with self._cond:
+            self.last_viewer = time.monotonic()
+
+    def detach(self):
+        with self._cond:
+            self.viewers -= 1
+            self.last_viewer = time.monotonic()
+
+    def idle_for(self):
+        """
+        Returns: seconds since the last viewer left, 0 while someone is watching
+        """
+        with self._cond:
+            return 0.0 if self.viewers > 0 else time.monotonic() - self.last_viewer
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def multipart_stream(broadcast, fps: float = 15.0, timeout: float = 10.0):
+    """
+    Streams a FrameBroadcast as multipart/x-mixed-replace parts, newest frame first.
+
+    Arguments:
+        broadcast (FrameBroadcast): live output to stream
+        fps (float): maximum frames per second sent to this viewer; 0 sends every new frame
+        timeout (float): seconds without a new frame after which the stream ends
+
+    Yields: one multipart part (headers and JPEG) per frame
+    """
+    interval = 1.0 / fps if fps > 0 else 0.0
+    broadcast.attach()
+    try:
+        last_seq = -1
+        next_due = time.monotonic()
+        while True:
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            latest = broadcast.wait_newer(last_seq, timeout)
+            if latest is None:
+                return
+            seq, jpeg = latest
+            if last_seq >= 0 and seq > last_seq + 1:
+                METRICS.inc("mjpeg_frames_dropped_total", seq - last_seq - 1)
+            last_seq = seq
+            # The write blocks while the viewer's socket is full; frames published meanwhile are skipped
+            yield (
+                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                + jpeg + b"\r\n"
+            )
+            METRICS.inc("mjpeg_frames_sent_total")
+            next_due = time.monotonic() + interval
+    finally:
+        broadcast.detach()
+
+
+class LiveProducer(threading.Thread):
+    def __init__(self, detector, capture, render, broadcast, fps: float = 15.0):
+        """
+        Arguments:
+            detector (str): detector the frames are processed with
+            capture (CaptureThread): server-side capture to read frames from
+            render: callable(detector, BGR frame) returning the processed frame as JPEG bytes
+            broadcast (FrameBroadcast): where the encoded frames are published
+            fps (float): maximum frames per second processed; 0 processes every captured frame
+        """
+        super().__init__(name=f"live-{detector}", daemon=True)
+        self.detector = detector
+        self.capture = capture
+        self.render = render
+        self.broadcast = broadcast
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.frames = 0
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        try:
+            ring = self.capture.wait_ready(timeout=5.0)
+        except Exception as e:
+            self.error = e
+            self.broadcast.close()
+            return
+
+        seq = -1
+        while not self._stop_event.is_set() and self.broadcast.idle_for() < IDLE_TIMEOUT_S:
+            started = time.monotonic()
+            latest = ring.wait_newer(seq, timeout=1.0) if ring is not None else None
+            if latest is None:
+                continue
+            seq, frame, _ = latest
+            try:
+                jpeg = self.render(self.detector, frame)
+            except Exception as e:
+                # Keep serving: a model that is still loading or a full inference queue is transient
+                self.error = e
+                METRICS.inc("mjpeg_render_errors_total", detector=self.detector)
+                self._stop_event.wait(0.5)
+                continue
+            self.error = None
+            self.frames += 1
+            self.broadcast.publish(jpeg)
+
+            delay = self.interval - (time.monotonic() - started)
+            if delay > 0:
+                self._stop_event.wait(delay)
+        self.broadcast.close()
+
+    def stats(self):
+        return {
+            "running": self.is_alive(),
+            "frames": self.frames,
+            "viewers": self.broadcast.viewers,
+            "error": str(self.error) if self.error else None,
+        }
+
+
+class LiveOutputs:
+    def __init__(self, render, fps: float = 15.0):
+        """
+        Arguments:
+            render: see LiveProducer
+            fps (float): frame rate cap of the producers and of each viewer
+        """
+        self.render = render
+        self.fps = fps
+        self._producers = {}  # detector -> LiveProducer
+        self._lock = threading.Lock()
+        METRICS.gauge("mjpeg_viewers", lambda: sum(p.broadcast.viewers for p in list(self._producers.values())))
+
+    def open(self, detector, capture):
+        """
+        Returns: the FrameBroadcast of a detector's live output, starting its producer if needed
+        """
+        with self._lock:
+            producer = self._producers.get(detector)
+            if producer is None or not producer.is_alive():
+                producer = LiveProducer(detector, capture, self.render, FrameBroadcast(), self.fps)
+                self._producers[detector] = producer
+                producer.start()
+            # Counts as viewer activity, so the producer does not go idle before the viewer's first read
+            producer.broadcast.touch()
+        return producer.broadcast
+
+    def stats(self):
+        with self._lock:
+            return {detector: producer.stats() for detector, producer in self._producers.items()}
+
+    def close(self):
+        with self._lock:
+            producers = list(self._producers.values())
+            self._producers.clear()
+        for producer in producers:
+            producer.stop(timeout=2.0)
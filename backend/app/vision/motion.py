@@ -0,0 +1,173 @@
+"""
+file: motion.py
+
+Contains the motion gate placed in front of YOLO. Running the model on every full frame is wasted work
+when nothing moves, and most of the frame is background when someone does. Every frame is first reduced
+to a ~160 pixel wide grey thumbnail (an integer box reduction, about 1 ms for 720p) and compared with the
+thumbnail of the last frame the detector ran on:
+    idle    no thumbnail pixel changed by more than `threshold`: the last known faces are reused and
+            the model does not run at all
+    roi     the model runs on one crop: the bounding box of the changed pixels and of the last known
+            faces, padded by `pad` of its size, mapped back to frame pixels
+    full    the model runs on the whole frame: on the first frame, after a size change, once
+            `full_interval` seconds have passed since the last full detection, or when the crop would
+            cover more than `max_roi` of the frame anyway
+The periodic full detection picks up faces the gate could have missed, such as a face that appeared
+during a burst of frames that were all treated as idle. Callers can also pass a stride (the quality
+controller's detection interval): the model then runs at most every `stride` frames, and the frames in
+between reuse the last known faces.
+
+As with the frame cache, the comparison is against the frame the detections came from, so slow drift
+adds up until it counts as motion. One gate keeps the state of one feed: every stream of the
+StreamRegistry (vision/streams.py) has its own.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from backend.app.utils.metrics import METRICS
+from backend.app.utils.metrics import stage
+
+_DILATE_KERNEL = np.ones((3, 3), dtype=np.uint8)
+
+
+class MotionGate:
+    def __init__(self, detect_boxes, width: int = 160, threshold: int = 25, min_pixels: int = 4,
+                 full_interval: float = 2.0, pad: float = 0.25, max_roi: float = 0.5):
+        """
+        Arguments:
+            detect_boxes: callable running the detector on a frame (PIL image or RGB array) and
+                          returning face boxes as [x1, y1, x2, y2, confidence]
+            width (int): approximate width of the grey thumbnail the frames are compared at
+            threshold (int): smallest change of a thumbnail pixel (grey levels) that counts as motion
+            min_pixels (int): changed thumbnail pixels below which a frame is idle
+            full_interval (float): seconds between full-frame detections
+            pad (float): margin added around the region of interest, relative to its size
+            max_roi (float): fraction of the frame above which the full frame is used instead of a crop
+        """
+        self.detect_boxes = detect_boxes
+        self.width = max(16, int(width))
+        self.threshold = threshold
+        self.min_pixels = max(1, int(min_pixels))
+        self.full_interval = full_interval
+        self.pad = pad
+        self.max_roi = max_roi
+        self.boxes = []  # last known faces, in frame pixels
+        self.frames = {"full": 0, "roi": 0, "idle": 0, "skip": 0}
+        self.last_used = time.monotonic()
+        self._reference = None  # thumbnail of the last frame the detector ran on
+        self._size = None
+        self._last_full = 0.0
+        self._since_run = 0  # frames since the detector last ran
+        self._lock = threading.Lock()
+
+    def _thumbnail(self, frame):
+        """
+        Returns: (grey thumbnail, frame pixels per thumbnail pixel, (width, height) of the frame)
+        """
+        if isinstance(frame, np.ndarray):
+            height, width = frame.shape[:2]
+            factor = max(1, width // self.width)
+            small = cv2.resize(frame, (max(1, width // factor), max(1, height // factor)),
+                               interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), factor, (width, height)
+        factor = max(1, frame.size[0] // self.width)
+        small = frame.reduce(factor) if factor > 1 else frame
+        return np.asarray(small.convert("L")), factor, frame.size
+
+    def _region(self, mask, factor, size):
+        """
+        Returns: [x1, y1, x2, y2] frame pixels around the changed pixels and the last known faces
+        """
+        x, y, w, h = cv2.boundingRect(mask)
+        regions = [[x * factor, y * factor, (x + w) * factor, (y + h) * factor]]
+        regions += [box[:4] for box in self.boxes]
+        regions = np.asarray(regions, dtype=np.float32)
+        x1, y1 = regions[:, :2].min(axis=0)
+        x2, y2 = regions[:, 2:].max(axis=0)
+        pad_x, pad_y = (x2 - x1) * self.pad, (y2 - y1) * self.pad
+        return [
+            int(max(0, x1 - pad_x)), int(max(0, y1 - pad_y)),
+            int(min(size[0], x2 + pad_x)), int(min(size[1], y2 + pad_y)),
+        ]
+
+    def plan(self, frame, stride=1):
+        """
+        Decides how the detector runs on a frame.
+
+        Returns: ("idle" | "skip" | "roi" | "full", [x1, y1, x2, y2] region in frame pixels, thumbnail)
+        """
+        thumb, factor, size = self._thumbnail(frame)
+        now = time.monotonic()
+        with self._lock:
+            self.last_used = now
+            reference = self._reference
+            if (reference is None or size != self._size or reference.shape != thumb.shape
+                    or now - self._last_full >= self.full_interval):
+                return "full", [0, 0, size[0], size[1]], thumb
+            if self._since_run + 1 < stride:
+                self._since_run += 1
+                return "skip", None, thumb
+
+            diff = cv2.absdiff(thumb, reference)
+            _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+            if cv2.countNonZero(mask) < self.min_pixels:
+                self._since_run += 1
+                return "idle", None, thumb
+
+            region = self._region(cv2.dilate(mask, _DILATE_KERNEL), factor, size)
+        roi_area = (region[2] - region[0]) * (region[3] - region[1])
+        if roi_area > self.max_roi * size[0] * size[1]:
+            return "full", [0, 0, size[0], size[1]], thumb
+        return "roi", region, thumb
+
+    def detect(self, frame, stride=1):
+        """
+        Runs the detector on the part of the frame that may have changed.
+
+        Arguments:
+            frame: current frame, PIL image or RGB numpy array
+            stride (int): the detector runs at most every `stride` frames
+
+        Returns: list of face boxes as [x1, y1, x2, y2, confidence] in frame pixels
+        """
+        with stage("motion"):
+            mode, region, thumb = self.plan(frame, stride)
+        self.frames[mode] += 1
+        METRICS.inc("motion_gate_frames_total", mode=mode)
+        if mode in ("idle", "skip"):
+            return list(self.boxes)
+
+        if mode == "full":
+            boxes = self.detect_boxes(frame)
+        else:
+            x1, y1, x2, y2 = region
+            if isinstance(frame, np.ndarray):
+                crop = frame[y1:y2, x1:x2]
+            else:
+                crop = frame.crop((x1, y1, x2, y2))
+            boxes = [
+                [bx1 + x1, by1 + y1, bx2 + x1, by2 + y1, conf]
+                for bx1, by1, bx2, by2, conf in self.detect_boxes(crop)
+            ]
+        METRICS.inc("motion_gate_pixels_total", (region[2] - region[0]) * (region[3] - region[1]))
+
+        with self._lock:
+            self.boxes = boxes
+            self._reference = thumb
+            self._since_run = 0
+            self._size = (frame.shape[1], frame.shape[0]) if isinstance(frame, np.ndarray) else frame.size
+            if mode == "full":
+                self._last_full = time.monotonic()
+        return boxes
+
+    def stats(self):
+        return {
+            "frames": dict(self.frames),
+            "faces": len(self.boxes),
+            "idle_s": round(time.monotonic() - self.last_used, 1),
+        }
+
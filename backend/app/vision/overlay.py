@@ -0,0 +1,216 @@
+"""
+file: overlay.py
+
+Contains the sprite overlay engine used for frame generation. An RGBA filter image is stamped onto every
+face by alpha blending directly on the numpy frame buffer, in place. Sprites are pre-scaled and
+pre-multiplied once per size bucket and kept in a small LRU cache, so a frame only pays for the blend:
+
+    out = sprite_rgb * a + frame * (1 - a)  ->  out = premultiplied_rgb + frame * (255 - a) / 255
+
+The multiply and add run through OpenCV's saturating SIMD kernels straight into the frame region.
+Stamps that cross the frame edge are clipped to the visible part.
+
+Faces with landmarks get a stamp aligned with the head: rotated by its roll and narrowed as it turns.
+Rotations are rounded to ANGLE_STEP degrees and squeezes to SQUEEZE_STEP, so the cache holds few variants.
+"""
+
+from collections import OrderedDict
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ANGLE_STEP = 5       # degrees; rotated sprites are cached per step
+SQUEEZE_STEP = 0.1   # horizontal squeezes are cached per step
+
+
+def ring_sprite(size: int = 256, thickness: float = 0.08, color=(255, 0, 0)):
+    """
+    Builds the default filter: an anti-aliased ring, matching the placeholder circles drawn by draw_circle.
+
+    Arguments:
+        size (int): sprite side in pixels
+        thickness (float): ring thickness as a fraction of the sprite size
+        color (tuple): RGB color of the ring
+
+    Returns: (size, size, 4) uint8 RGBA array
+    """
+    center = (size - 1) / 2
+    ys, xs = np.mgrid[0:size, 0:size].astype(np.float32)
+    dist = np.hypot(xs - center, ys - center)
+    outer = size / 2
+    inner = outer - thickness * size
+    # 1px linear falloff on both edges of the ring
+    alpha = np.clip(outer - dist, 0, 1) * np.clip(dist - inner, 0, 1)
+    sprite = np.zeros((size, size, 4), dtype=np.uint8)
+    sprite[..., :3] = color
+    sprite[..., 3] = (alpha * 255).astype(np.uint8)
+    return sprite
+
+
+def load_sprite(path):
+    """
+    Loads an RGBA sprite from an image file.
+    """
+    with Image.open(path) as img:
+        return np.array(img.convert("RGBA"))
+
+
+class SpriteOverlay:
+    def __init__(self, sprite, cache_size: int = 16, bucket: int = 8):
+        """
+        Arguments:
+            sprite (np.ndarray): (H, W, 4) uint8 RGBA filter image
+            cache_size (int): number of scaled sprites kept in the LRU cache
+            bucket (int): sprite sizes are rounded up to a multiple of this many pixels before caching
+        """
+        sprite = np.asarray(sprite, dtype=np.uint8)
+        if sprite.ndim != 3 or sprite.shape[2] != 4:
+            raise ValueError("sprite must be an (H, W, 4) RGBA array")
+        # Pre-multiply once at full resolution so that scaling does not bleed color from transparent pixels
+        alpha = sprite[..., 3:4].astype(np.float32) / 255
+        self._premultiplied = np.concatenate([sprite[..., :3] * alpha, sprite[..., 3:4]], axis=2).astype(np.float32)
+        self.aspect = sprite.shape[0] / sprite.shape[1]
+        self.cache_size = max(1, int(cache_size))
+        self.bucket = max(1, int(bucket))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_path(cls, path=None, **kwargs):
+        """
+        Builds an overlay from a sprite file, or from the default ring sprite when no path is given.
+        """
+        sprite = load_sprite(path) if path else ring_sprite()
+        return cls(sprite, **kwargs)
+
+    def _bucket_width(self, width):
+        return max(self.bucket, -(-int(round(width)) // self.bucket) * self.bucket)
+
+    def _key(self, width, angle, squeeze):
+        angle = int(round(angle / ANGLE_STEP)) * ANGLE_STEP
+        angle = (angle + 180) % 360 - 180
+        squeeze = round(min(1.0, max(SQUEEZE_STEP, round(squeeze / SQUEEZE_STEP) * SQUEEZE_STEP)), 2)
+        return self._bucket_width(width), angle, squeeze
+
+    def scaled(self, width, angle=0.0, squeeze=1.0):
+        """
+        Returns the cached (premultiplied RGB, inverse alpha) uint8 pair for a stamp of the given width.
+        The inverse alpha is replicated over 3 channels so it can be multiplied with the frame directly.
+
+        Arguments:
+            width (float): stamp width in pixels before the squeeze
+            angle (float): clockwise rotation on screen in degrees
+            squeeze (float): horizontal scale applied before the rotation, at most 1
+        """
+        key = self._key(width, angle, squeeze)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        width, angle, squeeze = key
+        height = max(1, int(round(width * self.aspect)))
+        width = max(1, int(round(width * squeeze)))
+        interpolation = cv2.INTER_AREA if width < self._premultiplied.shape[1] else cv2.INTER_LINEAR
+        scaled = cv2.resize(self._premultiplied, (width, height), interpolation=interpolation)
+        if angle:
+            scaled = _rotated(scaled, angle)
+        premul_rgb = np.clip(np.rint(scaled[..., :3]), 0, 255).astype(np.uint8)
+        inv_alpha = (255 - np.clip(np.rint(scaled[..., 3]), 0, 255)).astype(np.uint8)
+        inv_alpha = np.ascontiguousarray(np.repeat(inv_alpha[..., None], 3, axis=2))
+        entry = (premul_rgb, inv_alpha)
+
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def stamp(self, frame, centers, sizes, angles=None, squeezes=None):
+        """
+        Alpha-blends the sprite onto the frame at each center, in place.
+
+        Arguments:
+            frame (np.ndarray): (H, W, 3) uint8 writable frame in the sprite's color order
+            centers: iterable of [x, y] stamp centers in pixels
+            sizes: stamp width in pixels, either one value for every stamp or one value per stamp
+            angles: clockwise rotation of each stamp in degrees, or None for upright stamps
+            squeezes: horizontal scale of each stamp (see scaled()), or None for unsqueezed stamps
+
+        Returns: the same frame array
+        """
+        frame_h, frame_w = frame.shape[:2]
+        centers = list(centers)
+        if np.isscalar(sizes):
+            sizes = [sizes] * len(centers)
+        angles = [0.0] * len(centers) if angles is None else angles
+        squeezes = [1.0] * len(centers) if squeezes is None else squeezes
+
+        for (cx, cy), size, angle, squeeze in zip(centers, sizes, angles, squeezes):
+            premul_rgb, inv_alpha = self.scaled(size, angle, squeeze)
+            sprite_h, sprite_w = inv_alpha.shape[:2]
+            x0 = int(round(cx - sprite_w / 2))
+            y0 = int(round(cy - sprite_h / 2))
+
+            # Clip the stamp rectangle against the frame
+            fx0, fy0 = max(x0, 0), max(y0, 0)
+            fx1, fy1 = min(x0 + sprite_w, frame_w), min(y0 + sprite_h, frame_h)
+            if fx0 >= fx1 or fy0 >= fy1:
+                continue
+            sx0, sy0 = fx0 - x0, fy0 - y0
+            sx1, sy1 = sx0 + (fx1 - fx0), sy0 + (fy1 - fy0)
+
+            roi = frame[fy0:fy1, fx0:fx1]
+            background = cv2.multiply(roi, inv_alpha[sy0:sy1, sx0:sx1], scale=1 / 255)
+            cv2.add(background, premul_rgb[sy0:sy1, sx0:sx1], dst=roi)
+
+        return frame
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def _rotated(image, angle):
+    """
+    Rotates a sprite clockwise by `angle` degrees onto a canvas large enough to hold all of it.
+    """
+    height, width = image.shape[:2]
+    # OpenCV rotates counter-clockwise for positive angles
+    matrix = cv2.getRotationMatrix2D(((width - 1) / 2, (height - 1) / 2), -angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    out_w = int(np.ceil(height * sin + width * cos))
+    out_h = int(np.ceil(height * cos + width * sin))
+    matrix[0, 2] += (out_w - width) / 2
+    matrix[1, 2] += (out_h - height) / 2
+    return cv2.warpAffine(image, matrix, (out_w, out_h), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def draw_overlay(overlay, coords, size, frame, angles=None, squeezes=None):
+    """
+    Stamps the overlay sprite on every face of a frame. Accepts the same inputs as draw_circle.
+
+    Arguments:
+        overlay (SpriteOverlay): sprite engine
+        coords: list of face centroids as [x, y]
+        size: stamp width in pixels (one value or one per face)
+        frame: PIL image or (H, W, 3) uint8 RGB numpy array; numpy frames are blended in place
+        angles, squeezes: per-face alignment of the stamps, see SpriteOverlay.stamp()
+
+    Returns: the generated frame, of the same type as the input
+    """
+    if isinstance(frame, np.ndarray):
+        return overlay.stamp(frame, coords, size, angles, squeezes)
+
+    np_frame = np.array(frame if frame.mode == "RGB" else frame.convert("RGB"))
+    overlay.stamp(np_frame, coords, size, angles, squeezes)
+    return Image.fromarray(np_frame)
@@ -0,0 +1,264 @@
+"""
+file: pipeline.py
+
+Contains the transport-independent core of the vision routes. A frame arrives as an RGB numpy array (see
+utils/frame_handler.py), is run through the selected detector, and the filter sprite is stamped on every
+face, in place. The JSON (base-64) routes and the raw binary routes both go through these helpers so that
+they always produce the same frames.
+"""
+
+import atexit
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from backend.app.utils.env_helper import EnvVars
+from backend.app.utils.frame_handler import FRAME_POOL
+from backend.app.utils.frame_handler import frame_size
+from backend.app.utils.metrics import METRICS
+from backend.app.utils.metrics import stage
+from backend.app.vision.inference import yolo_extract_faces
+from backend.app.vision.inference import yolo_get_coords
+from backend.app.vision.inference import yolo_get_boxes
+from backend.app.vision.inference import media_get_faces
+from backend.app.vision.inference import cascade_get_landmarks
+from backend.app.vision.inference import open_media_session
+from backend.app.vision.detectors import box_centroids
+from backend.app.vision.motion import MotionGate
+from backend.app.vision.overlay import SpriteOverlay
+from backend.app.vision.overlay import draw_overlay
+from backend.app.vision.quality import QualityController
+from backend.app.vision.streams import StreamRegistry
+from backend.app.vision.tracker import FaceTracker
+
+envs = EnvVars()
+
+DETECTORS = ("yolo", "media", "cascade")
+GATED_DETECTORS = ("yolo", "cascade") # Detectors whose YOLO stage runs behind a motion gate
+
+# Width in pixels of the filter stamped by each detector
+STAMP_SIZE = {
+    "yolo": 50,
+    "media": 200,
+    "cascade": 200,
+}
+# Width of the filter on faces with landmarks (media, cascade), in eye distances; it is aligned with the head
+POSE_STAMP_SCALE = 2.5
+
+OVERLAY = SpriteOverlay.from_path(envs.FILTER_SPRITE) # Shared filter sprite, the default is a red ring
+
+# Adapts resolution, detection interval, JPEG quality and max faces to hold the TARGET_FPS frame budget
+QUALITY = QualityController(
+    budget_ms = 1000 / envs.TARGET_FPS,
+    window = envs.QUALITY_WINDOW,
+    hold_s = envs.QUALITY_HOLD_S,
+    enabled = envs.QUALITY_ADAPT,
+)
+
+def jpeg_quality():
+    # Returns: JPEG quality of the generated frames when the client did not ask for one
+    return min(envs.JPEG_QUALITY, QUALITY.point.quality)
+
+def detect(detector: str, frame, session=None):
+    """
+    Runs the selected detector on a frame at the quality controller's operating point.
+
+    Arguments:
+        detector (str): "yolo", "media" or "cascade" (YOLO boxes, then Mediapipe landmarks on the face crops)
+        frame: current RGB frame (numpy array, or PIL image)
+        session: per-feed state of the detector, or None: the MotionGate of the frame's feed for yolo and
+                 cascade, its streaming MediapipeSession for media
+
+    Returns: list of face centroids as [x, y]
+    """
+    return detect_faces(detector, frame, session)[0]
+
+def detect_faces(detector: str, frame, session=None):
+    """
+    Same as detect(), and also returns how the filter lines up with every face.
+
+    Returns: (list of face centroids as [x, y], pose or None). The pose is one [stamp width, rotation,
+             squeeze] per face (see LandmarkFeatures.stamp_pose) for detectors with landmarks, None otherwise.
+    """
+    if detector not in DETECTORS:
+        raise ValueError(f"unknown detector: {detector}")
+
+    point = QUALITY.point
+    features = None
+    with _downscaled(frame, point.scale) as small:
+        if detector == "yolo" and session is not None:
+            # detect_boxes times its own inference and coords stages
+            coords = box_centroids(session.detect(small, stride=point.interval))
+        elif detector == "yolo":
+            with stage("inference", detector="yolo"):
+                face_data = yolo_extract_faces(small)
+            with stage("coords", detector="yolo"):
+                coords = yolo_get_coords(face_data)
+        elif detector == "media":
+            # media_get_faces times its own inference and coords stages
+            # The landmarkers always look for the default face count, so every operating point shares the
+            # same pooled landmarkers; a lower max_faces keeps the largest faces of the result
+            coords, features = media_get_faces(small, envs.MEDIA_DIR, session=session)
+            if point.max_faces is not None and len(coords) > point.max_faces:
+                coords, features = _largest_faces(coords, features, point.max_faces)
+        else:
+            boxes = detect_boxes(small) if session is None else session.detect(small, stride=point.interval)
+            if point.max_faces is not None:
+                boxes = sorted(boxes, key=lambda box: box[4], reverse=True)[:point.max_faces]
+            # One face per YOLO box: the landmarked centroid when the landmarker found the face, the box
+            # center otherwise (and always without landmarks, with the stub detector)
+            coords = box_centroids(boxes)
+            landmarks = cascade_get_landmarks(small, boxes)
+            if landmarks is not None:
+                features, found = landmarks
+                for i, centroid in zip(found.tolist(), features.centroids.astype(int).tolist()):
+                    coords[i] = centroid
+
+        pose = None
+        if detector == "cascade" and features is not None:
+            # Boxes without landmarks get an upright stamp, sized below
+            pose = np.tile(np.array([np.nan, 0.0, 1.0]), (len(coords), 1))
+            pose[found] = features.stamp_pose(POSE_STAMP_SCALE)
+        elif features is not None and len(features) == len(coords):
+            pose = features.stamp_pose(POSE_STAMP_SCALE)
+        if small is not frame:
+            (width, height), (small_w, small_h) = frame_size(frame), frame_size(small)
+            scale_x, scale_y = width / small_w, height / small_h
+            coords = [[type(x)(x * scale_x), type(y)(y * scale_y)] for x, y in coords]
+            if pose is not None:
+                pose[:, 0] *= scale_x
+        if pose is not None:
+            pose[np.isnan(pose[:, 0]), 0] = STAMP_SIZE[detector]
+            pose = pose.astype(float).round(2).tolist()
+
+    METRICS.inc("frames_total", detector=detector)
+    METRICS.inc("faces_total", len(coords), detector=detector)
+    return coords, pose
+
+def _largest_faces(coords, features, count):
+    # Returns: (coords, features) of the `count` largest faces; without features, the first `count` faces
+    if features is None or len(features) != len(coords):
+        return coords[:count], None
+    boxes = features.boxes
+    order = np.argsort(-(boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), kind="stable")[:count]
+    return [coords[i] for i in order], features.take(order)
+
+@contextmanager
+def _downscaled(frame, scale):
+    # Yields: the frame resized by `scale` for detection, or the frame itself at scale 1.
+    #         Numpy frames are resized into a pooled buffer that is released after the with block.
+    if scale >= 1:
+        yield frame
+        return
+    width, height = frame_size(frame)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if not isinstance(frame, np.ndarray):
+        with stage("downscale"):
+            small = frame.resize(size, Image.BILINEAR)
+        yield small
+        return
+    with FRAME_POOL.checkout((size[1], size[0], frame.shape[2])) as small:
+        with stage("downscale"):
+            cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        yield small
+
+def frame_gen(detector: str, frame, session=None):
+    """
+    Detects the faces on a frame and stamps the filter on them.
+
+    Arguments:
+        detector (str): see detect()
+        frame: current RGB frame; numpy frames are drawn on in place
+        session: see detect()
+
+    Returns: (generated frame, face centroids)
+    """
+    coords, pose = detect_faces(detector, frame, session)
+    return draw(detector, frame, coords, pose), coords
+
+def draw(detector: str, frame, coords, pose=None):
+    """
+    Stamps the filter on already detected faces.
+
+    Arguments:
+        detector (str): detector the centroids came from, which sets the stamp size without a pose
+        frame: current RGB frame; numpy frames are drawn on in place
+        coords: list of face centroids as [x, y]
+        pose: per-face [stamp width, rotation, squeeze] from detect_faces(), or None for upright stamps
+
+    Returns: generated frame
+    """
+    with stage("draw", detector=detector):
+        if pose is None:
+            return draw_overlay(OVERLAY, coords, STAMP_SIZE[detector], frame)
+        sizes, angles, squeezes = zip(*pose) if pose else ((), (), ())
+        return draw_overlay(OVERLAY, coords, sizes, frame, angles, squeezes)
+
+def detect_boxes(frame):
+    """
+    Runs YOLO on a frame and returns the face boxes as [x1, y1, x2, y2, confidence].
+    """
+    with stage("inference", detector="yolo"):
+        face_data = yolo_extract_faces(frame)
+    with stage("coords", detector="yolo"):
+        return yolo_get_boxes(face_data)
+
+def make_motion_gate():
+    """
+    Builds a YOLO motion gate for one feed using the configured thresholds.
+    """
+    return MotionGate(
+        detect_boxes,
+        width = envs.MOTION_WIDTH,
+        threshold = envs.MOTION_THRESHOLD,
+        min_pixels = envs.MOTION_MIN_PIXELS,
+        full_interval = envs.MOTION_FULL_INTERVAL_S,
+        pad = envs.MOTION_ROI_PAD,
+        max_roi = envs.MOTION_ROI_MAX,
+    )
+
+def make_tracker():
+    """
+    Builds a YOLO-backed face tracker using the configured frame budget.
+    """
+    return FaceTracker(
+        detect_boxes,
+        frame_budget_ms = 1000 / envs.TARGET_FPS,
+        max_interval = envs.TRACK_MAX_INTERVAL,
+    )
+
+# Per-stream state of every camera and client: motion gate, tracker, Mediapipe session, last detections
+STREAMS = StreamRegistry(
+    make_gate = make_motion_gate if envs.MOTION_GATE else None,
+    make_tracker = make_tracker,
+    open_media = open_media_session,
+    max_streams = envs.STREAM_MAX,
+    idle_ttl = envs.STREAM_IDLE_TTL_S,
+    max_media = envs.MEDIA_SESSION_MAX,
+)
+atexit.register(STREAMS.close)
+
+def track_frame_gen(tracker, frame):
+    """
+    Tracking variant of frame_gen: the tracker decides whether YOLO runs on this frame.
+
+    Arguments:
+        tracker (FaceTracker): per-stream tracker
+        frame: current RGB frame; numpy frames are drawn on in place
+
+    Returns: (generated frame, list of track dicts, whether the detector ran)
+    """
+    tracker.min_interval = min(QUALITY.point.interval, tracker.max_interval)
+    with stage("track", detector="yolo"):
+        tracks, detected = tracker.update(frame)
+    METRICS.inc("frames_total", detector="yolo")
+    METRICS.inc("faces_total", len(tracks), detector="yolo")
+    if not detected:
+        METRICS.inc("detections_skipped_total", detector="yolo")
+
+    coords = [track["centroid"] for track in tracks]
+    with stage("draw", detector="yolo"):
+        gen_frame = draw_overlay(OVERLAY, coords, STAMP_SIZE["yolo"], frame)
+    return gen_frame, tracks, detected
@@ -0,0 +1,134 @@
+"""
+file: quality.py
+
+Contains the adaptive quality controller that holds the frame budget (1000 / TARGET_FPS ms). Every
+processed frame reports its cost: its server-side latency without the decode and encode stages
+(CODEC_STAGES). Those depend on the client's image size and format, not on the controller's settings; a
+480p PNG reply alone takes about the whole budget, and counting it would push every JSON route to the
+cheapest point for nothing. The controller walks a ladder of operating points,
+from full quality down to the cheapest settings, each of which sets:
+    scale       factor the frame is downscaled by before detection; centroids are scaled back
+    interval    detection interval: the motion gate and the trackers run the detector at most every
+                `interval` frames and reuse the faces in between
+    quality     JPEG quality of the generated frames when the client did not ask for one
+    max_faces   faces looked for by the Mediapipe and cascade detectors; None keeps their defaults
+
+Hysteresis keeps the settings from oscillating:
+    - it steps down (cheaper) when the mean cost of the last `window` frames is above
+      `degrade_at` x budget, and up only when it is below `recover_at` x budget;
+    - after a change it waits `hold_s` seconds (twice that before stepping up) and a full window of
+      frames measured at the new point before deciding again.
+
+One controller is shared by the whole server process, since every stream competes for the same CPU.
+The clock is injectable, so the controller can be driven by a fake clock and a fake (stub) detector.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+from backend.app.utils.metrics import METRICS
+
+# Stages left out of the cost a frame reports
+CODEC_STAGES = ("decode", "encode")
+
+
+class OperatingPoint(NamedTuple):
+    scale: float
+    interval: int
+    quality: int
+    max_faces: int | None
+
+
+# Best first; every step gives up a little more
+LADDER = (
+    OperatingPoint(1.0, 1, 80, None),
+    OperatingPoint(1.0, 1, 70, None),
+    OperatingPoint(0.75, 1, 70, 4),
+    OperatingPoint(0.75, 2, 60, 3),
+    OperatingPoint(0.5, 2, 55, 2),
+    OperatingPoint(0.5, 3, 50, 1),
+)
+
+
+class QualityController:
+    def __init__(self, budget_ms: float, ladder=LADDER, window: int = 24, degrade_at: float = 1.0,
+                 recover_at: float = 0.7, hold_s: float = 2.0, enabled: bool = True, clock=time.monotonic):
+        """
+        Arguments:
+            budget_ms (float): target cost per frame
+            ladder (tuple): OperatingPoints, best first
+            window (int): frames the mean cost is taken over
+            degrade_at (float): fraction of the budget above which the controller steps down
+            recover_at (float): fraction of the budget below which it steps back up
+            hold_s (float): seconds to stay at a new point before stepping down again (x2 before stepping up)
+            enabled (bool): False pins the best point
+            clock: monotonic time source in seconds, injectable for testing
+        """
+        if not ladder:
+            raise ValueError("the ladder needs at least one operating point")
+        self.budget_ms = budget_ms
+        self.ladder = tuple(ladder)
+        self.window = max(1, int(window))
+        self.degrade_at = degrade_at
+        self.recover_at = recover_at
+        self.hold_s = hold_s
+        self.enabled = enabled
+        self.clock = clock
+        self.level = 0
+        self.changes = 0
+        self._latencies = deque(maxlen=self.window)
+        self._changed_at = clock()
+        self._lock = threading.Lock()
+        METRICS.gauge("quality_level", lambda: self.level)
+
+    @property
+    def point(self):
+        return self.ladder[self.level]
+
+    def observe(self, cost_ms):
+        """
+        Records the cost of one frame (its latency without CODEC_STAGES) and moves along the ladder when it is due.
+
+        Returns: the OperatingPoint for the next frames
+        """
+        with self._lock:
+            if not self.enabled:
+                return self.point
+            self._latencies.append(cost_ms)
+            if len(self._latencies) < self.window:
+                return self.point
+
+            mean = sum(self._latencies) / len(self._latencies)
+            held = self.clock() - self._changed_at
+            if mean > self.degrade_at * self.budget_ms and held >= self.hold_s:
+                self._move(+1)
+            elif mean < self.recover_at * self.budget_ms and held >= 2 * self.hold_s:
+                self._move(-1)
+            return self.point
+
+    def _move(self, step):
+        level = max(0, min(len(self.ladder) - 1, self.level + step))
+        if level == self.level:
+            return
+        self.level = level
+        self.changes += 1
+        self._changed_at = self.clock()
+        # Latencies measured at the old point say nothing about the new one
+        self._latencies.clear()
+        METRICS.inc("quality_changes_total", direction="down" if step > 0 else "up")
+
+    def stats(self):
+        with self._lock:
+            mean = sum(self._latencies) / len(self._latencies) if self._latencies else None
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                "levels": len(self.ladder),
+                "point": self.point._asdict(),
+                "budget_ms": round(self.budget_ms, 2),
+                "mean_latency_ms": None if mean is None else round(mean, 2),
+                "changes": self.changes,
+                "held_s": round(self.clock() - self._changed_at, 1),
+            }
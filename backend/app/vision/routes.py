@@ -1,55 +1,432 @@
-from flask import Blueprint, jsonify, request
+import atexit
+import binascii
+import json
+import time
 
-from backend.app.vision.inference import YOLO_MODEL
+import cv2
+from flask import Blueprint, Response, g, jsonify, request
+from PIL import UnidentifiedImageError
 
-from backend.app.vision.inference import yolo_extract_faces
-from backend.app.vision.inference import yolo_get_coords 
-from backend.app.vision.inference import media_get_coords 
-from backend.app.vision.inference import draw_circle 
+from backend.app.vision.capture import get_capture
+from backend.app.vision.executor import InferenceBusy
+from backend.app.vision.frame_cache import FrameCache
+from backend.app.vision.frame_cache import fingerprint
+from backend.app.vision.inference import detector_input_size
+from backend.app.vision.loader import ModelUnavailable
+from backend.app.vision.media_session import SessionClosed
+from backend.app.vision.mjpeg import BOUNDARY
+from backend.app.vision.mjpeg import LiveOutputs
+from backend.app.vision.mjpeg import multipart_stream
+from backend.app.vision.pipeline import DETECTORS
+from backend.app.vision.pipeline import GATED_DETECTORS
+from backend.app.vision.pipeline import QUALITY
+from backend.app.vision.pipeline import STREAMS
+from backend.app.vision.pipeline import detect_faces
+from backend.app.vision.pipeline import draw
+from backend.app.vision.pipeline import frame_gen
+from backend.app.vision.pipeline import jpeg_quality
+from backend.app.vision.pipeline import track_frame_gen
+from backend.app.vision.quality import CODEC_STAGES
+from backend.app.vision.stream import StreamSession
+from backend.app.vision.stream import sock
+from backend.app.vision.streams import bind_stream
+from backend.app.vision.streams import current_stream_key
+from backend.app.vision.streams import stream_id
+from backend.app.vision.workers import WorkerCrashed
 
-from backend.app.utils.env_helper import EnvVars 
-from backend.app.utils.pillow_handler import decode_base64_to_pillow 
-from backend.app.utils.pillow_handler import encode_pillow_to_base64 
+from backend.app.utils.env_helper import EnvVars
+from backend.app.utils.metrics import stage
+from backend.app.utils.codec import FORMAT_MIMETYPES
+from backend.app.utils.codec import LOSSY_FORMATS
+from backend.app.utils.codec import decode_bytes_to_frame
+from backend.app.utils.codec import decode_bytes_to_scaled_frame
+from backend.app.utils.codec import encode_frame_to_base64
+from backend.app.utils.codec import encode_frame_to_bytes
+from backend.app.utils.codec import normalize_format
+from backend.app.utils.frame_handler import FRAME_POOL
+from backend.app.utils.frame_handler import bgr_to_frame
+from backend.app.utils.frame_handler import frame_size
+from backend.app.utils.pillow_handler import decode_base64_to_bytes
 
 vision_bp = Blueprint('vision', __name__)
 envs = EnvVars()
 
+RAW_CONTENT_TYPES = ("image/jpeg", "application/octet-stream")
+CAPTURE_STREAM = "capture" # Stream key of the server-side camera
+
+# Reuses detections (and encoded outputs) while a stream's scene does not change; FRAME_CACHE_SIZE=0 disables it
+FRAME_CACHE = None
+if envs.FRAME_CACHE_SIZE > 0:
+    FRAME_CACHE = FrameCache(
+        max_entries = envs.FRAME_CACHE_SIZE,
+        ttl = envs.FRAME_CACHE_TTL_S,
+        threshold = envs.FRAME_CACHE_THRESHOLD,
+    )
+
+@vision_bp.errorhandler(ModelUnavailable)
+@vision_bp.errorhandler(WorkerCrashed)
+@vision_bp.errorhandler(SessionClosed)
+def _model_unavailable(e):
+    return jsonify({'error': str(e)}), 503
+
+@vision_bp.errorhandler(InferenceBusy)
+@vision_bp.errorhandler(TimeoutError)
+def _inference_busy(e):
+    return jsonify({'error': str(e) or "inference timed out"}), 503, {'Retry-After': "1"}
+
+@vision_bp.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+@vision_bp.after_request
+def _observe_latency(response):
+    # Every processed frame feeds the quality controller; errors and status routes say nothing about the load
+    if request.method == 'POST' and response.status_code == 200 and 'started' in g:
+        latency_ms = (time.perf_counter() - g.started) * 1000
+        codec_ms = sum(ms for name, ms in g.get('stage_timings', ()) if name in CODEC_STAGES)
+        QUALITY.observe(latency_ms - codec_ms)
+        stream = STREAMS.peek(current_stream_key())
+        if stream is not None:
+            stream.observe(latency_ms)
+    return response
+
+@vision_bp.teardown_request
+def _release_frames(exc):
+    # The request's frames are done with once its response is built
+    for frame in g.pop('frames', ()):
+        FRAME_POOL.release(frame)
+
+def _pooled(frame):
+    """
+    Hands a frame of the current request back to the frame pool when the request ends.
+    """
+    g.setdefault('frames', []).append(frame)
+    return frame
+
+def _stream_session(detector, stream):
+    """
+    Returns the per-feed state of the detector kept by a StreamState, or None: the stream's motion gate for
+    yolo and cascade, its Mediapipe streaming session for media. Mediapipe sessions are only used for streams
+    the client named (see streams.stream_id), since several feeds can share one client address.
+    """
+    if detector in GATED_DETECTORS:
+        return stream.motion_gate()
+    if stream_id() is None:
+        return None
+    return STREAMS.media_session(stream)
+
+def _probe_cache(detector, body):
+    """
+    Fingerprints an encoded frame and looks it up in the frame cache.
+
+    Returns: (probe, CacheEntry or None). The probe is passed to _frame_detections(); it is None when the
+             cache is disabled or the body cannot be fingerprinted (decoding then reports the error).
+    """
+    if FRAME_CACHE is None:
+        return None, None
+    try:
+        with stage("fingerprint"):
+            size, thumb = fingerprint(body)
+    except (UnidentifiedImageError, OSError):
+        return None, None
+    probe = (detector, current_stream_key(), size, thumb)
+    return probe, FRAME_CACHE.get(*probe)
+
+def _frame_detections(detector, frame, probe, entry, draw_frame=True, size=None):
+    """
+    Detects the faces and draws the filter (only detects when draw_frame is False), reusing the cached
+    detections on a hit and caching the new ones on a miss.
+
+    Arguments:
+        size (tuple): (width, height) of the encoded frame when `frame` was decoded smaller; the centroids
+                      are scaled back to it (only with draw_frame=False)
+
+    Returns: (generated frame or None, face centroids, CacheEntry or None)
+    """
+    stream = STREAMS.get(current_stream_key())
+    if entry is not None:
+        coords = entry.coords
+        stream.record(detector, coords, size or frame_size(frame))
+        return (draw(detector, frame, coords, entry.pose) if draw_frame else None), coords, entry
+
+    session = _stream_session(detector, stream)
+    coords, pose = detect_faces(detector, frame, session)
+    if draw_frame:
+        gen_frame = draw(detector, frame, coords, pose)
+    else:
+        gen_frame = None
+        if size is not None and size != frame_size(frame):
+            scale_x, scale_y = size[0] / frame.shape[1], size[1] / frame.shape[0]
+            coords = [[type(x)(x * scale_x), type(y)(y * scale_y)] for x, y in coords]
+            # The cached pose is drawn by the image routes on the full-size frame
+            if pose is not None:
+                pose = [[round(width * scale_x, 2), roll, squeeze] for width, roll, squeeze in pose]
+    stream.record(detector, coords, size or frame_size(frame))
+    if probe is not None:
+        entry = FRAME_CACHE.put(*probe, coords, pose)
+    return gen_frame, coords, entry
+
+def _json_inference(detector):
+    json_data = request.get_json(silent=True) or {}
+    b64_string = json_data.get('b64_input')
+
+    if not isinstance(b64_string, str):
+        return jsonify({'b64_output': ""}), 400
+
+    try:
+        with stage("decode"):
+            body = decode_base64_to_bytes(b64_string)
+    except binascii.Error:
+        return jsonify({'b64_output': ""}), 400
+    format = _output_format("PNG", accept=False)
+    quality = _jpeg_quality()
+    headers = {'X-Image-Format': format}
+    output_key = ("b64", format, quality if format in LOSSY_FORMATS else None)
+    probe, entry = _probe_cache(detector, body)
+    if entry is not None and entry.output(output_key) is not None:
+        return jsonify({'b64_output': entry.output(output_key)}), 200, {**headers, 'X-Frame-Cache': "output"}
+
+    try:
+        with stage("decode"):
+            frame = _pooled(decode_bytes_to_frame(body))
+    except (UnidentifiedImageError, OSError):
+        return jsonify({'b64_output': ""}), 400
+
+    #inference
+    sample_frame_gen, _, entry = _frame_detections(detector, frame, probe, entry)
+
+    #b64 encode
+    with stage("encode"):
+        b64_output = encode_frame_to_base64(sample_frame_gen, format=format, quality=quality)
+    if entry is not None and envs.FRAME_CACHE_OUTPUT:
+        entry.add_output(output_key, b64_output)
+
+    #ret
+    return jsonify({'b64_output': b64_output}), 200, headers
+
+def _read_raw_body():
+    """
+    Reads the raw image body of the current request.
+
+    Returns: (encoded bytes, None) on success, or (None, error response) otherwise
+    """
+    content_type = (request.mimetype or "").lower()
+    if content_type not in RAW_CONTENT_TYPES:
+        return None, (jsonify({'error': f"unsupported content type '{content_type}'"}), 415)
+
+    body = request.get_data(cache=False)
+    if not body:
+        return None, (jsonify({'error': "empty body"}), 400)
+    return body, None
+
+def _decode_raw_body(body):
+    """
+    Returns: (RGB frame, None) on success, or (None, error response) otherwise
+    """
+    try:
+        with stage("decode"):
+            frame = _pooled(decode_bytes_to_frame(body))
+    except (UnidentifiedImageError, OSError):
+        return None, (jsonify({'error': "body is not a decodable image"}), 400)
+
+    return frame, None
+
+def _read_raw_frame():
+    """
+    Reads and decodes the raw image body of the current request.
+
+    Returns: (RGB frame, None) on success, or (None, error response) otherwise
+    """
+    body, error = _read_raw_body()
+    if error:
+        return None, error
+    return _decode_raw_body(body)
+
+def _jpeg_quality():
+    """
+    Negotiates the JPEG output quality from the `quality` query argument or the `X-JPEG-Quality` header.
+    Without either, the quality controller's current quality is used.
+    """
+    quality = request.args.get('quality', request.headers.get('X-JPEG-Quality'))
+    try:
+        quality = int(quality)
+    except (TypeError, ValueError):
+        return jpeg_quality()
+    return max(1, min(95, quality))
+
+def _output_format(default, accept=True):
+    """
+    Negotiates the output image format: the `format` query argument or the `X-Image-Format` header first,
+    then (when `accept` is set) the Accept header. Unsupported values fall back to the default.
+
+    Arguments:
+        default (str): format used when the client does not ask for one ("JPEG" for binary replies)
+        accept (bool): False for JSON replies, whose Accept header is about the JSON and not the image
+    """
+    format = normalize_format(request.args.get('format', request.headers.get('X-Image-Format')))
+    if format is not None:
+        return format
+    if accept:
+        # The default comes first so that */* and a missing Accept header pick it
+        mimetypes = [FORMAT_MIMETYPES[default]] + [m for f, m in FORMAT_MIMETYPES.items() if f != default]
+        format = normalize_format(request.accept_mimetypes.best_match(mimetypes))
+    return format or default
+
+def _image_response(image_bytes, coords, format, quality):
+    response = Response(image_bytes, status=200, mimetype=FORMAT_MIMETYPES[format])
+    response.headers['X-Face-Count'] = str(len(coords))
+    if format in LOSSY_FORMATS:
+        response.headers['X-JPEG-Quality'] = str(quality)
+    response.vary.add('Accept')
+    return response
+
+def _raw_inference(detector):
+    body, error = _read_raw_body()
+    if error:
+        return error
+
+    format = _output_format("JPEG")
+    quality = _jpeg_quality()
+    output_key = (format, quality if format in LOSSY_FORMATS else None)
+    probe, entry = _probe_cache(detector, body)
+    if entry is not None and entry.output(output_key) is not None:
+        response = _image_response(entry.output(output_key), entry.coords, format, quality)
+        response.headers['X-Frame-Cache'] = "output"
+        return response
+
+    frame, error = _decode_raw_body(body)
+    if error:
+        return error
+
+    cached = entry is not None
+    sample_frame_gen, coords, entry = _frame_detections(detector, frame, probe, entry)
+    with stage("encode"):
+        image_bytes = encode_frame_to_bytes(sample_frame_gen, format=format, quality=quality)
+    if entry is not None and envs.FRAME_CACHE_OUTPUT:
+        entry.add_output(output_key, image_bytes)
+
+    response = _image_response(image_bytes, coords, format, quality)
+    if cached:
+        response.headers['X-Frame-Cache'] = "detections"
+    return response
+
+def _raw_detections(detector):
+    body, error = _read_raw_body()
+    if error:
+        return error
+
+    probe, entry = _probe_cache(detector, body)
+    if entry is not None:
+        img_w, img_h = entry.size
+        return jsonify({'width': img_w, 'height': img_h, 'faces': entry.coords}), 200, {'X-Frame-Cache': "detections"}
+
+    # Only the detections are returned, so a JPEG can be decoded no larger than the detector's input
+    fit = detector_input_size(detector) if envs.DECODE_REDUCE and detector != "cascade" else None
+    try:
+        with stage("decode"):
+            frame, (img_w, img_h) = decode_bytes_to_scaled_frame(body, fit)
+    except (UnidentifiedImageError, OSError):
+        return jsonify({'error': "body is not a decodable image"}), 400
+    _pooled(frame)
+
+    _, coords, _ = _frame_detections(detector, frame, probe, entry, draw_frame=False, size=(img_w, img_h))
+
+    return jsonify({'width': img_w, 'height': img_h, 'faces': coords}), 200
+
 @vision_bp.route('/yolo', methods=['POST'])
 def yolo_inference():
     """
     Perform a YOLOv8 inference to do frame generation.
-    
+
     This route receives a raw base-64 image digest where it is decoded, transformed to a PIL object,
     and inputted to the YOLO backend for frame generation. The route replies with the base-64 digest
     of the frame-generated image that includes the filters to the frontend.
 
-    Methods: 
+    Methods:
     GET - for checking if YOLO is active
     POST - supply a b64 image of the live feed to perform frame gen
 
-    Input payload: 
+    Input payload:
     {'b64_input': <long string>}
     Output payload:
     {'b64_output': <long string>}
+
+    The output is a PNG unless ?format= or the X-Image-Format header asks for JPEG or WEBP; the reply's
+    X-Image-Format header names the format.
     """
-    json_data = request.get_json(silent=True)
-    b64_string = json_data.get('b64_input')
+    return _json_inference("yolo")
 
-    if b64_string is None: 
-        return jsonify({'b64_output': ""}), 400
+@vision_bp.route('/yolo/raw', methods=['POST'])
+def yolo_inference_raw():
+    """
+    Binary variant of /yolo that skips base-64 and JSON on both sides.
 
-    pil_img = decode_base64_to_pillow(b64_string)
+    Input body: JPEG (or any Pillow-readable) bytes with Content-Type image/jpeg or application/octet-stream
+    Output body: JPEG bytes (image/jpeg). The quality is taken from ?quality= or the X-JPEG-Quality header.
+    PNG or WEBP can be asked for with ?format=, the X-Image-Format header or the Accept header.
+    """
+    return _raw_inference("yolo")
 
-    #inference
-    face_data = yolo_extract_faces(pil_img)
-    coords = yolo_get_coords(face_data)
-    sample_frame_gen = draw_circle(coords, 25, pil_img) # DELETE THIS TO REPLACE TRUE FRAME GENERATION
+@vision_bp.route('/yolo/detections', methods=['POST'])
+def yolo_detections_raw():
+    """
+    Runs YOLO on a binary frame and returns only the detections.
 
-    #b64 encode
-    b64_output = encode_pillow_to_base64(sample_frame_gen)
+    Input body: same as /yolo/raw
+    Output payload:
+    {'width': <int>, 'height': <int>, 'faces': [[x, y], ...]}
 
-    #ret
-    return jsonify({'b64_output': b64_output}), 200
+    JPEGs larger than the detector's input are decoded at 1/2, 1/4 or 1/8 scale (DECODE_REDUCE); the
+    faces are still in pixels of the uploaded frame.
+    """
+    return _raw_detections("yolo")
+
+@vision_bp.route('/yolo/track', methods=['POST'])
+def yolo_track_raw():
+    """
+    Tracking variant of /yolo/raw for a continuous feed. Every stream (see /streams) has its own tracker.
+
+    YOLO only runs every N frames (N adapts to TARGET_FPS) or when track confidence drops; the frames in between
+    reuse the tracked boxes. Faces keep a stable ID across requests.
+
+    Input body: same as /yolo/raw
+    Output body: JPEG bytes, or with ?output=detections:
+    {'width': <int>, 'height': <int>, 'detected': <bool>, 'tracks': [{'id', 'box', 'centroid', 'confidence', 'predicted'}, ...]}
+    """
+    frame, error = _read_raw_frame()
+    if error:
+        return error
+
+    stream = STREAMS.get(current_stream_key())
+    with stream.lock:
+        sample_frame_gen, tracks, detected = track_frame_gen(stream.tracker(), frame)
+    img_w, img_h = frame_size(frame)
+    stream.record("yolo", [track['centroid'] for track in tracks], (img_w, img_h))
+
+    if request.args.get('output') == "detections":
+        response = jsonify({'width': img_w, 'height': img_h, 'detected': detected, 'tracks': tracks})
+    else:
+        format = _output_format("JPEG")
+        quality = _jpeg_quality()
+        with stage("encode"):
+            image_bytes = encode_frame_to_bytes(sample_frame_gen, format=format, quality=quality)
+        response = _image_response(image_bytes, tracks, format, quality)
+        response.headers['X-Track-Ids'] = ",".join(str(track['id']) for track in tracks)
+        response.headers['X-Detected'] = "1" if detected else "0"
+
+    # The tracker adapts its interval to what this request cost the server, not to the client's frame rate
+    with stream.lock:
+        stream.tracker().observe_frame((time.perf_counter() - g.started) * 1000)
+    return response
+
+@vision_bp.route('/yolo/track', methods=['GET'])
+def yolo_track_status():
+    """
+    Reports the state of the caller's tracker (current detection interval, track count, measured costs).
+    """
+    stream = STREAMS.get(current_stream_key())
+    with stream.lock:
+        return jsonify(stream.tracker().stats()), 200
 
 @vision_bp.route('/media', methods=['POST'])
 def media_inference():
@@ -60,30 +437,270 @@ def media_inference():
     can utilize. Once the face centroids are retrieved and frame generation is performed, the
     resulting image is encoded back to base-64 and sent to the frontend.
 
-    Methods: 
+    Methods:
     GET - for checking if Mediapipe is active
     POST - supply a b64 image of the live feed to perform frame gen
 
-    Input payload: 
+    Input payload:
     {'b64_input': <long string>}
     Output payload:
     {'b64_output': <long string>}
     """
-    json_data = request.get_json(silent=True)
-    b64_string = json_data.get('b64_input')
+    return _json_inference("media")
 
-    if b64_string is None: 
-        return jsonify({'b64_output': ""}), 400
+@vision_bp.route('/media/raw', methods=['POST'])
+def media_inference_raw():
+    """
+    Binary variant of /media. See /yolo/raw for the body format and quality negotiation.
+    """
+    return _raw_inference("media")
 
-    pil_img = decode_base64_to_pillow(b64_string)
+@vision_bp.route('/media/detections', methods=['POST'])
+def media_detections_raw():
+    """
+    Runs Mediapipe on a binary frame and returns only the detections. See /yolo/detections.
 
-    #inference
-    coords = media_get_coords(pil_img, envs.MEDIA_DIR)
-    sample_frame_gen = draw_circle(coords, 100, pil_img) # DELETE THIS TO REPLACE TRUE FRAME GENERATION
+    The /media routes process frames independently. Clients sending a continuous feed can add an
+    X-Stream-Id header: the feed's frames then share a streaming landmarker (MEDIA_STREAM_MODE) that
+    tracks the faces between frames. Frames of one stream id must be sent in order.
+    """
+    return _raw_detections("media")
 
-    #b64 encode
-    b64_output = encode_pillow_to_base64(sample_frame_gen)
+@vision_bp.route('/cascade', methods=['POST'])
+def cascade_inference():
+    """
+    Performs frame generation with the YOLO -> Mediapipe cascade: YOLO finds the faces, then Mediapipe
+    finds their landmarks on padded crops of the YOLO boxes, batched into mosaics. Unlike /media there
+    is no limit on the number of faces. See /yolo for the payloads.
+    """
+    return _json_inference("cascade")
 
-    #ret
-    return jsonify({'b64_output': b64_output}), 200
+@vision_bp.route('/cascade/raw', methods=['POST'])
+def cascade_inference_raw():
+    """
+    Binary variant of /cascade. See /yolo/raw for the body format and quality negotiation.
+    """
+    return _raw_inference("cascade")
+
+@vision_bp.route('/cascade/detections', methods=['POST'])
+def cascade_detections_raw():
+    """
+    Runs the cascade on a binary frame and returns only the detections. See /yolo/detections.
+    """
+    return _raw_detections("cascade")
+
+def _unknown_detector(detector):
+    # Returns: a 404 response for a detector name that is not served, or None
+    if detector not in DETECTORS:
+        return jsonify({'error': f"unknown detector '{detector}'"}), 404
+    return None
+
+@vision_bp.route('/streams/<stream_id>/<detector>', methods=['POST'])
+def stream_inference(stream_id, detector):
+    """
+    Frame generation for one named stream (camera or TV). Same payloads as /yolo, /media and /cascade.
+
+    The per-stream routes are the HTTP routes with the stream id taken from the path instead of the
+    X-Stream-Id header: the stream's motion gate, Mediapipe session, tracker and last detections are used
+    and updated. GET /api/streams/<stream_id> reports them, DELETE /api/streams/<stream_id> drops them.
+    """
+    return _unknown_detector(detector) or _json_inference(detector)
+
+@vision_bp.route('/streams/<stream_id>/<detector>/raw', methods=['POST'])
+def stream_inference_raw(stream_id, detector):
+    """
+    Binary frame generation for one named stream. See /yolo/raw.
+    """
+    return _unknown_detector(detector) or _raw_inference(detector)
+
+@vision_bp.route('/streams/<stream_id>/<detector>/detections', methods=['POST'])
+def stream_detections_raw(stream_id, detector):
+    """
+    Detections only for one named stream. See /yolo/detections.
+    """
+    return _unknown_detector(detector) or _raw_detections(detector)
+
+@vision_bp.route('/streams/<stream_id>/yolo/track', methods=['POST'])
+def stream_track_raw(stream_id):
+    """
+    YOLO tracking for one named stream, with its own tracker. See /yolo/track.
+    """
+    return yolo_track_raw()
+
+@vision_bp.route('/streams/<stream_id>/yolo/track', methods=['GET'])
+def stream_track_status(stream_id):
+    """
+    Reports the tracker of one named stream.
+    """
+    return yolo_track_status()
+
+def _latest_captured():
+    """
+    Fetches the newest frame of the server-side capture thread.
+
+    Returns: ((seq, BGR frame view, timestamp), None) on success, or (None, error response) otherwise
+    """
+    capture = get_capture(envs.CAPTURE_SOURCE, envs.CAPTURE_SLOTS)
+    if capture is None:
+        return None, (jsonify({'error': "capture is disabled, set CAPTURE_SOURCE"}), 503)
+
+    try:
+        ring = capture.wait_ready(timeout=5.0)
+    except Exception as e:
+        return None, (jsonify({'error': f"capture failed: {e}"}), 503)
+
+    latest = ring.latest() if ring is not None else None
+    if latest is None:
+        latest = ring.wait_newer(-1, timeout=1.0) if ring is not None else None
+    if latest is None:
+        return None, (jsonify({'error': "no frame captured yet"}), 503)
+
+    return latest, None
+
+@vision_bp.route('/capture', methods=['GET'])
+def capture_frame():
+    """
+    Returns the newest frame of the server-side camera as JPEG, without any processing.
+    """
+    latest, error = _latest_captured()
+    if error:
+        return error
+
+    seq, bgr_frame, _ = latest
+    quality = _jpeg_quality()
+    with stage("encode"):
+        ok, jpeg = cv2.imencode(".jpg", bgr_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return jsonify({'error': "could not encode frame"}), 500
+
+    response = Response(jpeg.tobytes(), status=200, mimetype="image/jpeg")
+    response.headers['X-Frame-Seq'] = str(seq)
+    return response
+
+@vision_bp.route('/capture/status', methods=['GET'])
+def capture_status():
+    """
+    Reports the state of the server-side capture thread.
+    """
+    capture = get_capture(envs.CAPTURE_SOURCE, envs.CAPTURE_SLOTS)
+    if capture is None:
+        return jsonify({'running': False, 'error': "capture is disabled"}), 200
+    return jsonify(capture.stats()), 200
+
+@vision_bp.route('/capture/<detector>', methods=['GET'])
+def capture_frame_gen(detector):
+    """
+    Runs frame generation on the newest frame of the server-side camera and returns it as JPEG.
+    """
+    error = _unknown_detector(detector)
+    if error:
+        return error
+
+    latest, error = _latest_captured()
+    if error:
+        return error
+
+    seq, bgr_frame, _ = latest
+    with stage("decode"):
+        frame = _pooled(bgr_to_frame(bgr_frame))
+    # The server camera is one continuous feed
+    with bind_stream(CAPTURE_STREAM):
+        stream = STREAMS.get(CAPTURE_STREAM)
+        sample_frame_gen, coords = frame_gen(detector, frame, _stream_session(detector, stream))
+    stream.record(detector, coords, frame_size(frame))
+    quality = _jpeg_quality()
+    with stage("encode"):
+        jpeg_bytes = encode_frame_to_bytes(sample_frame_gen, format="JPEG", quality=quality)
+    stream.observe((time.perf_counter() - g.started) * 1000)
+
+    response = Response(jpeg_bytes, status=200, mimetype="image/jpeg")
+    response.headers['X-Frame-Seq'] = str(seq)
+    response.headers['X-Face-Count'] = str(len(coords))
+    return response
+
+def _render_captured(detector, bgr_frame):
+    """
+    Runs frame generation on a captured frame for the live outputs and encodes it once for every viewer.
+    """
+    start = time.perf_counter()
+    with stage("decode"):
+        frame = bgr_to_frame(bgr_frame)
+    try:
+        detect_start = time.perf_counter()
+        with bind_stream(CAPTURE_STREAM):
+            stream = STREAMS.get(CAPTURE_STREAM)
+            sample_frame_gen, coords = frame_gen(detector, frame, _stream_session(detector, stream))
+        stream.record(detector, coords, frame_size(frame))
+        cost_ms = (time.perf_counter() - detect_start) * 1000
+        with stage("encode"):
+            jpeg_bytes = encode_frame_to_bytes(sample_frame_gen, format="JPEG", quality=jpeg_quality())
+    finally:
+        FRAME_POOL.release(frame)
+    QUALITY.observe(cost_ms)
+    stream.observe((time.perf_counter() - start) * 1000)
+    return jpeg_bytes
+
+# Encoded-once live outputs of the server camera, one producer per detector
+LIVE_OUTPUTS = LiveOutputs(_render_captured, fps=envs.MJPEG_FPS)
+atexit.register(LIVE_OUTPUTS.close)
+
+@vision_bp.route('/live/<detector>', methods=['GET'])
+def live_stream(detector):
+    """
+    Streams the processed server camera as multipart/x-mixed-replace JPEGs, e.g. <img src="/vision/live/yolo">.
+
+    Every viewer of a detector shares the same encoded frames. The frame rate is capped at MJPEG_FPS, or
+    lower with ?fps=. Slow viewers skip to the newest frame.
+    """
+    if detector not in DETECTORS:
+        return jsonify({'error': f"unknown detector '{detector}'"}), 404
+
+    capture = get_capture(envs.CAPTURE_SOURCE, envs.CAPTURE_SLOTS)
+    if capture is None:
+        return jsonify({'error': "capture is disabled, set CAPTURE_SOURCE"}), 503
+
+    try:
+        fps = float(request.args.get('fps', envs.MJPEG_FPS))
+    except ValueError:
+        return jsonify({'error': "fps must be a number"}), 400
+    if envs.MJPEG_FPS > 0:
+        # Viewers can only lower the server's cap
+        fps = min(fps, envs.MJPEG_FPS) if fps > 0 else envs.MJPEG_FPS
+
+    broadcast = LIVE_OUTPUTS.open(detector, capture)
+    response = Response(multipart_stream(broadcast, fps), mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+    response.headers['Cache-Control'] = "no-cache, no-store"
+    response.headers['X-Accel-Buffering'] = "no"
+    return response
+
+@vision_bp.route('/live', methods=['GET'])
+def live_status():
+    """
+    Reports the live output producers (frames produced, viewers, last error) per detector.
+    """
+    return jsonify(LIVE_OUTPUTS.stats()), 200
+
+@sock.route('/stream', bp=vision_bp)
+def frame_stream(ws):
+    """
+    Persistent WebSocket session for continuous frame processing.
+
+    The detector, output, JPEG quality and tracking mode can be set on connect through the query string
+    (/vision/stream?detector=yolo&output=detections&quality=70&track=1) and changed later with a config message.
+    ?stream=<stream_id> (or X-Stream-Id) attaches the connection to a named stream. See vision/stream.py for
+    the message format.
+    """
+    try:
+        session = StreamSession(
+            ws,
+            detector=request.args.get('detector', 'yolo'),
+            output=request.args.get('output', 'frame'),
+            quality=request.args.get('quality'),
+            track=request.args.get('track') in ("1", "true"),
+            stream=stream_id(),
+        )
+    except ValueError as e:
+        ws.send(json.dumps({'type': "error", 'seq': None, 'error': str(e)}))
+        return
 
+    session.run()
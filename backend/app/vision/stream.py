@@ -0,0 +1,295 @@
+"""
+file: stream.py
+
+Contains the WebSocket streaming session used by /vision/stream. Instead of one HTTP request per frame,
+a client keeps a single connection open, pushes frames and receives the generated frames (or only the
+detections) back on the same socket.
+
+Protocol:
+    - Client -> server, binary: 4-byte big-endian sequence number followed by the encoded frame (JPEG/PNG).
+    - Client -> server, text:   {"type": "config", "detector": "yolo"|"media"|"cascade",
+                                 "output": "frame"|"detections", "quality": <1-95>, "track": true|false}
+                                 Without a quality, the frames follow the adaptive quality controller.
+    - Server -> client, text:   {"type": "result", "seq": n, "width": w, "height": h, "faces": [[x, y], ...],
+                                 "dropped": <total stale frames dropped>, "latency_ms": <processing time>}
+                                 In tracking mode (yolo only) the result also carries "tracks" (faces with stable
+                                 IDs) and "detected" (whether YOLO ran on this frame).
+    - Server -> client, binary: when output is "frame", the result is followed by the 4-byte sequence number
+                                 and the generated JPEG.
+    - Server -> client, text:   {"type": "error", "seq": n|null, "error": "<message>"}
+
+Frames are processed latest-frame-wins: when inference falls behind, a frame that is still waiting is
+replaced by the newer one and counted as dropped, so latency never builds up.
+
+Each connection works on one stream of the StreamRegistry (vision/streams.py): the stream named by the
+X-Stream-Id header or the ?stream= query argument, else a private stream that is dropped on disconnect.
+The stream stays attached, and is never evicted, while the connection is open. With the media detector,
+its streaming Mediapipe landmarker (MEDIA_STREAM_MODE) tracks the faces from frame to frame instead of
+running face detection on every frame. With yolo and cascade (without tracking), its motion gate
+(MOTION_GATE) skips or crops the detections.
+"""
+
+import itertools
+import json
+import struct
+import threading
+import time
+import weakref
+
+from PIL import UnidentifiedImageError
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+
+from backend.app.utils.codec import decode_bytes_to_frame
+from backend.app.utils.codec import encode_frame_to_bytes
+from backend.app.utils.frame_handler import FRAME_POOL
+from backend.app.utils.frame_handler import frame_size
+from backend.app.utils.metrics import METRICS
+from backend.app.utils.metrics import stage
+from backend.app.vision.pipeline import DETECTORS
+from backend.app.vision.pipeline import GATED_DETECTORS
+from backend.app.vision.pipeline import QUALITY
+from backend.app.vision.pipeline import STREAMS
+from backend.app.vision.pipeline import detect
+from backend.app.vision.pipeline import frame_gen
+from backend.app.vision.pipeline import jpeg_quality
+from backend.app.vision.pipeline import track_frame_gen
+from backend.app.vision.streams import bind_stream
+
+sock = Sock()
+
+SEQ_HEADER = struct.Struct(">I")
+OUTPUTS = ("frame", "detections")
+_private_streams = itertools.count(1) # Numbers the streams of connections that did not name one
+
+ACTIVE_SESSIONS = weakref.WeakSet()
+METRICS.gauge("stream_sessions", lambda: len(ACTIVE_SESSIONS))
+METRICS.gauge("stream_queue_depth", lambda: sum(session.slot.depth() for session in list(ACTIVE_SESSIONS)))
+
+
+class LatestFrameSlot:
+    """
+    Single-entry mailbox between the socket reader and the inference worker. Putting a frame while
+    another one is still waiting replaces it, so the worker always picks up the newest frame.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, seq, payload):
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+                METRICS.inc("stream_frames_dropped_total")
+            self._pending = (seq, payload)
+            self._cond.notify()
+
+    def drop(self):
+        with self._cond:
+            self.dropped += 1
+        METRICS.inc("stream_frames_dropped_total")
+
+    def get(self):
+        """
+        Blocks until a frame is pending or the slot is closed.
+
+        Returns: (seq, payload), or None once closed
+        """
+        with self._cond:
+            while self._pending is None and not self._closed:
+                self._cond.wait()
+            if self._pending is None:
+                return None
+            item = self._pending
+            self._pending = None
+            return item
+
+    def depth(self):
+        with self._cond:
+            return 0 if self._pending is None else 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamSession:
+    def __init__(self, ws, detector="yolo", output="frame", quality=None, track=False, stream=None):
+        """
+        Arguments:
+            ws: simple_websocket connection
+            detector (str): "yolo", "media" or "cascade"
+            output (str): "frame" to receive generated frames, "detections" for metadata only
+            quality (int): JPEG quality of the generated frames; None follows the quality controller
+            track (bool): run YOLO every N frames and track the faces in between
+            stream (str): stream id of the feed; None uses a private stream for this connection
+        """
+        self.ws = ws
+        self.config = {"detector": "yolo", "output": "frame", "quality": None, "track": False}
+        self.configure({"detector": detector, "output": output, "quality": quality, "track": track})
+        self.stream_id = stream
+        self.stream = None # StreamState, attached while the connection runs
+        self.slot = LatestFrameSlot()
+        self._send_lock = threading.Lock()
+        self.last_seq = None
+        self.processed = 0
+
+    def configure(self, updates):
+        """
+        Applies a (partial) session configuration. Unknown detectors/outputs raise ValueError.
+        """
+        config = dict(self.config)
+        if updates.get("detector") is not None:
+            if updates["detector"] not in DETECTORS:
+                raise ValueError(f"unknown detector '{updates['detector']}'")
+            config["detector"] = updates["detector"]
+        if updates.get("output") is not None:
+            if updates["output"] not in OUTPUTS:
+                raise ValueError(f"unknown output '{updates['output']}'")
+            config["output"] = updates["output"]
+        if updates.get("quality") is not None:
+            config["quality"] = max(1, min(95, int(updates["quality"])))
+        if updates.get("track") is not None:
+            config["track"] = bool(updates["track"])
+        if config["track"] and config["detector"] != "yolo":
+            raise ValueError("tracking mode is only available for the yolo detector")
+        self.config = config
+
+    def _send(self, payload, frame=None):
+        """
+        Sends a JSON message, optionally followed by its binary frame. The reader and the worker thread both
+        reply on the socket, so sends are serialized and a result is never split from its frame.
+        """
+        with self._send_lock:
+            self.ws.send(json.dumps(payload))
+            if frame is not None:
+                self.ws.send(frame)
+
+    def _handle_text(self, message):
+        try:
+            data = json.loads(message)
+            if not isinstance(data, dict) or data.get("type") != "config":
+                raise ValueError("only config messages are accepted as text")
+            self.configure(data)
+        except (ValueError, TypeError) as e:
+            return {"type": "error", "seq": None, "error": str(e)}
+        return {"type": "config", **self.config}
+
+    def _process(self, seq, payload):
+        config = self.config
+        start = time.perf_counter()
+        try:
+            with stage("decode"):
+                frame = decode_bytes_to_frame(payload)
+        except (UnidentifiedImageError, OSError):
+            self._send({"type": "error", "seq": seq, "error": "frame is not a decodable image"})
+            return
+
+        jpeg_bytes = None
+        extra = {}
+        codec_ms = (time.perf_counter() - start) * 1000
+        try:
+            if config["track"]:
+                with self.stream.lock:
+                    gen_frame, tracks, detected = track_frame_gen(self.stream.tracker(), frame)
+                coords = [track["centroid"] for track in tracks]
+                extra = {"tracks": tracks, "detected": detected}
+            else:
+                session = self.stream.motion_gate() if config["detector"] in GATED_DETECTORS else None
+                if config["detector"] == "media":
+                    session = STREAMS.media_session(self.stream)
+                if config["output"] == "frame":
+                    gen_frame, coords = frame_gen(config["detector"], frame, session)
+                else:
+                    coords = detect(config["detector"], frame, session)
+            if config["output"] == "frame":
+                encode_start = time.perf_counter()
+                with stage("encode"):
+                    quality = config["quality"] or jpeg_quality()
+                    jpeg_bytes = encode_frame_to_bytes(gen_frame, format="JPEG", quality=quality)
+                codec_ms += (time.perf_counter() - encode_start) * 1000
+        finally:
+            # The next frame of this (or any other) stream decodes into the same shape
+            FRAME_POOL.release(frame)
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        if config["track"]:
+            with self.stream.lock:
+                self.stream.tracker().observe_frame(latency_ms)
+        QUALITY.observe(latency_ms - codec_ms)
+        img_w, img_h = frame_size(frame)
+        self.stream.record(config["detector"], coords, (img_w, img_h))
+        self.stream.observe(latency_ms)
+        binary = None if jpeg_bytes is None else SEQ_HEADER.pack(seq) + jpeg_bytes
+        self._send({
+            "type": "result",
+            "seq": seq,
+            "width": img_w,
+            "height": img_h,
+            "faces": coords,
+            "dropped": self.slot.dropped,
+            "latency_ms": round(latency_ms, 2),
+            **extra,
+        }, binary)
+        self.processed += 1
+
+    def _worker(self):
+        # Inference calls of this thread are queued under the connection's stream
+        with bind_stream(self.stream.key):
+            self._drain()
+
+    def _drain(self):
+        while True:
+            item = self.slot.get()
+            if item is None:
+                return
+            seq, payload = item
+            try:
+                self._process(seq, payload)
+            except ConnectionClosed:
+                return
+            except Exception as e:
+                METRICS.inc("errors_total", endpoint="vision.frame_stream", kind="exception")
+                try:
+                    self._send({"type": "error", "seq": seq, "error": str(e)})
+                except ConnectionClosed:
+                    return
+
+    def run(self):
+        """
+        Reads frames off the socket until the client disconnects. Inference runs on a separate worker thread
+        so that the reader keeps draining the socket (and replacing stale frames) while a frame is processed.
+        """
+        self.stream = STREAMS.attach(self.stream_id or f"ws-{next(_private_streams)}")
+        worker = threading.Thread(target=self._worker, name="stream-session", daemon=True)
+        worker.start()
+        ACTIVE_SESSIONS.add(self)
+        self._send({"type": "config", **self.config})
+        try:
+            while worker.is_alive():
+                message = self.ws.receive()
+                if message is None:
+                    continue
+                if isinstance(message, str):
+                    self._send(self._handle_text(message))
+                    continue
+                if len(message) <= SEQ_HEADER.size:
+                    self._send({"type": "error", "seq": None, "error": "binary frames need a 4-byte sequence header"})
+                    continue
+                (seq,) = SEQ_HEADER.unpack_from(message)
+                if self.last_seq is not None and seq <= self.last_seq:
+                    # Out-of-order or repeated frames are stale by definition
+                    self.slot.drop()
+                    continue
+                self.last_seq = seq
+                self.slot.put(seq, message[SEQ_HEADER.size:])
+        finally:
+            ACTIVE_SESSIONS.discard(self)
+            self.slot.close()
+            worker.join()
+            # A named stream keeps its state for the next connection until it is evicted
+            STREAMS.detach(self.stream, remove=self.stream_id is None)
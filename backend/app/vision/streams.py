@@ -0,0 +1,316 @@
+"""
+file: streams.py
+
+Contains the registry of the streams the server is processing. A stream is one continuous feed, a camera
+or a TV client, and is identified by its stream key:
+    - the <stream_id> of a /vision/streams/<stream_id>/... route, the X-Stream-Id header or a ?stream=
+      query argument (WebSockets cannot set headers);
+    - else the client address, or the calling thread outside of requests.
+Background threads working for a stream (WebSocket workers, the server camera) bind their key with
+bind_stream(), so everything they run, including the inference executor, sees the stream's key.
+
+Each StreamState holds what only makes sense for one feed, created on first use:
+    gate        the YOLO motion gate (yolo and cascade)
+    tracker     the YOLO face tracker of the /track routes and of tracking WebSocket sessions
+    media       the streaming Mediapipe session (media); opened only for streams named by the client,
+                since frames from different feeds behind one address would confuse its tracking
+    last        the last detections (detector, faces, frame size)
+    latency     frames processed and their mean / p95 end-to-end latency
+The registry evicts streams that have been idle for `idle_ttl` seconds and, once `max_streams` are
+known, the least recently used one. Streams with an open WebSocket are attached and never evicted.
+Mediapipe sessions are heavy (one landmarker each), so at most `max_media` are open: opening one more
+closes the session of the least recently used stream, which reopens it on its next media frame.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from flask import has_request_context, request
+
+from backend.app.utils.metrics import METRICS
+
+# Stream key bound to the current thread or context by bind_stream()
+CURRENT_STREAM = contextvars.ContextVar("stream_key", default=None)
+
+
+def stream_id():
+    """
+    Returns: the stream bound with bind_stream(), else the stream id the client named in the current
+             request, or None for anonymous callers
+    """
+    key = CURRENT_STREAM.get()
+    if key is not None or not has_request_context():
+        return key
+    return ((request.view_args or {}).get("stream_id") or request.headers.get("X-Stream-Id")
+            or request.args.get("stream"))
+
+
+def current_stream_key():
+    """
+    Stream key of the caller: its stream id, else the client address in a request, else the thread.
+    """
+    key = stream_id()
+    if key is not None:
+        return key
+    if has_request_context():
+        return request.remote_addr
+    return threading.get_ident()
+
+
+@contextmanager
+def bind_stream(key):
+    """
+    Makes `key` the current stream key for the duration of a with block.
+    """
+    token = CURRENT_STREAM.set(key)
+    try:
+        yield key
+    finally:
+        CURRENT_STREAM.reset(token)
+
+
+class StreamState:
+    def __init__(self, key, make_gate=None, make_tracker=None, window: int = 64):
+        """
+        Arguments:
+            key (str): stream key
+            make_gate: callable returning a new MotionGate, or None when the motion gate is off
+            make_tracker: callable returning a new FaceTracker
+            window (int): latest frames the latency figures are taken over
+        """
+        self.key = key
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.attached = 0  # open WebSocket sessions
+        self.frames = 0
+        self.last = None  # last detections
+        self.media = None  # MediapipeSession, managed by the registry
+        self.lock = threading.Lock()  # held while the stream's tracker runs
+        self._make_gate = make_gate
+        self._make_tracker = make_tracker
+        self._gate = None
+        self._tracker = None
+        self._latencies = deque(maxlen=max(1, int(window)))
+        self._state_lock = threading.Lock()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def motion_gate(self):
+        # Returns: the stream's MotionGate, or None when the motion gate is off
+        with self._state_lock:
+            if self._gate is None and self._make_gate is not None:
+                self._gate = self._make_gate()
+            return self._gate
+
+    def tracker(self):
+        # Returns: the stream's FaceTracker; hold self.lock while using it
+        with self._state_lock:
+            if self._tracker is None:
+                self._tracker = self._make_tracker()
+            return self._tracker
+
+    def record(self, detector, faces, size):
+        """
+        Keeps the detections of the stream's latest frame.
+
+        Arguments:
+            detector (str): detector the faces come from
+            faces (list): face centroids as [x, y]
+            size (tuple): (width, height) of the frame
+        """
+        self.last = {"detector": detector, "faces": faces, "width": size[0], "height": size[1],
+                     "at": time.monotonic()}
+
+    def observe(self, latency_ms):
+        # Arguments: latency_ms (end-to-end processing time of one frame of the stream)
+        with self._state_lock:
+            self.frames += 1
+            self._latencies.append(latency_ms)
+        self.touch()
+
+    def close(self):
+        """
+        Closes the stream's Mediapipe session. Idempotent.
+        """
+        media, self.media = self.media, None
+        if media is not None:
+            media.close()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._state_lock:
+            latencies = np.asarray(self._latencies) if self._latencies else None
+            gate, tracker = self._gate, self._tracker
+        media = self.media
+        last = None
+        if self.last is not None:
+            last = {k: v for k, v in self.last.items() if k != "at"}
+            last["age_s"] = round(now - self.last["at"], 1)
+        return {
+            "attached": self.attached,
+            "age_s": round(now - self.created, 1),
+            "idle_s": round(now - self.last_used, 1),
+            "frames": self.frames,
+            "mean_latency_ms": None if latencies is None else round(float(latencies.mean()), 2),
+            "p95_latency_ms": None if latencies is None else round(float(np.percentile(latencies, 95)), 2),
+            "last": last,
+            "motion": gate.stats() if gate is not None else None,
+            "tracker": tracker.stats() if tracker is not None else None,
+            "media": media.stats() if media is not None else None,
+        }
+
+
+class StreamRegistry:
+    def __init__(self, make_gate=None, make_tracker=None, open_media=None, max_streams: int = 64,
+                 idle_ttl: float = 30.0, max_media: int = 8):
+        """
+        Arguments:
+            make_gate: callable returning a new MotionGate, or None when the motion gate is off
+            make_tracker: callable returning a new FaceTracker
+            open_media: callable returning a new MediapipeSession, or None when streaming is unavailable
+            max_streams (int): streams remembered at once, evicted least recently used
+            idle_ttl (float): seconds without a frame after which a stream is evicted
+            max_media (int): Mediapipe sessions open at once
+        """
+        self.make_gate = make_gate
+        self.make_tracker = make_tracker
+        self.open_media = open_media
+        self.max_streams = max(1, int(max_streams))
+        self.idle_ttl = idle_ttl
+        self.max_media = max(1, int(max_media))
+        self.evicted = 0
+        self._streams = OrderedDict()  # stream key -> StreamState, least recently used first
+        self._lock = threading.Lock()
+        METRICS.gauge("streams", lambda: len(self._streams))
+        METRICS.gauge("media_sessions", lambda: sum(s.media is not None for s in list(self._streams.values())))
+
+    def _sweep(self, now, keep=None):
+        # Returns: the evicted streams; call with the lock held and close them after releasing it
+        detached = [key for key, state in self._streams.items() if not state.attached and key != keep]
+        evicted = [key for key in detached if now - self._streams[key].last_used > self.idle_ttl]
+        for key in detached:
+            if len(self._streams) - len(evicted) <= self.max_streams:
+                break
+            if key not in evicted:
+                evicted.append(key)
+        return [self._streams.pop(key) for key in evicted]
+
+    def _evict(self, states):
+        for state in states:
+            state.close()
+        if states:
+            self.evicted += len(states)
+            METRICS.inc("streams_evicted_total", len(states))
+
+    def get(self, key):
+        """
+        Returns: the StreamState of a stream key, created on first use
+        """
+        key = str(key)
+        with self._lock:
+            state = self._streams.get(key)
+            if state is None:
+                state = self._streams[key] = StreamState(key, self.make_gate, self.make_tracker)
+            self._streams.move_to_end(key)
+            state.touch()
+            evicted = self._sweep(time.monotonic(), keep=key)
+        self._evict(evicted)
+        return state
+
+    def peek(self, key):
+        """
+        Returns: the StreamState of a stream key, or None when it is not known
+        """
+        with self._lock:
+            return self._streams.get(str(key))
+
+    def attach(self, key):
+        """
+        Returns: the StreamState of a stream key, pinned until detach() (an open WebSocket session)
+        """
+        state = self.get(key)
+        with self._lock:
+            state.attached += 1
+            if self._streams.get(state.key) is not state:
+                # Evicted between get() and here
+                self._streams[state.key] = state
+        return state
+
+    def detach(self, state, remove=False):
+        """
+        Unpins a stream attached with attach(). With `remove`, the stream is dropped once nothing holds it.
+        """
+        with self._lock:
+            state.attached -= 1
+            state.touch()
+            if remove and not state.attached and self._streams.get(state.key) is state:
+                del self._streams[state.key]
+            else:
+                remove = False
+        if remove:
+            state.close()
+
+    def remove(self, key):
+        """
+        Drops a stream and closes its Mediapipe session. A stream sending more frames starts over.
+
+        Returns: whether the stream was known
+        """
+        with self._lock:
+            state = self._streams.pop(str(key), None)
+        if state is None:
+            return False
+        self._evict([state])
+        return True
+
+    def media_session(self, state):
+        """
+        Returns: the stream's MediapipeSession, opening it on first use, or None when streaming is unavailable
+        """
+        if state.media is not None or self.open_media is None:
+            return state.media
+
+        # Building a landmarker takes a while; do it outside the lock
+        session = self.open_media()
+        if session is None:
+            # The media backend has no landmarker to stream with (image mode, stub detector, worker processes)
+            return None
+        closing = []
+        with self._lock:
+            if state.media is not None:
+                closing.append(session)
+                session = state.media
+            else:
+                state.media = session
+                # Detached streams first, least recently used first
+                holders = sorted(
+                    (s for s in self._streams.values() if s.media is not None and s is not state),
+                    key=lambda s: (s.attached > 0, s.last_used),
+                )
+                while holders and len(holders) + 1 > self.max_media:
+                    holder = holders.pop(0)
+                    closing.append(holder.media)
+                    holder.media = None
+        for stale in closing:
+            stale.close()
+        return session
+
+    def stats(self):
+        with self._lock:
+            evicted = self._sweep(time.monotonic())
+            states = list(self._streams.values())
+        self._evict(evicted)
+        return {state.key: state.stats() for state in states}
+
+    def close(self):
+        with self._lock:
+            states = list(self._streams.values())
+            self._streams.clear()
+        for state in states:
+            state.close()
@@ -0,0 +1,56 @@
+"""
+file: stub.py
+
+Contains stand-in detectors used when DETECTOR_BACKEND=stub. They need no model weights, return
+deterministic faces and burn a configurable amount of CPU per frame, so a deployment's transport,
+encode and scheduling limits can be load tested without YOLO or Mediapipe.
+"""
+
+import time
+
+from backend.app.utils.frame_handler import frame_size
+from backend.app.vision.detectors import Detector
+
+
+def busy_wait(ms):
+    """
+    Spins for `ms` milliseconds. Unlike sleep this holds the CPU (and the GIL) like real inference does.
+    """
+    deadline = time.perf_counter() + ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+def stub_boxes(width, height, faces):
+    """
+    Places `faces` evenly spaced face boxes across the middle of the frame.
+
+    Returns: list of [x1, y1, x2, y2, confidence]
+    """
+    boxes = []
+    side = min(width / (faces + 1), height / 3) if faces else 0
+    for i in range(faces):
+        cx = width * (i + 1) / (faces + 1)
+        cy = height / 2
+        boxes.append([cx - side / 2, cy - side / 2, cx + side / 2, cy + side / 2, 0.9])
+    return boxes
+
+
+class StubDetector(Detector):
+    """
+    Detector returning stub_boxes() after busy-waiting for `latency_ms`.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 0.0, faces: int = 1):
+        self.latency_ms = latency_ms
+        self.faces = faces
+
+    def detect(self, frame, model_path=None, max_faces=None):
+        busy_wait(self.latency_ms)
+        faces = self.faces if max_faces is None else min(self.faces, max_faces)
+        return stub_boxes(*frame_size(frame), faces)
+
+    def boxes(self, output):
+        return output
@@ -0,0 +1,234 @@
+"""
+file: tracker.py
+
+Contains a lightweight face tracker used to skip full detections. The detector only runs every N frames
+(or sooner when track confidence drops); in between, each face box is moved along with a constant-velocity
+prediction. Detections are associated to existing tracks by IoU so every face keeps a stable ID and the
+filters drawn on top of it stop jittering.
+
+N adapts to the measured frame budget: if a detection plus the rest of the frame fits inside the budget the
+detector runs every frame, otherwise detections are spread out just enough to keep the average frame time
+within budget. The rest of the frame is what the server spends on it (decode, draw, encode), reported by the
+caller through observe_frame(); the time between frames is not used, since a client that sends few frames
+would otherwise look like a slow server.
+"""
+
+import itertools
+import math
+import time
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Computes the pairwise IoU between two sets of [x1, y1, x2, y2] boxes.
+
+    Arguments:
+        boxes_a (np.ndarray): (N, 4) boxes
+        boxes_b (np.ndarray): (M, 4) boxes
+
+    Returns: (N, M) IoU matrix
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    def __init__(self, track_id, box, confidence):
+        self.id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # per-frame change of [x1, y1, x2, y2]
+        self.confidence = float(confidence)
+        self.misses = 0
+        self.frames_since_detect = 0
+        self.predicted = False
+
+    def predict(self, decay):
+        self.box = self.box + self.velocity
+        self.confidence *= decay
+        self.frames_since_detect += 1
+        self.predicted = True
+
+    def correct(self, box, confidence, smoothing):
+        box = np.asarray(box, dtype=np.float32)
+        # box has already been moved forward by predict(), so undo that to measure the observed motion
+        steps = max(1, self.frames_since_detect)
+        observed = (box - (self.box - self.velocity * self.frames_since_detect)) / steps
+        self.velocity = smoothing * observed + (1.0 - smoothing) * self.velocity
+        self.box = box
+        self.confidence = float(confidence)
+        self.misses = 0
+        self.frames_since_detect = 0
+        self.predicted = False
+
+    def centroid(self):
+        x1, y1, x2, y2 = self.box.tolist()
+        return [(x1 + x2) / 2, (y1 + y2) / 2]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "box": [round(v, 2) for v in self.box.tolist()],
+            "centroid": [round(v, 2) for v in self.centroid()],
+            "confidence": round(self.confidence, 3),
+            "predicted": self.predicted,
+        }
+
+
+class FaceTracker:
+    def __init__(
+        self,
+        detect_fn,
+        frame_budget_ms: float = 1000 / 24,
+        min_interval: int = 1,
+        max_interval: int = 10,
+        iou_threshold: float = 0.3,
+        min_confidence: float = 0.4,
+        confidence_decay: float = 0.95,
+        max_misses: int = 2,
+        velocity_smoothing: float = 0.5,
+        clock=time.perf_counter,
+    ):
+        """
+        Arguments:
+            detect_fn: callable(frame) -> list of [x1, y1, x2, y2, confidence]
+            frame_budget_ms (float): target end-to-end time per frame (24 fps by default)
+            min_interval (int): smallest allowed detection interval N
+            max_interval (int): largest allowed detection interval N
+            iou_threshold (float): minimum IoU for a detection to continue a track
+            min_confidence (float): a detection is forced as soon as any track decays below this value
+            confidence_decay (float): per-frame confidence decay of predicted (undetected) tracks
+            max_misses (int): detections a track may go unmatched before it is dropped
+            velocity_smoothing (float): weight of the newest observed motion in the velocity estimate
+            clock: monotonic time source in seconds, injectable for testing
+        """
+        self.detect_fn = detect_fn
+        self.frame_budget_ms = frame_budget_ms
+        self.min_interval = max(1, int(min_interval))
+        self.max_interval = max(self.min_interval, int(max_interval))
+        self.iou_threshold = iou_threshold
+        self.min_confidence = min_confidence
+        self.confidence_decay = confidence_decay
+        self.max_misses = max_misses
+        self.velocity_smoothing = velocity_smoothing
+        self.clock = clock
+
+        self.tracks = []
+        self.interval = self.min_interval
+        self.frames_since_detect = None  # None forces a detection on the first frame
+        self.detect_ms = None    # EMA of the detector cost
+        self.overhead_ms = None  # EMA of the rest of the server-side frame time (decode, draw, encode, ...)
+        self._last_detect_cost = 0.0
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+        self.frames_since_detect = None
+
+    @staticmethod
+    def _ema(previous, sample, alpha=0.2):
+        return sample if previous is None else alpha * sample + (1.0 - alpha) * previous
+
+    def _adapt_interval(self):
+        if self.detect_ms is None:
+            return
+        slack = self.frame_budget_ms - (self.overhead_ms or 0.0)
+        if slack <= 0:
+            interval = self.max_interval
+        else:
+            interval = math.ceil(self.detect_ms / slack)
+        self.interval = max(self.min_interval, min(self.max_interval, interval))
+
+    def _should_detect(self):
+        if self.frames_since_detect is None or self.frames_since_detect + 1 >= self.interval:
+            return True
+        return any(track.confidence < self.min_confidence for track in self.tracks)
+
+    def _associate(self, detections):
+        boxes = np.asarray([d[:4] for d in detections], dtype=np.float32).reshape(-1, 4)
+        confidences = [float(d[4]) if len(d) > 4 else 1.0 for d in detections]
+
+        matched_tracks = set()
+        matched_dets = set()
+        if self.tracks and len(boxes):
+            ious = iou_matrix(np.stack([t.box for t in self.tracks]), boxes)
+            # Greedy association, best IoU first
+            for flat in np.argsort(-ious, axis=None):
+                ti, di = np.unravel_index(flat, ious.shape)
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                self.tracks[ti].correct(boxes[di], confidences[di], self.velocity_smoothing)
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for di in range(len(boxes)):
+            if di not in matched_dets:
+                survivors.append(Track(next(self._ids), boxes[di], confidences[di]))
+        self.tracks = survivors
+
+    def update(self, frame):
+        """
+        Advances the tracker by one frame, running the detector only when it is due.
+
+        Arguments:
+            frame: current frame, passed through to detect_fn
+
+        Returns: (list of track dicts, whether the detector ran on this frame)
+        """
+        for track in self.tracks:
+            track.predict(self.confidence_decay)
+
+        detected = self._should_detect()
+        if detected:
+            start = self.clock()
+            detections = self.detect_fn(frame)
+            self._last_detect_cost = (self.clock() - start) * 1000
+            self.detect_ms = self._ema(self.detect_ms, self._last_detect_cost)
+            self._associate(detections)
+            self.frames_since_detect = 0
+        else:
+            self._last_detect_cost = 0.0
+            self.frames_since_detect += 1
+        self._adapt_interval()
+
+        return [track.to_dict() for track in self.tracks], detected
+
+    def observe_frame(self, frame_ms):
+        """
+        Reports the server-side cost of the frame last passed to update(), from decoding it to encoding the
+        result, detector included. Everything but the detector's share is the overhead N is adapted to.
+
+        Arguments:
+            frame_ms (float): processing time of the frame in ms
+        """
+        overhead = frame_ms - self._last_detect_cost
+        self.overhead_ms = self._ema(self.overhead_ms, max(overhead, 0.0))
+        self._adapt_interval()
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "tracks": len(self.tracks),
+            "detect_ms": None if self.detect_ms is None else round(self.detect_ms, 2),
+            "overhead_ms": None if self.overhead_ms is None else round(self.overhead_ms, 2),
+            "frame_budget_ms": round(self.frame_budget_ms, 2),
+        }
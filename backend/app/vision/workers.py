@@ -0,0 +1,458 @@
+"""
+file: workers.py
+
+Contains the multi-process inference mode (WORKER_PROCESSES > 0). Torch and Mediapipe hold the GIL while
+they run, so one Flask process keeps a single core busy however many clients it serves. The WorkerPool
+starts N worker processes, each owning its own YOLO and Mediapipe detectors. The Flask process keeps
+decoding, drawing and encoding, and hands only the detection to the workers.
+
+Frames and results never go through pickle. Each worker owns a shared memory block with WORKER_SLOTS
+slots. A slot holds one frame of up to WORKER_MAX_FRAME pixels plus a small result table. Only
+(job id, slot, detector, shape) tuples travel over the worker's pipe. Frames larger than a slot fall back
+to being sent through the pipe, which is counted in worker_frames_pickled_total.
+
+Frames with the same stream key always go to the same worker. Each worker processes its jobs in order,
+so a camera's frames come back in the order they were sent. The key is the stream key of
+vision/streams.py: the client's stream id, its address, or the calling thread outside of requests.
+A worker that dies is restarted once RESTART_BACKOFF_S have passed since it was started, and the jobs it
+had in flight fail with WorkerCrashed. Until the restart, frames sent to it fail with WorkerCrashed too.
+
+Workers run the yolo and media detectors. The cascade detector's landmark stage stays in the Flask
+process: it runs on the YOLO boxes the workers return, with the Flask process's own landmarkers.
+
+Inside the Flask process the pool is used through RemoteDetector, which implements the Detector
+interface, so routes, batching and tracking work unchanged.
+"""
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from multiprocessing import connection
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backend.app.utils.metrics import METRICS
+from backend.app.vision.detectors import Detector
+from backend.app.vision.detectors import to_rgb_array
+from backend.app.vision.streams import current_stream_key
+
+MAX_FACES = 32        # rows of a slot's result table
+RESULT_COLUMNS = 7    # x1, y1, x2, y2, confidence, centroid x, centroid y
+RESULT_HEADER = 2     # face count, 1 if the centroids are integers
+RESTART_BACKOFF_S = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerCrashed(RuntimeError):
+    """Raised for the jobs a worker process had in flight when it died."""
+
+
+class WorkerPoolClosed(RuntimeError):
+    """Raised when a frame is submitted to a pool that has been shut down."""
+
+
+class RemoteResult:
+    __slots__ = ("boxes", "centroids")
+
+    def __init__(self, boxes, centroids):
+        self.boxes = boxes
+        self.centroids = centroids
+
+
+def _result_bytes():
+    return (RESULT_HEADER + MAX_FACES * RESULT_COLUMNS) * 4
+
+
+def _slot_views(shm, slot, slot_bytes, frame_bytes):
+    """
+    Returns: (uint8 frame buffer, float32 result table) views of a slot
+    """
+    offset = slot * slot_bytes
+    frame = np.ndarray((frame_bytes,), dtype=np.uint8, buffer=shm.buf, offset=offset)
+    result = np.ndarray(
+        (RESULT_HEADER + MAX_FACES * RESULT_COLUMNS,), dtype=np.float32, buffer=shm.buf, offset=offset + frame_bytes,
+    )
+    return frame, result
+
+
+def _worker_main(index, conn, shm_name, slots, frame_bytes, threads):
+    """
+    Worker process entry point: builds the detectors, then serves jobs from the pipe until told to stop.
+    """
+    # Must be set before torch is imported for it to size its thread pool
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    from backend.app.vision.factory import build_detector
+    from backend.app.vision.landmarker_pool import LandmarkerPool
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slot_bytes = frame_bytes + _result_bytes()
+    landmarkers = LandmarkerPool(size=1) # jobs run one at a time
+    try:
+        detectors = {}
+        for name in ("yolo", "media"):
+            detectors[name] = build_detector(name, landmarkers, threads=threads)
+            detectors[name].warmup(2)
+    except Exception as e:
+        conn.send(("failed", None, f"{type(e).__name__}: {e}"))
+        landmarkers.close()
+        shm.close()
+        return
+    conn.send(("ready", None, os.getpid()))
+
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            job_id, slot, detector, shape, payload = message
+            try:
+                frame_buf, result = _slot_views(shm, slot, slot_bytes, frame_bytes)
+                if payload is None:
+                    frame = frame_buf[:int(np.prod(shape))].reshape(shape)
+                else:
+                    frame = payload
+                det = detectors[detector]
+                output = det.detect(frame)
+                boxes = det.boxes(output)[:MAX_FACES]
+                centroids = det.centroids(output)[:MAX_FACES]
+
+                table = result[RESULT_HEADER:].reshape(MAX_FACES, RESULT_COLUMNS)
+                count = min(len(boxes), len(centroids)) if boxes else len(centroids)
+                for i in range(count):
+                    table[i, :5] = boxes[i] if boxes else 0
+                    table[i, 5:] = centroids[i]
+                result[0] = count
+                result[1] = 1 if centroids and isinstance(centroids[0][0], int) else 0
+                conn.send(("done", job_id, None))
+            except Exception as e:
+                logger.exception("Inference worker failed on a %s frame", detector)
+                conn.send(("error", job_id, f"{type(e).__name__}: {e}"))
+    finally:
+        for det in detectors.values():
+            det.close()
+        landmarkers.close()
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, index, slots, slot_bytes):
+        self.index = index
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.slots = slots
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.slot_cond = threading.Condition()
+        self.free_slots = list(range(slots))
+        self.inflight = {}  # job id -> (future, slot, submit time)
+        self.ready = threading.Event()
+        self.error = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.restart_at = None  # monotonic time a crashed worker is due to be restarted
+
+
+class WorkerPool:
+    def __init__(self, processes: int = 2, slots: int = 2, max_frame=(1920, 1080), threads: int = 1):
+        """
+        Arguments:
+            processes (int): number of worker processes
+            slots (int): frames each worker can have queued or in progress
+            max_frame (tuple): (width, height) of the largest frame passed through shared memory
+            threads (int): inference threads per worker (torch/ONNX Runtime intra-op threads)
+        """
+        self.processes = max(1, int(processes))
+        self.slot_count = max(1, int(slots))
+        self.frame_bytes = int(max_frame[0]) * int(max_frame[1]) * 3
+        self.slot_bytes = self.frame_bytes + _result_bytes()
+        self.threads = max(1, int(threads))
+        self._ctx = mp.get_context("spawn") # fork is unsafe with torch and the server's threads
+        self._job_ids = itertools.count()
+        self._closed = False
+        self._workers = [_Worker(i, self.slot_count, self.slot_bytes) for i in range(self.processes)]
+        for worker in self._workers:
+            self._spawn(worker)
+        self._collector = threading.Thread(target=self._collect, name="worker-pool", daemon=True)
+        self._collector.start()
+        METRICS.gauge("worker_processes_alive", lambda: sum(self._alive(w) for w in self._workers))
+
+    @staticmethod
+    def _alive(worker):
+        return worker.process is not None and worker.process.is_alive()
+
+    def _spawn(self, worker):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        worker.conn = parent_conn
+        worker.ready.clear()
+        worker.started_at = time.monotonic()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.index, child_conn, worker.shm.name, self.slot_count, self.frame_bytes, self.threads),
+            name=f"inference-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        child_conn.close()
+
+    def _route(self, key):
+        """
+        Picks the worker for a job: sticky per stream key, otherwise the least busy worker.
+        """
+        if key is not None:
+            return self._workers[zlib.crc32(str(key).encode()) % self.processes]
+        return min(self._workers, key=lambda w: len(w.inflight))
+
+    def submit(self, detector, frame, key=None, timeout=None):
+        """
+        Sends one frame to a worker.
+
+        Arguments:
+            detector (str): "yolo" or "media"
+            frame: PIL image or (H, W, 3) RGB numpy array
+            key: stream key; frames with the same key are processed in order by the same worker
+            timeout (float): seconds to wait for a free slot
+
+        Returns: Future resolved with a RemoteResult
+        """
+        if self._closed:
+            raise WorkerPoolClosed("worker pool has been closed")
+        worker = self._route(key)
+        rgb = to_rgb_array(frame)
+
+        with worker.slot_cond:
+            if not worker.slot_cond.wait_for(lambda: worker.free_slots or self._closed, timeout):
+                raise TimeoutError(f"no free slot on worker {worker.index}")
+            if self._closed:
+                raise WorkerPoolClosed("worker pool has been closed")
+            slot = worker.free_slots.pop()
+
+        payload = None
+        if rgb.nbytes <= self.frame_bytes:
+            frame_buf, _ = _slot_views(worker.shm, slot, self.slot_bytes, self.frame_bytes)
+            np.copyto(frame_buf[:rgb.nbytes].reshape(rgb.shape), rgb)
+        else:
+            payload = np.ascontiguousarray(rgb)
+            METRICS.inc("worker_frames_pickled_total")
+
+        job_id = next(self._job_ids)
+        future = Future()
+        worker.inflight[job_id] = (future, slot, time.perf_counter())
+        try:
+            with worker.send_lock:
+                worker.conn.send((job_id, slot, detector, rgb.shape, payload))
+        except (OSError, ValueError) as e:
+            self._finish(worker, job_id, error=WorkerCrashed(f"worker {worker.index} is unavailable: {e}"))
+        return future
+
+    def _finish(self, worker, job_id, error=None):
+        entry = worker.inflight.pop(job_id, None)
+        if entry is None:
+            return
+        future, slot, submitted = entry
+        if error is None:
+            _, result = _slot_views(worker.shm, slot, self.slot_bytes, self.frame_bytes)
+            count = int(result[0])
+            table = result[RESULT_HEADER:].reshape(MAX_FACES, RESULT_COLUMNS)[:count]
+            centroids = table[:, 5:].tolist()
+            if result[1]:
+                centroids = [[int(x), int(y)] for x, y in centroids]
+            outcome = RemoteResult(table[:, :5].tolist(), centroids)
+        with worker.slot_cond:
+            worker.free_slots.append(slot)
+            worker.slot_cond.notify()
+        METRICS.observe("worker_roundtrip_ms", (time.perf_counter() - submitted) * 1000, worker=worker.index)
+        if error is None:
+            future.set_result(outcome)
+        else:
+            future.set_exception(error)
+
+    def _handle_crash(self, worker):
+        """
+        Fails the jobs of a dead worker and schedules its restart. The collector restarts it once the
+        backoff has passed, so the other workers' results keep flowing meanwhile.
+        """
+        if self._closed or worker.restart_at is not None:
+            return
+        worker.process.join(timeout=0.1)
+        exitcode = worker.process.exitcode
+        logger.warning("Inference worker %d died (exit code %s), restarting", worker.index, exitcode)
+        for job_id in list(worker.inflight):
+            self._finish(worker, job_id, error=WorkerCrashed(f"worker {worker.index} died (exit code {exitcode})"))
+        worker.conn.close()
+        # Back off so a worker that crashes during startup does not spin
+        worker.restart_at = max(time.monotonic(), worker.started_at + RESTART_BACKOFF_S)
+
+    def _restart_due(self):
+        """
+        Restarts the crashed workers whose backoff has passed.
+
+        Returns: seconds until the next scheduled restart, or None when none is pending
+        """
+        now = time.monotonic()
+        pending = []
+        for worker in self._workers:
+            if worker.restart_at is None:
+                continue
+            if worker.restart_at > now:
+                pending.append(worker.restart_at - now)
+                continue
+            worker.restart_at = None
+            worker.restarts += 1
+            METRICS.inc("worker_restarts_total", worker=worker.index)
+            self._spawn(worker)
+        return min(pending) if pending else None
+
+    def _collect(self):
+        """
+        Collector thread: resolves finished jobs and restarts dead workers.
+        """
+        timeout = 0.5
+        while not self._closed:
+            conns = {w.conn: w for w in self._workers if w.conn is not None and not w.conn.closed}
+            if conns:
+                ready = connection.wait(list(conns), timeout=timeout)
+            else:
+                # Every worker is waiting for its restart
+                time.sleep(timeout)
+                ready = []
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    kind, job_id, detail = conn.recv()
+                except (EOFError, OSError):
+                    if not self._closed and worker.error is None:
+                        self._handle_crash(worker)
+                    continue
+                if kind == "done":
+                    self._finish(worker, job_id)
+                elif kind == "error":
+                    self._finish(worker, job_id, error=RuntimeError(f"worker {worker.index}: {detail}"))
+                elif kind == "ready":
+                    worker.error = None
+                    worker.ready.set()
+                elif kind == "failed":
+                    # Loading the models failed, which a restart would not fix
+                    worker.error = detail
+                    worker.ready.set()
+
+            for worker in self._workers:
+                if worker.error is None and worker.process is not None and not worker.process.is_alive():
+                    if not self._closed:
+                        self._handle_crash(worker)
+            if self._closed:
+                break
+            next_restart = self._restart_due()
+            timeout = 0.5 if next_restart is None else min(0.5, next_restart)
+
+    def wait_ready(self, timeout=None):
+        """
+        Blocks until every worker has loaded and warmed up its detectors.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not worker.ready.wait(remaining):
+                raise TimeoutError(f"worker {worker.index} is not ready")
+            if worker.error is not None:
+                raise RuntimeError(f"worker {worker.index} failed to load its detectors: {worker.error}")
+
+    def stats(self):
+        return [
+            {
+                "worker": w.index,
+                "pid": w.process.pid if w.process is not None else None,
+                "alive": self._alive(w),
+                "ready": w.ready.is_set() and w.error is None,
+                "inflight": len(w.inflight),
+                "restarts": w.restarts,
+                "error": w.error,
+            }
+            for w in self._workers
+        ]
+
+    def close(self, timeout: float = 2.0):
+        """
+        Stops the workers and frees the shared memory. Idempotent.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._workers:
+            with worker.slot_cond:
+                worker.slot_cond.notify_all()
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(timeout)
+            for job_id in list(worker.inflight):
+                self._finish(worker, job_id, error=WorkerPoolClosed("worker pool has been closed"))
+            worker.conn.close()
+            worker.shm.close()
+            worker.shm.unlink()
+
+
+class RemoteDetector(Detector):
+    """
+    Detector running in the worker pool. Its raw output is a RemoteResult.
+    """
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+
+    def detect(self, frame, model_path=None, max_faces=None):
+        return self.pool.submit(self.name, frame, key=current_stream_key()).result()
+
+    def detect_batch(self, frames):
+        # Spread a batch over the workers; results are still returned in the batch's order
+        futures = [self.pool.submit(self.name, frame) for frame in frames]
+        return [future.result() for future in futures]
+
+    def boxes(self, output):
+        return output.boxes
+
+    def centroids(self, output):
+        return output.centroids
+
+    def warmup(self, frames: int = 1, size=(640, 480)):
+        # Each worker warms up its own detectors before reporting ready
+        self.pool.wait_ready()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worker_pool(processes=2, slots=2, max_frame=(1920, 1080), threads=1):
+    """
+    Returns the shared worker pool, starting it on first use. The arguments only apply when it is started.
+    """
+    global _pool
+    if mp.parent_process() is not None:
+        raise RuntimeError("the worker pool can only be started from the server process")
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(processes, slots, max_frame, threads)
+    return _pool
+
+def stop_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
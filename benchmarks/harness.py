@@ -0,0 +1,202 @@
+"""
+file: harness.py
+
+Shared helpers for the benchmark scripts: latency measurement with percentiles, allocation counts,
+synthetic test frames, allocator pinning and baseline comparison.
+"""
+
+import ctypes
+import json
+import math
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+RESOLUTIONS = {
+    "480p": (854, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+# glibc mallopt() parameters
+M_TRIM_THRESHOLD = -1
+M_MMAP_THRESHOLD = -3
+
+
+def percentile(sorted_samples, q):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def measure(fn, iterations: int = 50, warmup: int = 3, setup=None):
+    """
+    Times fn() and summarizes its latency.
+
+    Arguments:
+        fn: callable under test; receives the value returned by setup() when setup is given
+        iterations (int): timed calls
+        warmup (int): untimed calls made first (lazy init, caches, allocator)
+        setup: optional callable run before every call, outside the timed region
+
+    Returns: dict with mean/p50/p95/p99 latency in ms and the resulting fps
+    """
+    for _ in range(warmup):
+        fn(setup()) if setup else fn()
+
+    samples = []
+    for _ in range(iterations):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    mean = sum(samples) / len(samples)
+    return {
+        "iterations": iterations,
+        "mean_ms": round(mean, 3),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "fps": round(1000 / mean, 2) if mean > 0 else None,
+    }
+
+
+def allocations(fn, iterations: int = 20, warmup: int = 3, counters=None):
+    """
+    Counts what fn() allocates per call.
+
+    Pillow allocates image memory outside of Python's allocator, so its buffers are counted from Pillow's
+    own statistics. numpy and OpenCV arrays are traced: their peak above the memory in use before the
+    call shows how many frame-sized arrays are alive at once.
+
+    Arguments:
+        fn: callable under test
+        iterations (int): measured calls
+        warmup (int): calls made first, so pools and caches are filled
+        counters: optional callable returning a dict of extra counters (e.g. buffer pool allocations);
+                  their per-call increase is reported too
+
+    Returns: dict with pil_buffers and array_peak_mb per call, plus one entry per extra counter
+    """
+    for _ in range(warmup):
+        fn()
+
+    def pil_buffers():
+        return Image.core.get_stats()["allocated_blocks"]
+
+    start_pil = pil_buffers()
+    start_counters = counters() if counters else {}
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    summary = {
+        "pil_buffers": round((pil_buffers() - start_pil) / iterations, 2),
+        "array_peak_mb": round(sum(peaks) / len(peaks) / 1e6, 2),
+    }
+    for name, value in (counters() if counters else {}).items():
+        summary[name] = round((value - start_counters[name]) / iterations, 2)
+    return summary
+
+
+def synthetic_frame(width: int, height: int, faces: int = 0, seed: int = 0):
+    """
+    Builds a reproducible RGB test frame: smooth noise background with `faces` skin-toned ellipses.
+
+    Returns: (PIL image, list of the ellipse centers as [x, y])
+    """
+    rng = np.random.default_rng(seed)
+    # Low-frequency noise compresses like a camera frame; white noise would make codec numbers meaningless
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    frame = np.array(Image.fromarray(small).resize((width, height), Image.BILINEAR))
+
+    centers = []
+    ys, xs = np.ogrid[0:height, 0:width]
+    radius = max(8, min(width, height) // 10)
+    for _ in range(faces):
+        cx = int(rng.integers(radius, max(radius + 1, width - radius)))
+        cy = int(rng.integers(radius, max(radius + 1, height - radius)))
+        mask = ((xs - cx) / (radius * 0.8)) ** 2 + ((ys - cy) / radius) ** 2 <= 1
+        frame[mask] = (224, 172, 140)
+        centers.append([cx, cy])
+
+    return Image.fromarray(frame), centers
+
+
+def pin_allocator(mmap_threshold: int = 32 << 20, trim_threshold: int = 128 << 20):
+    """
+    Fixes glibc's mmap and trim thresholds, which it otherwise raises as large blocks are freed. Whether a
+    1080p frame was a fresh mmap, page faulted on every touch, or reused heap then depended on the cases
+    run before it: `--groups draw` alone measured its 1080p cases about 3x slower than the full suite.
+    Pinned, every case sees the allocator in the steady state of a long-running server.
+
+    Returns: True when the thresholds were set, False when the C library is not glibc
+    """
+    try:
+        libc = ctypes.CDLL("libc.so.6")
+        mallopt = libc.mallopt
+    except (OSError, AttributeError):
+        return False
+    return bool(mallopt(M_MMAP_THRESHOLD, mmap_threshold)) and bool(mallopt(M_TRIM_THRESHOLD, trim_threshold))
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def compare(report, baseline, tolerance: float = 0.15, metric: str = "p50_ms"):
+    """
+    Compares a report against a baseline report. Cases the current run left out (other --groups or
+    --resolutions) are not compared; a case the baseline measured but the current run skipped or failed
+    counts as a regression, since it would otherwise hide a slowdown.
+
+    Arguments:
+        report (dict): current results, {"cases": {name: summary}}
+        baseline (dict): previous results in the same format
+        tolerance (float): allowed relative slowdown before a case counts as a regression
+        metric (str): summary field to compare
+
+    Returns: list of (case, baseline value, current value, relative change) for every regressed case; the
+             current value and change are None for cases that no longer run
+    """
+    cases = report["cases"]
+    skipped_groups = {name.split("/")[0] for name, current in cases.items() if name.endswith("/*")}
+    regressions = []
+    for name, previous in baseline.get("cases", {}).items():
+        before = previous.get(metric)
+        if previous.get("skipped") or not before:
+            continue
+        current = cases.get(name)
+        if current is None:
+            if name.split("/")[0] in skipped_groups:
+                regressions.append((name, before, None, None))
+            continue
+        after = current.get(metric)
+        if current.get("skipped") or after is None:
+            regressions.append((name, before, None, None))
+            continue
+        change = (after - before) / before
+        if change > tolerance:
+            regressions.append((name, before, after, change))
+    return regressions
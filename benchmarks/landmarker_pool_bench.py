@@ -0,0 +1,85 @@
+"""
+file: landmarker_pool_bench.py
+
+Compares per-request latency of the Mediapipe path before and after the landmarker pool:
+"fresh" builds a FaceLandmarker for every frame (the old media_get_coords behaviour) while
+"pooled" checks a prebuilt one out of a LandmarkerPool.
+
+Usage (from the repository root):
+    python -m benchmarks.landmarker_pool_bench --model ./models/media/face_landmarker.task
+"""
+
+import argparse
+import statistics
+import time
+
+import mediapipe as mp
+import numpy as np
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+from PIL import Image
+
+from backend.app.vision.landmarker_pool import LandmarkerPool
+
+
+def fresh_detect(mp_frame, model_path, max_faces):
+    base_options = python.BaseOptions(model_asset_path=model_path)
+    options = vision.FaceLandmarkerOptions(
+        base_options = base_options,
+        output_face_blendshapes = False,
+        num_faces = max_faces,
+        running_mode = vision.RunningMode.IMAGE
+    )
+    with vision.FaceLandmarker.create_from_options(options) as landmarker:
+        return landmarker.detect(mp_frame)
+
+
+def pooled_detect(pool, mp_frame, model_path, max_faces):
+    with pool.checkout(model_path, max_faces) as landmarker:
+        return landmarker.detect(mp_frame)
+
+
+def time_calls(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(name, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:>8}: mean {statistics.mean(samples):8.2f} ms | p50 {statistics.median(samples):8.2f} ms | p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="./models/media/face_landmarker.task")
+    parser.add_argument("--image", default="./assets/cat.jpg")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--max-faces", type=int, default=5)
+    args = parser.parse_args()
+
+    frame = Image.open(args.image).convert("RGB")
+    mp_frame = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.array(frame))
+
+    pool = LandmarkerPool(size=1)
+    start = time.perf_counter()
+    pool.warm(args.model, args.max_faces)
+    print(f"pool warmup: {(time.perf_counter() - start) * 1000:.2f} ms (paid once at startup)")
+
+    try:
+        fresh = time_calls(lambda: fresh_detect(mp_frame, args.model, args.max_faces), args.iterations)
+        pooled = time_calls(lambda: pooled_detect(pool, mp_frame, args.model, args.max_faces), args.iterations)
+    finally:
+        pool.close()
+
+    summarize("fresh", fresh)
+    summarize("pooled", pooled)
+    print(f"speedup: {statistics.mean(fresh) / statistics.mean(pooled):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+file: load_generator.py
+
+Concurrent load generator for the vision API. It replays a directory of frames or a video file against
+/vision/yolo or /vision/media (JSON/base-64 or raw JPEG transport) over pooled keep-alive connections and
+reports throughput, latency percentiles, dropped and errored frames, and the achieved fps.
+
+Two modes:
+    --rate R          open loop: a frame is due every 1/R s, like a camera. When all --concurrency workers
+                      are still busy the frame is dropped, which is how the server's saturation shows up.
+    (no --rate)       closed loop: --concurrency workers send back to back, measuring peak throughput.
+
+Start the server with DETECTOR_BACKEND=stub (and optionally STUB_LATENCY_MS) to test a deployment without
+model weights.
+
+Usage (from the repository root):
+    python -m benchmarks.load_generator --frames ./assets --detector yolo --transport raw --rate 24 --duration 20
+    python -m benchmarks.load_generator --frames clip.mp4 --detector media --concurrency 4 --count 500
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from benchmarks.harness import percentile
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def _encode_jpeg(pil_img, quality):
+    buffered = io.BytesIO()
+    pil_img.convert("RGB").save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+def load_frames(path, max_frames: int = 300, quality: int = 80, width: int = None):
+    """
+    Loads and JPEG-encodes the frames up front so that client-side encoding does not skew the results.
+
+    Arguments:
+        path (str): directory of images or a video file
+        max_frames (int): cap on the number of frames kept in memory
+        quality (int): JPEG quality used for the payloads
+        width (int): optional width to resize frames to, keeping the aspect ratio
+
+    Returns: list of JPEG bytes
+    """
+    images = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with Image.open(os.path.join(path, name)) as img:
+                    images.append(img.convert("RGB"))
+            if len(images) >= max_frames:
+                break
+    elif path.lower().endswith(IMAGE_EXTENSIONS):
+        with Image.open(path) as img:
+            images.append(img.convert("RGB"))
+    else:
+        import cv2
+
+        vid = cv2.VideoCapture(path)
+        while len(images) < max_frames:
+            ret, frame = vid.read()
+            if not ret:
+                break
+            images.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        vid.release()
+
+    if not images:
+        raise SystemExit(f"no frames found in {path}")
+
+    frames = []
+    for img in images:
+        if width and img.width != width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.BILINEAR)
+        frames.append(_encode_jpeg(img, quality))
+    return frames
+
+
+class LoadGenerator:
+    def __init__(self, url, frames, transport="raw", concurrency=4, timeout=30.0):
+        """
+        Arguments:
+            url (str): full route URL, e.g. http://localhost:8080/vision/yolo
+            frames (list): JPEG-encoded frames
+            transport (str): "raw" posts JPEG bytes to <url>/raw, "json" posts {'b64_input': ...} to <url>
+            concurrency (int): maximum requests in flight
+            timeout (float): per-request timeout in seconds
+        """
+        self.transport = transport
+        self.url = url.rstrip("/") + ("/raw" if transport == "raw" else "")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        if transport == "json":
+            self.payloads = [json.dumps({"b64_input": base64.b64encode(f).decode("utf-8")}) for f in frames]
+        else:
+            self.payloads = frames
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.latencies = []
+        self.statuses = Counter()
+        self.sent = 0
+        self.dropped = 0
+
+    def _send(self, idx):
+        payload = self.payloads[idx % len(self.payloads)]
+        headers = {"Content-Type": "application/json" if self.transport == "json" else "image/jpeg"}
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, data=payload, headers=headers, timeout=self.timeout)
+            # Reading the body is part of the round trip
+            _ = response.content
+            status = str(response.status_code)
+        except requests.exceptions.RequestException as e:
+            status = type(e).__name__
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._in_flight -= 1
+            self.statuses[status] += 1
+            if status == "200":
+                self.latencies.append(elapsed_ms)
+
+    def _try_acquire(self):
+        with self._lock:
+            if self._in_flight >= self.concurrency:
+                return False
+            self._in_flight += 1
+            self.sent += 1
+            return True
+
+    def run_rate(self, rate, duration=None, count=None):
+        """
+        Open-loop mode: schedules one frame every 1/rate s and drops it if no worker is free.
+        """
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            idx = 0
+            while True:
+                due = start + idx * interval
+                if duration is not None and due - start >= duration:
+                    break
+                if count is not None and idx >= count:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if self._try_acquire():
+                    pool.submit(self._send, idx)
+                else:
+                    self.dropped += 1
+                idx += 1
+        return time.perf_counter() - start
+
+    def run_closed(self, duration=None, count=None):
+        """
+        Closed-loop mode: every worker sends the next frame as soon as its previous response arrives.
+        """
+        counter = iter(range(count if count is not None else 1 << 62))
+        counter_lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = None if duration is None else start + duration
+
+        def worker():
+            while deadline is None or time.perf_counter() < deadline:
+                with counter_lock:
+                    idx = next(counter, None)
+                if idx is None:
+                    return
+                with self._lock:
+                    self._in_flight += 1
+                    self.sent += 1
+                self._send(idx)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, elapsed, target_rate=None):
+        latencies = sorted(self.latencies)
+        ok = self.statuses.get("200", 0)
+        errors = sum(n for status, n in self.statuses.items() if status != "200")
+        scheduled = self.sent + self.dropped
+        return {
+            "url": self.url,
+            "elapsed_s": round(elapsed, 3),
+            "concurrency": self.concurrency,
+            "target_fps": target_rate,
+            "scheduled": scheduled,
+            "sent": self.sent,
+            "ok": ok,
+            "errors": errors,
+            "dropped": self.dropped,
+            "statuses": dict(self.statuses),
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else None,
+            "achieved_fps": round(ok / elapsed, 2) if elapsed else None,
+            "drop_rate": round(self.dropped / scheduled, 4) if scheduled else None,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                "p50": round(percentile(latencies, 50), 2) if latencies else None,
+                "p95": round(percentile(latencies, 95), 2) if latencies else None,
+                "p99": round(percentile(latencies, 99), 2) if latencies else None,
+                "max": round(latencies[-1], 2) if latencies else None,
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080", help="server base URL")
+    parser.add_argument("--detector", choices=("yolo", "media", "cascade"), default="yolo")
+    parser.add_argument("--transport", choices=("raw", "json"), default="raw")
+    parser.add_argument("--frames", default="./assets", help="directory of images, an image or a video file")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--width", type=int, help="resize frames to this width before sending")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of the replayed frames")
+    parser.add_argument("--rate", type=float, help="target frames per second (open loop)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, help="seconds to run")
+    parser.add_argument("--count", type=int, help="frames to schedule")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.duration is None and args.count is None:
+        args.duration = 10.0
+
+    frames = load_frames(args.frames, args.max_frames, args.quality, args.width)
+    url = f"{args.url.rstrip('/')}/vision/{args.detector}"
+    generator = LoadGenerator(url, frames, args.transport, args.concurrency, args.timeout)
+    mode = f"{args.rate} fps open loop" if args.rate else "closed loop"
+    print(f"-> {len(frames)} frame(s), {mode}, concurrency {args.concurrency}, {generator.url}")
+
+    if args.rate:
+        elapsed = generator.run_rate(args.rate, args.duration, args.count)
+    else:
+        elapsed = generator.run_closed(args.duration, args.count)
+
+    report = generator.report(elapsed, args.rate)
+    lat = report["latency_ms"]
+    print(f"<- {report['ok']} ok, {report['errors']} errors, {report['dropped']} dropped in {report['elapsed_s']} s")
+    print(f"   achieved {report['achieved_fps']} fps (target {args.rate or 'max'})")
+    print(f"   latency p50 {lat['p50']} ms | p95 {lat['p95']} ms | p99 {lat['p99']} ms | max {lat['max']} ms")
+    if report["errors"]:
+        print(f"   statuses: {report['statuses']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
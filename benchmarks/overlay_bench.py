@@ -0,0 +1,77 @@
+"""
+file: overlay_bench.py
+
+Micro-benchmark of the sprite overlay: cost of stamping the filter on a 720p frame as the number of faces
+grows. The in-place numpy blend (SpriteOverlay) is compared with per-face PIL alpha compositing, and
+with the draw_circle placeholder it replaces.
+
+Usage (from the repository root):
+    python -m benchmarks.overlay_bench --faces 1 2 5 10 20
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from backend.app.vision.overlay import SpriteOverlay, ring_sprite
+
+
+def pil_composite(frame, sprite_img, coords, size):
+    scaled = sprite_img.resize((size, size))
+    base = frame.convert("RGBA")
+    for x, y in coords:
+        base.alpha_composite(scaled, (int(x - size / 2), int(y - size / 2)))
+    return base.convert("RGB")
+
+
+def pil_circles(frame, coords, size):
+    draw = ImageDraw.Draw(frame)
+    r = size / 2
+    for x, y in coords:
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=None, outline="red", width=10)
+    return frame
+
+
+def time_ms(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    parser.add_argument("--size", type=int, default=200, help="stamp width in pixels")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    np_frame = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    pil_frame = Image.fromarray(np_frame)
+    sprite = ring_sprite()
+    sprite_img = Image.fromarray(sprite, "RGBA")
+    overlay = SpriteOverlay(sprite)
+
+    print(f"{args.width}x{args.height}, {args.size}px stamps, median of {args.iterations} runs")
+    print(f"{'faces':>5} | {'numpy blend':>12} | {'PIL composite':>14} | {'draw_circle':>12}")
+    for faces in args.faces:
+        # Spread the faces over the frame, including some that cross the edges
+        coords = rng.uniform([-args.size / 4, -args.size / 4], [args.width, args.height], (faces, 2)).tolist()
+        work = np_frame.copy()
+        blend_ms = time_ms(lambda: overlay.stamp(work, coords, args.size), args.iterations)
+        composite_ms = time_ms(lambda: pil_composite(pil_frame, sprite_img, coords, args.size), args.iterations)
+        circle_ms = time_ms(lambda: pil_circles(pil_frame.copy(), coords, args.size), args.iterations)
+        print(f"{faces:>5} | {blend_ms:>9.3f} ms | {composite_ms:>11.3f} ms | {circle_ms:>9.3f} ms")
+    print(f"sprite cache: {overlay.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+file: suite.py
+
+Headless benchmark suite for the vision pipeline. It times the pipeline pieces directly (pillow codecs and
+every installed backend of the codec layer per format, including reduced JPEG decodes,
+yolo_extract_faces/yolo_get_coords, media_get_coords, draw_circle and the sprite overlay), the frame path
+without detection (decode, draw, encode) through Pillow images and through pooled numpy frames, and end to
+end through the Flask app's test client, on assets/cat.jpg and on synthetic frames at 480p, 720p and 1080p
+with several face counts.
+
+The HTTP cases post the same frame on every call. They start each call from a fresh stream, with the frame
+cache emptied and the motion gate reset, so they time a full decode, detection, draw and encode. The
+`_cached` cases repeat the frame on a warm stream and time what a still scene costs (frame cache hits).
+
+Every case reports mean/p50/p95/p99 latency and fps. The frame cases also report what a frame allocates:
+Pillow image buffers, the peak of live numpy/OpenCV arrays and the frame pool's fresh buffers. The report can be saved as a JSON baseline and later
+runs compared against it; the script exits with status 1 when a case regressed beyond the tolerance or a
+case the baseline measured no longer runs.
+
+benchmarks/baseline.json is the reference report; its "meta" block describes the machine it was taken on.
+Absolute numbers only compare on similar hardware, so regenerate it with --output (and --note) when the
+reference machine changes.
+
+Usage (from the repository root):
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --groups codec draw --baseline benchmarks/baseline.json --tolerance 0.15
+    python -m benchmarks.suite --output benchmarks/baseline.json --note "CI runner, 4 vCPU"
+"""
+
+import argparse
+import base64
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.harness import RESOLUTIONS
+from benchmarks.harness import allocations
+from benchmarks.harness import compare
+from benchmarks.harness import load_baseline
+from benchmarks.harness import measure
+from benchmarks.harness import pin_allocator
+from benchmarks.harness import save_report
+from benchmarks.harness import synthetic_frame
+
+GROUPS = ("codec", "draw", "frame", "detect", "http")
+ALLOCATION_GROUPS = ("frame",)  # groups whose cases also count their allocations
+CAT_IMAGE = "./assets/cat.jpg"
+
+
+def cat_frame(resolution):
+    with Image.open(CAT_IMAGE) as img:
+        return img.convert("RGB").resize(RESOLUTIONS[resolution], Image.BILINEAR)
+
+
+def codec_cases(args):
+    from backend.app.utils.codec import CODECS
+    from backend.app.utils.pillow_handler import decode_base64_to_pillow
+    from backend.app.utils.pillow_handler import decode_bytes_to_pillow
+    from backend.app.utils.pillow_handler import encode_pillow_to_base64
+    from backend.app.utils.pillow_handler import encode_pillow_to_bytes
+
+    for res in args.resolutions:
+        frame, _ = synthetic_frame(*RESOLUTIONS[res], faces=2)
+        png_b64 = encode_pillow_to_base64(frame)
+        jpeg = encode_pillow_to_bytes(frame, format="JPEG", quality=80)
+
+        # Cases are built up front and run later, so loop variables are bound as defaults
+        yield f"codec/png_b64_encode/{res}", lambda frame=frame: encode_pillow_to_base64(frame)
+        yield f"codec/png_b64_decode/{res}", lambda data=png_b64: decode_base64_to_pillow(data).load()
+        yield (f"codec/jpeg_encode/{res}",
+               lambda frame=frame: encode_pillow_to_bytes(frame, format="JPEG", quality=80))
+        yield f"codec/jpeg_decode/{res}", lambda data=jpeg: decode_bytes_to_pillow(data).load()
+
+        # Every installed backend of the codec layer, per format; JPEG also at its DCT-reduced decode sizes
+        array = np.array(frame)
+        for name, codec in CODECS.backends.items():
+            for format in codec.formats:
+                data = codec.encode(array, format, 80)
+                fmt = format.lower()
+                yield (f"codec/{name}/{fmt}_encode/{res}",
+                       lambda codec=codec, format=format, array=array: codec.encode(array, format, 80))
+                yield f"codec/{name}/{fmt}_decode/{res}", lambda codec=codec, data=data: codec.decode(data)
+                if format == "JPEG":
+                    for reduction in (2, 4):
+                        yield (f"codec/{name}/jpeg_decode_1_{reduction}/{res}",
+                               lambda codec=codec, data=data, reduction=reduction: codec.decode(data, reduction))
+
+
+def draw_cases(args):
+    from backend.app.vision.inference import draw_circle
+    from backend.app.vision.pipeline import OVERLAY
+    from backend.app.vision.overlay import draw_overlay
+
+    for res in args.resolutions:
+        for faces in args.faces:
+            frame, centers = synthetic_frame(*RESOLUTIONS[res], faces=faces)
+            size = RESOLUTIONS[res][1] // 5
+            # Drawing mutates the frame, so every call gets a fresh copy made outside the timed region
+            yield (f"draw/draw_circle/{res}/{faces}faces",
+                   lambda img, centers=centers, size=size: draw_circle(centers, size // 2, img), frame.copy)
+            yield (f"draw/overlay/{res}/{faces}faces",
+                   lambda img, centers=centers, size=size: draw_overlay(OVERLAY, centers, size, img), frame.copy)
+
+
+def frame_cases(args):
+    from backend.app.utils.codec import decode_bytes_to_frame
+    from backend.app.utils.codec import encode_frame_to_bytes
+    from backend.app.utils.frame_handler import FRAME_POOL
+    from backend.app.utils.pillow_handler import decode_bytes_to_pillow
+    from backend.app.utils.pillow_handler import encode_pillow_to_bytes
+    from backend.app.vision.overlay import draw_overlay
+    from backend.app.vision.pipeline import OVERLAY
+
+    for res in args.resolutions:
+        frame, centers = synthetic_frame(*RESOLUTIONS[res], faces=2)
+        jpeg = encode_pillow_to_bytes(frame, format="JPEG", quality=80)
+        size = RESOLUTIONS[res][1] // 5
+
+        def pillow_path(jpeg=jpeg, centers=centers, size=size):
+            img = decode_bytes_to_pillow(jpeg).convert("RGB")
+            return encode_pillow_to_bytes(draw_overlay(OVERLAY, centers, size, img), format="JPEG", quality=80)
+
+        def numpy_path(jpeg=jpeg, centers=centers, size=size):
+            frame = decode_bytes_to_frame(jpeg)
+            try:
+                return encode_frame_to_bytes(draw_overlay(OVERLAY, centers, size, frame), format="JPEG", quality=80)
+            finally:
+                FRAME_POOL.release(frame)
+
+        yield f"frame/pillow/{res}", pillow_path
+        yield f"frame/numpy/{res}", numpy_path
+
+
+def frame_counters():
+    from backend.app.utils.frame_handler import FRAME_POOL
+    return {"pool_allocations": FRAME_POOL.allocations}
+
+
+def detect_cases(args):
+    from backend.app.vision.inference import media_get_coords
+    from backend.app.vision.inference import yolo_extract_faces
+    from backend.app.vision.inference import yolo_get_coords
+
+    for res in args.resolutions:
+        frame = cat_frame(res)
+        yield f"detect/yolo/{res}", lambda frame=frame: yolo_get_coords(yolo_extract_faces(frame))
+        yield f"detect/media/{res}", lambda frame=frame: media_get_coords(frame)
+
+
+def http_cases(args):
+    from backend.app import create_app
+    from backend.app.utils.pillow_handler import encode_pillow_to_bytes
+    from backend.app.vision import routes
+    from backend.app.vision.pipeline import STREAMS
+
+    client = create_app().test_client()
+    environ = {"REMOTE_ADDR": "benchmark"}  # stream key of the benchmark's requests
+
+    def fresh_stream():
+        # Forgets what the previous call left behind, outside the timed region
+        if routes.FRAME_CACHE is not None:
+            routes.FRAME_CACHE.clear()
+        STREAMS.remove(environ["REMOTE_ADDR"])
+
+    for res in args.resolutions:
+        frame = cat_frame(res)
+        jpeg = encode_pillow_to_bytes(frame, format="JPEG", quality=80)
+        payload = {"b64_input": base64.b64encode(jpeg).decode("utf-8")}
+
+        for detector in ("yolo", "media", "cascade"):
+            def post_json(_=None, detector=detector, payload=payload):
+                response = client.post(f"/vision/{detector}", json=payload, environ_base=environ)
+                assert response.status_code == 200, response.status_code
+
+            def post_raw(_=None, detector=detector, jpeg=jpeg):
+                response = client.post(f"/vision/{detector}/raw", data=jpeg, content_type="image/jpeg",
+                                       environ_base=environ)
+                assert response.status_code == 200, response.status_code
+
+            yield f"http/{detector}_json/{res}", post_json, fresh_stream
+            yield f"http/{detector}_raw/{res}", post_raw, fresh_stream
+            yield f"http/{detector}_json_cached/{res}", post_json
+            yield f"http/{detector}_raw_cached/{res}", post_raw
+
+
+CASE_BUILDERS = {
+    "codec": codec_cases,
+    "draw": draw_cases,
+    "frame": frame_cases,
+    "detect": detect_cases,
+    "http": http_cases,
+}
+
+
+def run(args):
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor() or None,
+            "cpus": os.cpu_count(),
+            "detector_backend": os.getenv("DETECTOR_BACKEND", "ultralytics"),
+            "iterations": args.iterations,
+            "allocator_pinned": args.allocator_pinned,
+            "note": args.note,
+        },
+        "cases": {},
+    }
+
+    for group in args.groups:
+        try:
+            cases = list(CASE_BUILDERS[group](args))
+        except Exception as e:
+            # Missing model weights or optional packages only skip their own group
+            print(f"{group:<8} skipped: {e}")
+            report["cases"][f"{group}/*"] = {"skipped": str(e)}
+            continue
+
+        for case in cases:
+            name, fn = case[0], case[1]
+            setup = case[2] if len(case) > 2 else None
+            try:
+                summary = measure(fn, iterations=args.iterations, warmup=args.warmup, setup=setup)
+            except Exception as e:
+                print(f"{name:<40} failed: {e}")
+                report["cases"][name] = {"skipped": str(e)}
+                continue
+            report["cases"][name] = summary
+            print(f"{name:<40} p50 {summary['p50_ms']:9.3f} ms | p95 {summary['p95_ms']:9.3f} ms | "
+                  f"p99 {summary['p99_ms']:9.3f} ms | {summary['fps']:8.2f} fps")
+            if group in ALLOCATION_GROUPS:
+                counted = allocations(fn, counters=frame_counters)
+                summary.update(counted)
+                print(f"{'':<40} per frame: {counted['pil_buffers']:.2f} Pillow buffers | "
+                      f"{counted['array_peak_mb']:.2f} MB arrays | {counted['pool_allocations']:.2f} pool allocations")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--faces", type=int, nargs="+", default=[0, 1, 5, 10])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report to this path")
+    parser.add_argument("--baseline", help="compare against a previously saved JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative p50 slowdown")
+    parser.add_argument("--note", help="free-text description of the machine, stored in the report")
+    args = parser.parse_args()
+
+    # Before the first frame is allocated, so no case depends on the ones that ran before it
+    args.allocator_pinned = pin_allocator()
+    report = run(args)
+    if args.output:
+        save_report(report, args.output)
+        print(f"report written to {args.output}")
+
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        meta = baseline.get("meta", {})
+        if meta.get("detector_backend") != report["meta"]["detector_backend"]:
+            print(f"\nwarning: the baseline was taken with DETECTOR_BACKEND={meta.get('detector_backend')}, "
+                  f"this run uses {report['meta']['detector_backend']}")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for name, before, after, change in regressions:
+                if after is None:
+                    print(f"  {name:<40} {before:9.3f} ms -> did not run")
+                else:
+                    print(f"  {name:<40} {before:9.3f} ms -> {after:9.3f} ms ({change:+.0%})")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from backend.app import create_app
 from backend.app.utils.env_helper import EnvVars
+from backend.app.vision.capture import stop_capture
+from backend.app.vision.inference import LANDMARKER_POOL
+from backend.app.vision.workers import stop_worker_pool
 from flask_cors import CORS
 
 envs = EnvVars()
@@ -7,4 +10,9 @@ app = create_app()
 CORS(app)
 
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=envs.API_PORT)
+    try:
+        app.run(debug=True, host='0.0.0.0', port=envs.API_PORT)
+    finally:
+        stop_capture()
+        LANDMARKER_POOL.close()
+        stop_worker_pool()
@@ -0,0 +1,69 @@
+"""
+file: serve.py
+
+Production entry point. Serves the app with gunicorn's threaded worker (gthread) instead of the Werkzeug
+development server used by run_backend.py, which runs with the debugger and reloader on. Each request
+(and each /vision/stream WebSocket) runs on its own thread. Detector calls go through the bounded inference
+executor, so slow frames cannot take every thread away from health checks and the other clients.
+
+Every gunicorn worker process loads its own models, so keep SERVER_WORKERS at 1 on the Pi and scale
+with SERVER_THREADS and INFER_CONCURRENCY (or WORKER_PROCESSES for multi-process inference).
+
+Usage (from the repository root):
+    python serve.py
+"""
+
+from gunicorn.app.base import BaseApplication
+
+from backend.app.utils.env_helper import EnvVars
+
+envs = EnvVars()
+
+
+def _worker_exit(server, worker):
+    # Release the live outputs, the camera, the landmarkers and the inference workers owned by this server process
+    from backend.app.vision.capture import stop_capture
+    from backend.app.vision.inference import LANDMARKER_POOL
+    from backend.app.vision.routes import LIVE_OUTPUTS
+    from backend.app.vision.workers import stop_worker_pool
+
+    LIVE_OUTPUTS.close()
+    stop_capture()
+    LANDMARKER_POOL.close()
+    stop_worker_pool()
+
+
+class FilterServer(BaseApplication):
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from flask_cors import CORS
+        from backend.app import create_app
+
+        app = create_app()
+        CORS(app)
+        return app
+
+
+def server_options():
+    return {
+        "bind": f"{envs.SERVER_HOST}:{envs.API_PORT}",
+        "workers": envs.SERVER_WORKERS,
+        "worker_class": "gthread",
+        "threads": envs.SERVER_THREADS,
+        "timeout": envs.SERVER_TIMEOUT,
+        "graceful_timeout": 10,
+        "keepalive": 5,
+        "worker_exit": _worker_exit,
+        "accesslog": None,
+    }
+
+
+if __name__ == "__main__":
+    FilterServer(server_options()).run()
@@ -0,0 +1,124 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# The route tests run on the weightless stub detectors; set before the app's modules read their configuration
+os.environ.setdefault("DETECTOR_BACKEND", "stub")
+
+from backend.app import create_app
+from backend.app.vision import landmarker_pool
+from backend.app.vision import media_session
+from backend.app.vision import routes
+from backend.app.vision.landmarks import MESH_SIZE
+
+
+class FakeClock:
+    """Monotonic clock in seconds that only moves when the test advances it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms / 1000
+
+
+class FakeDetector:
+    """Box detector returning scripted detections and advancing the fake clock by its cost."""
+
+    def __init__(self, clock, cost_ms=0.0, detections=()):
+        self.clock = clock
+        self.cost_ms = cost_ms
+        self.detections = list(detections)
+        self.calls = 0
+
+    def __call__(self, frame):
+        self.calls += 1
+        self.clock.advance(self.cost_ms)
+        return [list(d) for d in self.detections]
+
+
+class FakeLandmarker:
+    """
+    Stands in for a Mediapipe FaceLandmarker. detect() returns the scripted `faces` (lists of landmarks in
+    normalized image coordinates); detect_async() only records the timestamp and the test delivers the
+    result with finish().
+    """
+
+    def __init__(self, key, callback=None):
+        self.key = key
+        self.callback = callback
+        self.faces = []
+        self.images = []
+        self.submitted = []
+        self.closed = False
+
+    def detect(self, image):
+        self.images.append(image)
+        return SimpleNamespace(face_landmarks=self.faces)
+
+    def detect_async(self, image, timestamp_ms):
+        self.submitted.append(timestamp_ms)
+
+    def finish(self, timestamp_ms, faces=1, x=0.5, y=0.5):
+        face = [SimpleNamespace(x=x, y=y)] * MESH_SIZE
+        self.callback(SimpleNamespace(face_landmarks=[face] * faces), None, timestamp_ms)
+
+    def close(self):
+        self.closed = True
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fake_detector(clock):
+    return FakeDetector(clock)
+
+
+@pytest.fixture
+def wait_until():
+    # Polls predicate() until it holds; fails the test after `timeout` seconds
+    return _wait_until
+
+
+@pytest.fixture
+def fake_landmarkers(monkeypatch):
+    """
+    Makes the landmarker pool and the Mediapipe sessions build FakeLandmarkers. Returns the list of the
+    landmarkers built so far.
+    """
+    built = []
+    def build(model_path, max_faces=5, running_mode=None, result_callback=None):
+        built.append(FakeLandmarker((model_path, max_faces, running_mode), result_callback))
+        return built[-1]
+    monkeypatch.setattr(landmarker_pool, "build_landmarker", build)
+    monkeypatch.setattr(media_session, "build_landmarker", build)
+    return built
+
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    # Every test starts from an empty frame cache and no streams
+    routes.FRAME_CACHE.clear()
+    for key in list(routes.STREAMS._streams):
+        routes.STREAMS.remove(key)
+    return app.test_client()
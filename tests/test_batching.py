@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from backend.app.vision.batching import BatchScheduler
+from backend.app.vision.batching import SchedulerClosed
+
+
+def test_concurrent_frames_run_as_one_batch_in_submission_order():
+    batches = []
+    def run_batch(items):
+        batches.append(items)
+        return [item * 10 for item in items]
+    # A wait far longer than the test: only a full batch closes it
+    scheduler = BatchScheduler(run_batch, max_batch=3, max_wait_ms=10_000)
+
+    futures = [scheduler.submit(item) for item in (1, 2, 3)]
+    assert [future.result(2) for future in futures] == [10, 20, 30]
+    assert batches == [[1, 2, 3]]
+    scheduler.close()
+
+
+def test_a_lone_frame_runs_after_max_wait():
+    scheduler = BatchScheduler(lambda items: items, max_batch=4, max_wait_ms=1)
+    assert scheduler(7, timeout=2) == 7
+    scheduler.close()
+
+
+def test_frames_queued_behind_a_running_batch_form_the_next_one():
+    release = threading.Event()
+    batches = []
+    def run_batch(items):
+        batches.append(items)
+        release.wait(2)
+        return items
+    scheduler = BatchScheduler(run_batch, max_batch=2, max_wait_ms=10_000)
+
+    futures = [scheduler.submit(item) for item in range(5)]
+    release.set()
+    assert [future.result(2) for future in futures[:4]] == [0, 1, 2, 3]
+    assert batches[:2] == [[0, 1], [2, 3]]
+    # The last frame waits for a partner until the scheduler closes
+    scheduler.close()
+    with pytest.raises(SchedulerClosed):
+        futures[4].result(2)
+    with pytest.raises(SchedulerClosed):
+        scheduler.submit(5)
+
+
+def test_a_failing_batch_fails_every_frame_of_it():
+    def run_batch(items):
+        raise ValueError("bad frame")
+    scheduler = BatchScheduler(run_batch, max_batch=2, max_wait_ms=10_000)
+
+    futures = [scheduler.submit(item) for item in (1, 2)]
+    for future in futures:
+        with pytest.raises(ValueError, match="bad frame"):
+            future.result(2)
+    scheduler.close()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from backend.app.vision import capture
+from backend.app.vision.capture import CaptureThread
+from backend.app.vision.capture import FrameRing
+from backend.app.vision.capture import SyntheticSource
+
+
+class FailingSource:
+    def __init__(self):
+        self.opens = 0
+
+    def open(self):
+        self.opens += 1
+        raise RuntimeError("no camera")
+
+    def release(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_shared_capture():
+    capture.stop_capture()
+    yield
+    capture.stop_capture()
+
+
+def test_ring_latest_is_newest_commit():
+    ring = FrameRing((2, 2, 3), slots=3)
+    assert ring.latest() is None
+    for value in range(5):
+        seq, slot = ring.write_slot()
+        assert seq == value
+        slot[...] = value
+        ring.commit(seq, timestamp=float(value))
+
+    seq, frame, stamp = ring.latest()
+    assert (seq, stamp) == (4, 4.0)
+    assert np.all(frame == 4)
+    assert not frame.flags.writeable
+    # The write slot never aliases the newest frame; older frames are overwritten in order
+    assert ring.write_slot()[0] == 5
+    assert ring.still_valid(3) and not ring.still_valid(2)
+    assert ring.wait_newer(4, timeout=0.01) is None
+
+
+def test_capture_thread_publishes_synthetic_frames_and_stops():
+    thread = CaptureThread(SyntheticSource(64, 48, fps=200.0), slots=3)
+    thread.start()
+    try:
+        ring = thread.wait_ready(timeout=2.0)
+        assert ring.shape == (48, 64, 3)
+        first = ring.wait_newer(-1, timeout=2.0)
+        second = ring.wait_newer(first[0], timeout=2.0)
+        assert second[0] > first[0]
+        assert second[2] >= first[2]
+    finally:
+        thread.stop(timeout=2.0)
+    assert not thread.is_alive()
+    assert thread.stats()["frames"] >= 2
+
+
+def test_failed_source_is_not_reopened_until_the_backoff_passes():
+    source = FailingSource()
+    failed = capture.get_capture(source)
+    with pytest.raises(RuntimeError):
+        failed.wait_ready(timeout=2.0)
+    failed.join(timeout=2.0)
+
+    assert capture.get_capture(source) is failed
+    assert source.opens == 1
+
+    failed.failed_at -= capture.RETRY_MIN_S
+    retried = capture.get_capture(source)
+    assert retried is not failed
+    with pytest.raises(RuntimeError):
+        retried.wait_ready(timeout=2.0)
+    assert source.opens == 2
+    # Repeated failures back off for longer
+    assert capture._retry_delay == 2 * capture.RETRY_MIN_S
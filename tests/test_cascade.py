@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.app.vision import pipeline
+from backend.app.vision.cascade import CascadeLandmarker
+from backend.app.vision.cascade import square_crops
+from backend.app.vision.landmarker_pool import LandmarkerPool
+from backend.app.vision.landmarks import MESH_SIZE
+from backend.app.vision.landmarks import LandmarkFeatures
+from backend.app.vision.letterbox import LetterboxTransform
+from backend.app.vision.quality import QualityController
+
+# Two 100 px faces of a 640x480 frame
+BOXES = [[100, 100, 200, 200, 0.9], [400, 200, 500, 300, 0.8]]
+
+
+def face_at(x, y):
+    return [SimpleNamespace(x=x, y=y)] * MESH_SIZE
+
+
+def test_square_crops_are_padded_and_clipped():
+    crops = square_crops([[100, 100, 200, 150, 0.9], [0, 0, 40, 40, 0.9]], (640, 480), pad=0.25)
+    # 100 px long side grown by a quarter on every side, centered on the box
+    assert crops[0].tolist() == [75, 50, 225, 200]
+    assert crops[1].tolist() == [0, 0, 50, 50]
+
+
+def test_faces_map_back_to_their_box(fake_landmarkers):
+    cascade = CascadeLandmarker(LandmarkerPool(size=1), "model.task", tile=192, grid=3)
+    cascade.warmup()
+    # Both crops fit one 2x1 mosaic of 384x192; the landmarker only finds the face of the second tile
+    fake_landmarkers[0].faces = [face_at(0.75, 0.5)]
+
+    features, found = cascade.detect(np.zeros((480, 640, 3), dtype=np.uint8), BOXES)
+    assert fake_landmarkers[0].images[0].width == 384
+    assert found.tolist() == [1]
+    np.testing.assert_allclose(features.centroids, [[450.0, 250.0]], atol=0.5)
+
+
+def test_boxes_the_landmarker_missed_keep_their_center_and_the_default_stamp(monkeypatch):
+    transform = LetterboxTransform.identity((640, 480))
+    features = LandmarkFeatures.from_result([face_at(0.75, 0.5)], transform)
+    monkeypatch.setattr(pipeline, "detect_boxes", lambda frame: [list(box) for box in BOXES])
+    monkeypatch.setattr(pipeline, "cascade_get_landmarks", lambda frame, boxes: (features, np.array([1])))
+    monkeypatch.setattr(pipeline, "QUALITY", QualityController(budget_ms=40.0))
+
+    coords, pose = pipeline.detect_faces("cascade", np.zeros((480, 640, 3), dtype=np.uint8))
+    assert coords[0] == [150.0, 150.0]
+    np.testing.assert_allclose(coords[1], [480, 240], atol=1)
+    assert len(pose) == 2
+    assert pose[0] == [pipeline.STAMP_SIZE["cascade"], 0.0, 1.0]
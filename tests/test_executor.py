@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from backend.app.vision.executor import InferenceBusy
+from backend.app.vision.executor import InferenceExecutor
+from backend.app.vision.streams import bind_stream
+from backend.app.vision.streams import current_stream_key
+
+
+class Blocker:
+    """Occupies an inference worker until released."""
+
+    def __init__(self, executor):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(executor,), daemon=True)
+        self.thread.start()
+        assert self.started.wait(2.0)
+
+    def _run(self, executor):
+        try:
+            executor.run(self._block)
+        except TimeoutError:
+            pass  # executors with a short timeout give up on the blocker; its worker stays busy
+
+    def _block(self):
+        self.started.set()
+        self.release.wait(5.0)
+
+    def finish(self):
+        self.release.set()
+        self.thread.join(2.0)
+
+
+def submit(executor, key, fn, *args):
+    # Runs executor.run() for stream `key` in a thread; returns the thread and its outcome list
+    outcome = []
+    def call():
+        with bind_stream(key):
+            try:
+                outcome.append(executor.run(fn, *args))
+            except Exception as e:
+                outcome.append(e)
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+@pytest.fixture
+def executor():
+    executors = []
+    def make(**kwargs):
+        executors.append(InferenceExecutor(key=current_stream_key, **kwargs))
+        return executors[-1]
+    yield make
+    for ex in executors:
+        ex.close()
+
+
+def test_streams_are_served_round_robin(executor, wait_until):
+    ex = executor(workers=1, max_queue=16)
+    blocker = Blocker(ex)
+    order = []
+    threads = []
+    for i in range(3):
+        threads.append(submit(ex, "fast", order.append, f"fast-{i}")[0])
+        wait_until(lambda: ex._pending == i + 2)
+    threads.append(submit(ex, "slow", order.append, "slow-0")[0])
+    wait_until(lambda: ex._pending == 5)
+
+    blocker.finish()
+    for thread in threads:
+        thread.join(2.0)
+    # The slow stream waits for one frame of the fast one, not for its whole backlog
+    assert order == ["fast-0", "slow-0", "fast-1", "fast-2"]
+
+
+def test_full_queue_rejects_new_calls(executor, wait_until):
+    ex = executor(workers=1, max_queue=1)
+    blocker = Blocker(ex)
+    waiting, outcome = submit(ex, "a", lambda: "ran")
+    wait_until(lambda: ex._pending == 2)
+
+    with bind_stream("b"), pytest.raises(InferenceBusy):
+        ex.run(lambda: "rejected")
+    blocker.finish()
+    waiting.join(2.0)
+    assert outcome == ["ran"]
+
+
+def test_stream_queue_cap_only_rejects_that_stream(executor, wait_until):
+    ex = executor(workers=1, max_queue=8, max_stream_queue=1)
+    blocker = Blocker(ex)
+    first, first_outcome = submit(ex, "a", lambda: "a")
+    wait_until(lambda: ex._pending == 2)
+
+    with bind_stream("a"), pytest.raises(InferenceBusy):
+        ex.run(lambda: "rejected")
+    other, other_outcome = submit(ex, "b", lambda: "b")
+    wait_until(lambda: ex._pending == 3)
+    blocker.finish()
+    first.join(2.0)
+    other.join(2.0)
+    assert (first_outcome, other_outcome) == (["a"], ["b"])
+
+
+def test_timed_out_calls_are_dropped_from_the_queue(executor, wait_until):
+    ex = executor(workers=1, max_queue=4, timeout=0.1)
+    blocker = Blocker(ex)
+    ran = []
+    with bind_stream("a"), pytest.raises(TimeoutError):
+        ex.run(ran.append, "late")
+
+    blocker.finish()
+    assert ex.run(lambda: "next") == "next"
+    assert ran == []
+    wait_until(lambda: ex._pending == 0)
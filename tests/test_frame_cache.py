@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.app.vision import frame_cache
+from backend.app.vision.frame_cache import FrameCache
+
+SIZE = (640, 480)
+
+
+def thumb(level=100):
+    return np.full((48, 64), level, dtype=np.uint8)
+
+
+def make_cache(clock, monkeypatch, **kw):
+    # The entries read their age from the fake clock
+    monkeypatch.setattr(frame_cache, "time", SimpleNamespace(monotonic=clock))
+    return FrameCache(**kw)
+
+
+def test_a_still_frame_hits_and_a_changed_frame_misses(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, threshold=12)
+    assert cache.get("yolo", "cam", SIZE, thumb()) is None
+    entry = cache.put("yolo", "cam", SIZE, thumb(), [[320, 240]])
+
+    # Sensor noise under the threshold reuses the detections
+    noisy = thumb()
+    noisy[::2, ::2] += 12
+    assert cache.get("yolo", "cam", SIZE, noisy) is entry
+    # One block changing past it, another size, another stream or detector all miss
+    moved = thumb()
+    moved[10, 10] = 200
+    assert cache.get("yolo", "cam", SIZE, moved) is None
+    assert cache.get("yolo", "cam", (1280, 960), thumb()) is None
+    assert cache.get("yolo", "other", SIZE, thumb()) is None
+    assert cache.get("media", "cam", SIZE, thumb()) is None
+
+
+def test_entries_expire_after_the_ttl(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, ttl=1.0)
+    entry = cache.put("yolo", "cam", SIZE, thumb(), [[320, 240]])
+
+    clock.advance(900)
+    assert cache.get("yolo", "cam", SIZE, thumb()) is entry
+    # Hits do not extend the entry's life
+    clock.advance(200)
+    assert cache.get("yolo", "cam", SIZE, thumb()) is None
+
+
+def test_the_least_recently_used_stream_is_evicted(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, max_entries=2)
+    first = cache.put("yolo", "a", SIZE, thumb(), [])
+    cache.put("yolo", "b", SIZE, thumb(), [])
+    # Using "a" makes "b" the oldest
+    assert cache.get("yolo", "a", SIZE, thumb()) is first
+    cache.put("yolo", "c", SIZE, thumb(), [])
+
+    assert cache.get("yolo", "a", SIZE, thumb()) is first
+    assert cache.get("yolo", "b", SIZE, thumb()) is None
+    assert cache.get("yolo", "c", SIZE, thumb()) is not None
+
+
+def test_entries_keep_the_latest_outputs():
+    entry = FrameCache().put("yolo", "cam", SIZE, thumb(), [])
+    for quality in (90, 80, 70):
+        entry.add_output(quality, bytes([quality]))
+    assert entry.output(90) is None
+    assert entry.output(70) == bytes([70])
+    assert len(entry.outputs) == frame_cache.MAX_OUTPUTS
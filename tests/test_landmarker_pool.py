@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from backend.app.vision.landmarker_pool import LandmarkerPool
+from backend.app.vision.landmarker_pool import LandmarkerPoolClosed
+
+
+def test_acquire_reuses_released_landmarkers(fake_landmarkers):
+    pool = LandmarkerPool(size=1)
+    first = pool.acquire("model.task")
+    pool.release(first)
+    assert pool.acquire("model.task") is first
+
+
+def test_acquire_timeout_is_a_deadline(fake_landmarkers):
+    pool = LandmarkerPool(size=1)
+    pool.acquire("model.task")
+
+    # Releases of another key wake the waiter up without handing it a landmarker
+    other = pool.acquire("other.task")
+    stop = threading.Event()
+    def churn():
+        while not stop.is_set():
+            pool.release(other)
+            pool.acquire("other.task")
+            time.sleep(0.01)
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            pool.acquire("model.task", timeout=0.2)
+        assert time.monotonic() - start < 0.5
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_close_leaves_checked_out_landmarkers_to_release(fake_landmarkers):
+    pool = LandmarkerPool(size=2)
+    busy = pool.acquire("model.task")
+    idle = pool.acquire("model.task")
+    pool.release(idle)
+
+    pool.close()
+    assert idle.closed
+    assert not busy.closed
+
+    pool.release(busy)
+    assert busy.closed
+    with pytest.raises(LandmarkerPoolClosed):
+        pool.acquire("model.task")
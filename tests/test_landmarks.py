@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.app.vision.landmarks import LANDMARK_GROUPS
+from backend.app.vision.landmarks import MESH_SIZE
+from backend.app.vision.landmarks import LandmarkFeatures
+from backend.app.vision.letterbox import LetterboxTransform
+from backend.app.vision.overlay import SpriteOverlay
+
+# 1280x720 frame letterboxed to a 640x640 canvas
+TRANSFORM = LetterboxTransform(0.5, 0, 140, (1280, 720), (640, 640))
+
+
+def synthetic_faces(count, seed=0):
+    rng = np.random.default_rng(seed)
+    faces = []
+    for _ in range(count):
+        center = rng.uniform(0.3, 0.7, 2)
+        points = center + rng.normal(0, 0.05, (MESH_SIZE, 2))
+        faces.append([SimpleNamespace(x=float(x), y=float(y)) for x, y in points])
+    return faces
+
+
+def frontal_face(eye_angle=0.0, nose_shift=0.0):
+    """
+    A face whose eye groups sit 0.2 apart around (0.5, 0.4), rotated by eye_angle degrees, with the nose
+    tip moved along the eye line by nose_shift (fractions of half the eye distance).
+    """
+    angle = np.radians(eye_angle)
+    axis = np.array([np.cos(angle), np.sin(angle)])
+    midpoint = np.array([0.5, 0.4])
+    points = np.tile(midpoint, (MESH_SIZE, 1))
+    points[list(LANDMARK_GROUPS["right_eye"])] = midpoint - 0.1 * axis
+    points[list(LANDMARK_GROUPS["left_eye"])] = midpoint + 0.1 * axis
+    points[1] = midpoint + nose_shift * 0.1 * axis
+    return [[SimpleNamespace(x=float(x), y=float(y)) for x, y in points]]
+
+
+def old_centroids(face_landmarks, transform):
+    # The per-landmark loops MediapipeDetector.centroids() used before the features were vectorized
+    in_w, in_h = transform.canvas_size
+    points = []
+    for landmarks in face_landmarks:
+        sum_x = sum([lm.x for lm in landmarks])
+        sum_y = sum([lm.y for lm in landmarks])
+        count = len(landmarks)
+        points.append([sum_x / count * in_w, sum_y / count * in_h])
+    return transform.points_to_frame(points)
+
+
+def old_boxes(face_landmarks, transform):
+    in_w, in_h = transform.canvas_size
+    ret = []
+    for landmarks in face_landmarks:
+        xs = [lm.x for lm in landmarks]
+        ys = [lm.y for lm in landmarks]
+        ret.append([min(xs) * in_w, min(ys) * in_h, max(xs) * in_w, max(ys) * in_h, 1.0])
+    return transform.boxes_to_frame(ret)
+
+
+def test_features_match_the_per_landmark_loops():
+    faces = synthetic_faces(3)
+    features = LandmarkFeatures.from_result(faces, TRANSFORM)
+    assert len(features) == 3
+    np.testing.assert_allclose(features.centroids, old_centroids(faces, TRANSFORM), atol=1e-2)
+    np.testing.assert_allclose(features.boxes, old_boxes(faces, TRANSFORM), atol=1e-2)
+
+
+def test_no_faces():
+    features = LandmarkFeatures.from_result([], TRANSFORM)
+    assert len(features) == 0
+    assert features.stamp_pose(2.5).shape == (0, 3)
+
+
+def test_roll_follows_the_eye_line():
+    features = LandmarkFeatures.from_result(frontal_face(eye_angle=20), TRANSFORM)
+    assert abs(features.roll[0] - 20) < 0.5
+    assert abs(features.yaw[0]) < 0.5
+
+
+def test_yaw_follows_the_nose():
+    features = LandmarkFeatures.from_result(frontal_face(nose_shift=0.5), TRANSFORM)
+    assert abs(features.yaw[0] - 30) < 0.5
+    assert abs(features.roll[0]) < 0.5
+
+
+def test_stamp_pose_sizes_from_the_eye_distance():
+    frontal = LandmarkFeatures.from_result(frontal_face(eye_angle=10), TRANSFORM)
+    width, roll, squeeze = frontal.stamp_pose(2.5)[0]
+    # 0.2 of the 640 px canvas is 128 canvas pixels, 256 frame pixels
+    assert abs(width - 2.5 * 256) < 1
+    assert abs(roll - 10) < 0.5 and squeeze == 1.0
+
+    turned = LandmarkFeatures.from_result(frontal_face(nose_shift=0.5), TRANSFORM)
+    width, _, squeeze = turned.stamp_pose(2.5)[0]
+    # The eye distance seen is foreshortened: the unsqueezed width is that of the frontal face it implies
+    assert abs(squeeze - np.cos(np.radians(30))) < 0.01
+    assert abs(width - 2.5 * 256 / np.cos(np.radians(30))) < 1
+
+
+def test_overlay_rotates_clockwise_and_squeezes():
+    # Opaque right half, transparent left half
+    sprite = np.zeros((40, 40, 4), dtype=np.uint8)
+    sprite[:, 20:] = 255
+    overlay = SpriteOverlay(sprite, bucket=1)
+
+    _, inv_alpha = overlay.scaled(40, angle=90)
+    opaque = inv_alpha[..., 0] < 128
+    # A quarter turn clockwise moves the right half to the bottom
+    assert opaque[30:, :].mean() > 0.9 and opaque[:10, :].mean() < 0.1
+
+    _, inv_alpha = overlay.scaled(40, squeeze=0.5)
+    assert inv_alpha.shape[:2] == (40, 20)
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from backend.app.vision.loader import LOADERS
+from backend.app.vision.loader import ModelLoader
+from backend.app.vision.loader import ModelUnavailable
+
+
+@pytest.fixture
+def slow_loader():
+    release = threading.Event()
+    def load():
+        release.wait(5.0)
+        return "model"
+    loader = ModelLoader("test-slow", load)
+    yield loader, release
+    release.set()
+    LOADERS.pop("test-slow", None)
+
+
+def test_get_does_not_wait_past_its_timeout_for_a_background_load(slow_loader):
+    loader, release = slow_loader
+    loader.start()
+
+    start = time.monotonic()
+    with pytest.raises(ModelUnavailable, match="still loading"):
+        loader.get(timeout=0)
+    with pytest.raises(ModelUnavailable):
+        loader.get(timeout=0.05)
+    assert time.monotonic() - start < 1.0
+
+    release.set()
+    assert loader.get(timeout=5.0) == "model"
+    assert loader.get(timeout=0) == "model"
+
+
+def test_failed_load_is_reported_as_unavailable():
+    def load():
+        raise OSError("weights missing")
+    loader = ModelLoader("test-failed", load)
+    try:
+        with pytest.raises(ModelUnavailable, match="weights missing"):
+            loader.get(timeout=0)
+    finally:
+        LOADERS.pop("test-failed", None)
@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend.app.vision.letterbox import LetterboxTransform
+from backend.app.vision.media_session import MediapipeSession
+from backend.app.vision.media_session import SessionClosed
+
+
+class FakeMediapipeDetector:
+    model_path = "model.task"
+    max_faces = 5
+
+    @staticmethod
+    def _prepare(frame):
+        height, width = frame.shape[:2]
+        return frame, LetterboxTransform.identity((width, height))
+
+
+@pytest.fixture
+def session(fake_landmarkers):
+    session = MediapipeSession(FakeMediapipeDetector(), "live_stream", timeout=2.0)
+    yield session, fake_landmarkers[0]
+    session.close()
+
+
+def detect_in_thread(session, frame):
+    outcome = []
+    def run():
+        try:
+            outcome.append(session.detect(frame))
+        except Exception as e:
+            outcome.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_replaced_frames_resolve_at_once_with_the_last_result(session, wait_until):
+    session, landmarker = session
+    first, first_out = detect_in_thread(session, np.zeros((100, 200, 3), np.uint8))
+    wait_until(lambda: len(landmarker.submitted) == 1)
+
+    # Waits behind the frame in flight, then is replaced by a newer frame before there is any result
+    early, early_out = detect_in_thread(session, np.zeros((50, 80, 3), np.uint8))
+    wait_until(lambda: session._waiting is not None)
+    second, second_out = detect_in_thread(session, np.zeros((60, 90, 3), np.uint8))
+    early.join(1.0)
+    _, features = early_out[0]
+    assert len(features) == 0 and features.boxes.shape == (0, 5)
+    assert len(landmarker.submitted) == 1
+
+    landmarker.finish(landmarker.submitted[0], faces=1, x=0.25, y=0.5)
+    first.join(1.0)
+    _, features = first_out[0]
+    # The first frame's faces are in its own pixels
+    np.testing.assert_allclose(features.centroids, [[50.0, 50.0]], atol=1e-3)
+
+    # Replaced while the second frame runs: resolved with the first frame's result, in its own pixels
+    wait_until(lambda: len(landmarker.submitted) == 2)
+    skipped, skipped_out = detect_in_thread(session, np.zeros((40, 400, 3), np.uint8))
+    wait_until(lambda: session._waiting is not None)
+    latest, latest_out = detect_in_thread(session, np.zeros((30, 30, 3), np.uint8))
+    skipped.join(1.0)
+    _, features = skipped_out[0]
+    np.testing.assert_allclose(features.centroids, [[100.0, 20.0]], atol=1e-3)
+    assert session.skipped == 2
+
+    landmarker.finish(landmarker.submitted[1], faces=1)
+    second.join(1.0)
+    _, features = second_out[0]
+    np.testing.assert_allclose(features.centroids, [[45.0, 30.0]], atol=1e-3)
+    wait_until(lambda: len(landmarker.submitted) == 3)
+    landmarker.finish(landmarker.submitted[2], faces=2)
+    latest.join(1.0)
+    _, features = latest_out[0]
+    assert len(features) == 2
+    assert session.frames == 3
+
+
+def test_close_fails_the_frames_still_waiting(session, wait_until):
+    session, landmarker = session
+    inflight, inflight_out = detect_in_thread(session, np.zeros((10, 10, 3), np.uint8))
+    wait_until(lambda: len(landmarker.submitted) == 1)
+    waiting, waiting_out = detect_in_thread(session, np.zeros((10, 10, 3), np.uint8))
+    wait_until(lambda: session._waiting is not None)
+
+    session.close()
+    inflight.join(1.0)
+    waiting.join(1.0)
+    assert isinstance(inflight_out[0], SessionClosed)
+    assert isinstance(waiting_out[0], SessionClosed)
+    assert landmarker.closed
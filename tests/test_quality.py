@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.app.vision import pipeline
+from backend.app.vision.landmarks import MESH_SIZE
+from backend.app.vision.landmarks import LandmarkFeatures
+from backend.app.vision.letterbox import LetterboxTransform
+from backend.app.vision.quality import QualityController
+
+
+def controller(clock, **kwargs):
+    return QualityController(budget_ms=40.0, window=4, hold_s=2.0, clock=clock, **kwargs)
+
+
+def feed(quality, clock, cost_ms, frames, every_ms=40.0):
+    for _ in range(frames):
+        clock.advance(every_ms)
+        quality.observe(cost_ms)
+    return quality.level
+
+
+def test_steps_down_only_after_a_full_window_and_the_hold(clock):
+    quality = controller(clock)
+    # Over budget, but still within the hold time of the start
+    assert feed(quality, clock, 60.0, 40) == 0
+    clock.advance(2000)
+    assert feed(quality, clock, 60.0, 1) == 1
+    # The window restarts at the new point
+    clock.advance(2000)
+    assert feed(quality, clock, 60.0, 3) == 1
+    assert feed(quality, clock, 60.0, 1) == 2
+
+
+def test_steps_up_after_twice_the_hold(clock):
+    quality = controller(clock)
+    clock.advance(2000)
+    assert feed(quality, clock, 60.0, 4) == 1
+    # 20 ms is below recover_at x budget (28 ms): no change until 4 s have passed
+    assert feed(quality, clock, 20.0, 50) == 1
+    clock.advance(2000)
+    assert feed(quality, clock, 20.0, 4) == 0
+
+
+def test_costs_within_the_band_hold_the_point(clock):
+    quality = controller(clock)
+    clock.advance(10000)
+    assert feed(quality, clock, 35.0, 100) == 0
+    assert quality.changes == 0
+
+
+def test_disabled_controller_keeps_the_best_point(clock):
+    quality = controller(clock, enabled=False)
+    clock.advance(10000)
+    assert feed(quality, clock, 500.0, 100) == 0
+
+
+def faces_at(boxes, size=(640, 480)):
+    # One landmark result per box: every landmark on one of the box's corners
+    width, height = size
+    faces = []
+    for x1, y1, x2, y2 in boxes:
+        corners = [(x1, y1), (x2, y2)] * (MESH_SIZE // 2) + [(x1, y1)] * (MESH_SIZE % 2)
+        faces.append([SimpleNamespace(x=x / width, y=y / height) for x, y in corners])
+    return LandmarkFeatures.from_result(faces, LetterboxTransform.identity(size))
+
+
+def test_media_results_are_capped_to_the_largest_faces(monkeypatch, clock):
+    calls = []
+    features = faces_at([(0, 0, 20, 20), (100, 100, 300, 300), (400, 0, 480, 80)])
+    def fake_media_get_faces(frame, model_path, max_faces=5, session=None):
+        calls.append(max_faces)
+        return features.centroids.astype(int).tolist(), features
+    monkeypatch.setattr(pipeline, "media_get_faces", fake_media_get_faces)
+
+    quality = controller(clock)
+    quality.level = len(quality.ladder) - 1  # scale 0.5, max_faces 1
+    monkeypatch.setattr(pipeline, "QUALITY", quality)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    coords, pose = pipeline.detect_faces("media", frame)
+
+    # The landmarker is asked for its default face count at every point
+    assert calls == [5]
+    # The fake's faces are in the pixels of the half-size frame it was given
+    assert coords == [[400, 400]] and len(pose) == 1
@@ -0,0 +1,63 @@
+import base64
+
+import cv2
+import numpy as np
+
+from backend.app.utils.frame_handler import frame_size
+from backend.app.vision import routes
+
+
+def jpeg(width=1280, height=960, seed=0):
+    rng = np.random.default_rng(seed)
+    image = cv2.resize(rng.integers(0, 255, (12, 16, 3), dtype=np.uint8), (width, height))
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_detections_from_a_reduced_decode_cache_a_full_size_pose(client, monkeypatch):
+    # A detector finding one face whose filter is a quarter of the frame wide
+    def detect_faces(detector, frame, session=None):
+        width, height = frame_size(frame)
+        return [[width // 2, height // 2]], [[width / 4, 10.0, 1.0]]
+    drawn = []
+    def draw(detector, frame, coords, pose=None):
+        drawn.append(pose)
+        return frame
+    monkeypatch.setattr(routes, "detect_faces", detect_faces)
+    monkeypatch.setattr(routes, "draw", draw)
+    monkeypatch.setattr(routes, "detector_input_size", lambda detector: (320, 240))
+    body = jpeg()
+
+    response = client.post("/vision/media/detections", data=body, content_type="image/jpeg")
+    assert response.status_code == 200
+    # Decoded at 1/4 scale, reported in pixels of the uploaded frame
+    assert response.get_json()["faces"] == [[640, 480]]
+
+    response = client.post("/vision/media/raw", data=body, content_type="image/jpeg")
+    assert response.status_code == 200
+    assert response.headers["X-Frame-Cache"] == "detections"
+    assert drawn == [[[320.0, 10.0, 1.0]]]
+
+
+def test_raw_routes_reject_bodies_they_cannot_read(client):
+    response = client.post("/vision/yolo/raw", data=jpeg(), content_type="text/plain")
+    assert response.status_code == 415
+    response = client.post("/vision/yolo/raw", data=b"", content_type="image/jpeg")
+    assert response.status_code == 400
+    response = client.post("/vision/yolo/raw", data=b"not an image", content_type="image/jpeg")
+    assert response.status_code == 400
+
+    response = client.post("/vision/yolo/raw", data=jpeg(320, 240), content_type="image/jpeg")
+    assert response.status_code == 200
+    assert response.mimetype == "image/jpeg"
+
+
+def test_json_routes_reject_frames_they_cannot_decode(client):
+    for b64_input in (None, "@@ not base-64 @@", "bm90IGFuIGltYWdl"):
+        response = client.post("/vision/yolo", json={'b64_input': b64_input})
+        assert response.status_code == 400
+        assert response.get_json() == {'b64_output': ""}
+
+    b64_input = base64.b64encode(jpeg(320, 240)).decode()
+    response = client.post("/vision/yolo", json={'b64_input': b64_input})
+    assert response.status_code == 200
+    assert response.get_json()["b64_output"]
@@ -0,0 +1,96 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+from simple_websocket import ConnectionClosed
+
+from backend.app.vision import routes
+from backend.app.vision.stream import SEQ_HEADER
+from backend.app.vision.stream import StreamSession
+
+# A 320x240 grey JPEG
+JPEG = cv2.imencode(".jpg", np.full((240, 320, 3), 128, dtype=np.uint8))[1].tobytes()
+
+
+class FakeWebSocket:
+    """
+    Plays a scripted client: receive() returns the scripted messages in order, calling the callables
+    among them (to wait for the server) in their place, then reports the connection closed.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.sent = []
+
+    def receive(self):
+        if not self.script:
+            raise ConnectionClosed()
+        message = self.script.pop(0)
+        if callable(message):
+            message()
+            return None
+        return message
+
+    def send(self, message):
+        self.sent.append(json.loads(message) if isinstance(message, str) else message)
+
+    def replies(self, kind):
+        return [m for m in self.sent if isinstance(m, dict) and m["type"] == kind]
+
+    def frame_replies(self):
+        # Returns: the results and errors answering a frame
+        return [m for m in self.sent if isinstance(m, dict) and m.get("seq") is not None]
+
+
+def frame(seq, body):
+    return SEQ_HEADER.pack(seq) + body
+
+
+def test_a_session_answers_config_frames_and_errors_in_order(client, wait_until):
+    ws = FakeWebSocket([])
+    def answered(count):
+        # Waits for `count` frame replies, so the next frame does not replace a waiting one
+        return lambda: wait_until(lambda: len(ws.frame_replies()) >= count)
+    ws.script = [
+        json.dumps({"type": "config", "output": "detections"}),
+        json.dumps({"type": "config", "detector": "nope"}),
+        b"\x00\x01",
+        frame(1, JPEG), answered(1),
+        frame(1, JPEG),
+        frame(2, b"not an image"), answered(2),
+        json.dumps({"type": "config", "output": "frame", "quality": 50}),
+        frame(3, JPEG), answered(3),
+    ]
+    session = StreamSession(ws, stream="tv")
+
+    with pytest.raises(ConnectionClosed):
+        session.run()
+
+    configs = ws.replies("config")
+    assert [c["output"] for c in configs] == ["frame", "detections", "frame"]
+    assert configs[-1]["quality"] == 50
+    errors = ws.replies("error")
+    assert [e["seq"] for e in errors] == [None, None, 2]
+    assert "unknown detector" in errors[0]["error"]
+    # The repeated frame 1 is dropped as stale; only the frame output carries the generated JPEG
+    results = ws.replies("result")
+    assert [(r["seq"], r["width"], r["height"], r["dropped"]) for r in results] == [(1, 320, 240, 0), (3, 320, 240, 1)]
+    assert ws.sent[-1][:SEQ_HEADER.size] == SEQ_HEADER.pack(3)
+    assert ws.sent[-1][SEQ_HEADER.size:SEQ_HEADER.size + 2] == b"\xff\xd8"
+
+    # The named stream outlives the connection, detached, with the latest detections
+    stream = routes.STREAMS.peek("tv")
+    assert stream.attached == 0 and stream.frames == 2
+    assert stream.last["width"] == 320
+
+
+def test_private_streams_are_dropped_on_disconnect(client, wait_until):
+    ws = FakeWebSocket([])
+    ws.script = [frame(1, JPEG), lambda: wait_until(lambda: ws.replies("result"))]
+    session = StreamSession(ws, output="detections")
+
+    with pytest.raises(ConnectionClosed):
+        session.run()
+    assert session.stream.key.startswith("ws-")
+    assert routes.STREAMS.peek(session.stream.key) is None
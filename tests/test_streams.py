@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from backend.app.vision import streams
+from backend.app.vision.streams import StreamRegistry
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_registry(clock, monkeypatch, **kw):
+    # The streams read their idle time from the fake clock
+    monkeypatch.setattr(streams, "time", SimpleNamespace(monotonic=clock))
+    return StreamRegistry(make_tracker=object, open_media=FakeSession, **kw)
+
+
+def test_the_least_recently_used_stream_is_evicted(clock, monkeypatch):
+    registry = make_registry(clock, monkeypatch, max_streams=2)
+    a = registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+
+    assert list(registry._streams) == ["a", "c"]
+    assert registry.get("a") is a
+    assert registry.evicted == 1
+
+
+def test_idle_streams_are_evicted_and_their_media_session_closed(clock, monkeypatch):
+    registry = make_registry(clock, monkeypatch, idle_ttl=30.0)
+    idle = registry.get("idle")
+    session = registry.media_session(idle)
+
+    clock.advance(20_000)
+    registry.get("busy")
+    assert registry.peek("idle") is idle
+    clock.advance(20_000)
+    registry.get("busy")
+    assert registry.peek("idle") is None
+    assert session.closed
+
+
+def test_attached_streams_are_never_evicted(clock, monkeypatch):
+    registry = make_registry(clock, monkeypatch, max_streams=1, idle_ttl=30.0)
+    socket = registry.attach("socket")
+    clock.advance(60_000)
+    registry.get("a")
+    registry.get("b")
+
+    # Only the attached stream and the one in use are left
+    assert list(registry._streams) == ["socket", "b"]
+    registry.detach(socket, remove=True)
+    assert registry.peek("socket") is None
+
+
+def test_opening_more_media_sessions_than_allowed_closes_the_oldest(clock, monkeypatch):
+    registry = make_registry(clock, monkeypatch, max_media=1)
+    first = registry.media_session(registry.get("a"))
+    clock.advance(1000)
+    second = registry.media_session(registry.get("b"))
+
+    assert first.closed and not second.closed
+    assert registry.peek("a").media is None
@@ -0,0 +1,87 @@
+from backend.app.vision.tracker import FaceTracker
+
+
+def make_tracker(clock, detector, cost_ms, detections=(), **kwargs):
+    detector.cost_ms = cost_ms
+    detector.detections = list(detections)
+    return FaceTracker(detector, frame_budget_ms=40.0, clock=clock, **kwargs)
+
+
+def run_frames(tracker, clock, frames, overhead_ms, idle_ms=0.0):
+    # Feeds frames whose server-side cost is the detector's plus overhead_ms, idle_ms apart
+    for _ in range(frames):
+        before = clock()
+        tracker.update(None)
+        tracker.observe_frame((clock() - before) * 1000 + overhead_ms)
+        clock.advance(overhead_ms + idle_ms)
+
+
+def test_cheap_detector_runs_every_frame(clock, fake_detector):
+    tracker = make_tracker(clock, fake_detector, cost_ms=5.0)
+    run_frames(tracker, clock, 10, overhead_ms=10.0)
+    assert tracker.interval == 1
+    assert fake_detector.calls == 10
+
+
+def test_interval_spreads_an_expensive_detector_over_the_budget(clock, fake_detector):
+    tracker = make_tracker(clock, fake_detector, cost_ms=50.0)
+    run_frames(tracker, clock, 30, overhead_ms=10.0)
+    # 50 ms of detection over 40 - 10 ms of slack per frame
+    assert tracker.interval == 2
+    assert tracker.stats()["overhead_ms"] == 10.0
+    assert fake_detector.calls == 15
+
+
+def test_client_idle_time_does_not_raise_the_interval(clock, fake_detector):
+    tracker = make_tracker(clock, fake_detector, cost_ms=5.0)
+    # A 15 fps client: 67 ms between frames, but only 15 ms of work per frame on the server
+    run_frames(tracker, clock, 30, overhead_ms=10.0, idle_ms=52.0)
+    assert tracker.interval == 1
+    assert fake_detector.calls == 30
+
+
+def test_tracks_keep_their_id_while_the_face_moves(clock, fake_detector):
+    tracker = make_tracker(clock, fake_detector, cost_ms=1.0)
+    fake_detector.detections = [[10, 10, 50, 50, 0.9]]
+    tracks, detected = tracker.update(None)
+    assert detected
+    first_id = tracks[0]["id"]
+
+    fake_detector.detections = [[14, 12, 54, 52, 0.9], [200, 200, 240, 240, 0.8]]
+    tracks, _ = tracker.update(None)
+    ids = {track["id"] for track in tracks}
+    assert first_id in ids and len(ids) == 2
+    moved = next(track for track in tracks if track["id"] == first_id)
+    assert moved["box"] == [14.0, 12.0, 54.0, 52.0]
+
+
+def test_predicted_frames_move_along_the_velocity_and_unmatched_tracks_expire(clock, fake_detector):
+    tracker = make_tracker(clock, fake_detector, cost_ms=1.0, min_interval=3, max_misses=1, min_confidence=0.0)
+    fake_detector.detections = [[0, 0, 40, 40, 0.9]]
+    tracker.update(None)
+    tracker.update(None)
+    tracker.update(None)
+    fake_detector.detections = [[6, 0, 46, 40, 0.9]]
+    _, detected = tracker.update(None)
+    assert detected
+
+    tracks, detected = tracker.update(None)
+    assert not detected
+    assert tracks[0]["predicted"]
+    # 6 px over 3 frames, halved by the velocity smoothing
+    assert tracks[0]["box"] == [7.0, 0.0, 47.0, 40.0]
+
+    fake_detector.detections = []
+    for _ in range(2 * 3):
+        tracks, _ = tracker.update(None)
+    assert tracks == []
+
+
+def test_low_confidence_forces_a_detection(clock, fake_detector):
+    tracker = make_tracker(clock, fake_detector, cost_ms=1.0, min_interval=10, confidence_decay=0.5, min_confidence=0.4)
+    fake_detector.detections = [[0, 0, 40, 40, 0.9]]
+    tracker.update(None)
+    tracker.update(None)  # confidence 0.45
+    _, detected = tracker.update(None)  # 0.225 < 0.4
+    assert detected
+    assert fake_detector.calls == 2